@@ -0,0 +1,227 @@
+
+import argparse
+import builtins
+import contextlib
+import datetime
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from kupang import (BinaryStorage, OrderStore, SQLiteStorage, ShoppingMall, TextFileStorage, convert_data,
+                    load_orders_parallel, numpy)
+
+
+# 가짜 데이터 재료 (한글/영문 상품명, 고객명, 주소)
+KOREAN_WORDS = ['무선', '블루투스', '유기농', '프리미엄', '접이식', '대용량', '휴대용', '스마트', '국산', '친환경']
+KOREAN_ITEMS = ['이어폰', '키보드', '마우스', '사과', '생수', '텀블러', '노트북', '운동화', '가방', '선풍기', '청소기', '샴푸']
+ENGLISH_WORDS = ['Wireless', 'Pro', 'Mini', 'Ultra', 'Classic', 'Smart', 'Eco', 'Max', 'Slim', 'Air']
+ENGLISH_ITEMS = ['Mouse', 'Keyboard', 'Speaker', 'Charger', 'Backpack', 'Monitor', 'Lamp', 'Bottle', 'Headset']
+FAMILY_NAMES = ['김', '이', '박', '최', '정', '강', '조', '윤', '장', '임']
+GIVEN_NAMES = ['민준', '서연', '도윤', '지우', '하준', '서윤', '시우', '하은', '지호', '수아']
+ENGLISH_NAMES = ['John Smith', 'Jane Doe', 'Alex Kim', 'Emily Park', 'Chris Lee']
+CITIES = ['서울시 강남구', '부산시 해운대구', '대구시 수성구', '인천시 연수구', '광주시 서구', '대전시 유성구']
+STREETS = ['테헤란로', '해운대로', '동대구로', '센트럴로', '상무대로', '대학로']
+
+SEARCH_QUERIES = ['무선', '키보드', '마우스', '프리미엄 이어폰', 'Pro', 'wireless mouse', '사과', '없는상품']
+
+
+def product_name(rng):
+    if rng.random() < 0.7:
+        return f"{rng.choice(KOREAN_WORDS)} {rng.choice(KOREAN_ITEMS)} {rng.randint(1, 999)}"
+    return f"{rng.choice(ENGLISH_WORDS)} {rng.choice(ENGLISH_ITEMS)} {rng.randint(1, 999)}"
+
+
+def customer(rng):
+    if rng.random() < 0.8:
+        name = rng.choice(FAMILY_NAMES) + rng.choice(GIVEN_NAMES)
+    else:
+        name = rng.choice(ENGLISH_NAMES)
+    address = f"{rng.choice(CITIES)} {rng.choice(STREETS)} {rng.randint(1, 300)}-{rng.randint(1, 50)}"
+    return name, address
+
+
+# products.txt 생성, (상품번호, 상품명, 가격) 목록을 돌려줌
+def generate_products(path, count, rng):
+    products = []
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            product_id = f"PROD{1000 + i}"
+            name = product_name(rng)
+            price = rng.randrange(1000, 500000, 100)
+            f.write(f"{product_id},{name},{price},{rng.randint(0, 1000)}\n")
+            products.append((product_id, name, price))
+    return products
+
+
+# orders.txt 생성, 주문일은 start 부터 days 일 동안 오름차순
+def generate_orders(path, count, products, rng, start=datetime.date(2023, 1, 1), days=730):
+    customers = [customer(rng) for _ in range(min(count, 10000) or 1)]
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            product_id, name, price = rng.choice(products)
+            customer_name, address = rng.choice(customers)
+            order_date = start + datetime.timedelta(days=i * days // count)
+            f.write(f"ORD{1000 + i},{product_id},{name},{price},{rng.randint(1, 5)},"
+                    f"{customer_name},{address},{order_date.isoformat()}\n")
+
+
+def generate_dataset(data_dir, product_count, order_count, seed):
+    rng = random.Random(seed)
+    products = generate_products(os.path.join(data_dir, 'products.txt'), product_count, rng)
+    generate_orders(os.path.join(data_dir, 'orders.txt'), order_count, products, rng)
+
+
+# 텍스트 파일로 만든 데이터를 SQLite 로 옮김
+def copy_to_sqlite(data_dir, db_path):
+    text = TextFileStorage(data_dir)
+    products, orders = {}, OrderStore()
+    text.load_products(products)
+    text.load_orders(orders)
+    sqlite = SQLiteStorage(db_path)
+    sqlite.save_products(products)
+    sqlite.save_orders(orders)
+    sqlite.close()
+
+
+def percentile(sorted_values, percent):
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# 화면 출력과 입력 없이 실행 (입력은 항상 Enter)
+@contextlib.contextmanager
+def headless():
+    original_input = builtins.input
+    builtins.input = lambda prompt='': ''
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        builtins.input = original_input
+
+
+# 작업 하나를 여러 번 실행해서 지연 시간을 재고, 마지막에 한 번 더 실행해서 최대 메모리를 잼
+def measure(name, operation, rows, iterations):
+    timings = []
+    with headless():
+        for _ in range(iterations):
+            started = time.perf_counter()
+            operation()
+            timings.append(time.perf_counter() - started)
+        tracemalloc.start()
+        operation()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    timings.sort()
+    total = sum(timings)
+    return {
+        'operation': name,
+        'rows': rows,
+        'iterations': iterations,
+        'throughput_per_sec': rows * iterations / total if total else None,
+        'mean_ms': total / iterations * 1000,
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'p99_ms': percentile(timings, 99) * 1000,
+        'peak_memory_bytes': peak,
+    }
+
+
+def run_size(size, args):
+    order_count = int(size * args.orders_per_product)
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as data_dir:
+        generate_dataset(data_dir, size, order_count, args.seed)
+        if args.storage == 'sqlite':
+            db_path = os.path.join(data_dir, 'kupang.db')
+            copy_to_sqlite(data_dir, db_path)
+            storage = SQLiteStorage(db_path)
+        elif args.storage == 'binary':
+            convert_data(data_dir, 'binary')
+            storage = BinaryStorage(data_dir)
+        else:
+            storage = TextFileStorage(data_dir, lazy_orders=args.lazy_orders)
+
+        results = []
+        started = time.perf_counter()
+        with headless():
+            mall = ShoppingMall(storage)
+        results.append({'operation': 'startup', 'rows': size + order_count,
+                        'seconds': time.perf_counter() - started})
+
+        def load_orders():
+            mall.orders = OrderStore()
+            mall.load_orders()
+
+        orders_path = os.path.join(data_dir, 'orders.txt')  # 저장소 종류와 상관없이 생성한 원본 파일
+
+        queries = itertools.cycle(SEARCH_QUERIES)  # 검색어는 차례로 돌아가며 사용
+
+        operations = [
+            ('load_items', mall.load_items, size, args.repeat),
+            ('refresh_items', mall.refresh_items, size, args.repeat),
+            ('load_orders', load_orders, order_count, args.repeat),
+            ('load_orders_parallel', lambda: load_orders_parallel(orders_path, OrderStore(), workers=args.workers),
+             order_count, args.repeat),
+            ('reconcile_sales', lambda: load_orders_parallel(orders_path, sales=True, workers=args.workers),
+             order_count, args.repeat),
+            ('search_products', lambda: mall.search_products(next(queries)), 1, args.search_repeat),
+            ('view_sales', mall.view_sales, 1, args.repeat),
+            ('top_products', lambda: mall.analytics().top_products(10), order_count, args.repeat),
+            ('revenue_by_month', lambda: mall.analytics().revenue_by_period('month'), order_count, args.repeat),
+            ('basket_stats', lambda: mall.analytics().basket_stats(), order_count, args.repeat),
+            ('save_items', mall.save_items, size, args.repeat),
+            ('save_orders', mall.save_orders, order_count, args.repeat),
+        ]
+        for name, operation, rows, iterations in operations:
+            if args.only and name not in args.only:
+                continue
+            results.append(measure(name, operation, rows, iterations))
+        storage.close()
+
+    for result in results:
+        result.update(products=size, orders=order_count)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="쇼핑몰 성능 측정 (가짜 데이터 생성 후 작업별 시간/메모리 측정)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="상품 수 (여러 개 가능)")
+    parser.add_argument('--orders-per-product', type=float, default=1.0, help="상품 하나당 주문 수")
+    parser.add_argument('--repeat', type=int, default=5, help="작업별 반복 횟수")
+    parser.add_argument('--search-repeat', type=int, default=200, help="검색 반복 횟수")
+    parser.add_argument('--only', nargs='+', help="측정할 작업 이름만")
+    parser.add_argument('--storage', choices=['text', 'binary', 'sqlite'], default='text', help="저장소 종류")
+    parser.add_argument('--lazy-orders', action='store_true', help="주문 파일을 필요할 때만 읽기")
+    parser.add_argument('--workers', type=int, help="load_orders_parallel 프로세스 수 (기본: CPU 수)")
+    parser.add_argument('--seed', type=int, default=1, help="데이터 생성용 난수 시드")
+    parser.add_argument('--work-dir', help="데이터를 만들 임시 폴더 위치")
+    parser.add_argument('--output', help="결과 JSON 파일 (없으면 화면에 출력)")
+    args = parser.parse_args()
+
+    report = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'storage': args.storage,
+        'lazy_orders': args.lazy_orders,
+        'numpy': numpy.__version__ if numpy is not None else None,
+        'seed': args.seed,
+        'results': [],
+    }
+    for size in args.sizes:
+        print(f"측정 중: 상품 {size}개", file=sys.stderr)
+        report['results'].extend(run_size(size, args))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
@@ -1,12 +1,44 @@
 
+import argparse
+import atexit
+import bisect
+import contextlib
+import csv
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from array import array
 import datetime
-import random
+import functools
+import heapq
+import itertools
+import json
+import mmap
 import re
+import signal
+import sqlite3
+import struct
 import sys
 import os
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import numpy
+except ImportError:  # 없으면 매출 분석을 array 로 계산 (느리지만 결과는 같음)
+    numpy = None
 
 # 주문 클래스
 class Order:
+    __slots__ = ('order_id', 'product_id', 'product_name', 'product_price', 'quantity',
+                 'customer_name', 'customer_address', 'order_date')
+
     def __init__(self, order_id, product_id, product_name, product_price, quantity, customer_name, customer_address, order_date):
         self.order_id = order_id
         self.product_id = product_id
@@ -17,28 +49,3295 @@ class Order:
         self.customer_address = customer_address
         self.order_date = order_date
 
-    def __str__(self):
-        return (f"주문번호: {self.order_id}, 상품번호: {self.product_id}, 상품명: {self.product_name}, 가격: {self.product_price}원, "
-                f"수량: {self.quantity}, 고객명: {self.customer_name}, 주소: {self.customer_address}, "
-                f"주문일: {self.order_date}")
+    def __str__(self):
+        return (f"주문번호: {self.order_id}, 상품번호: {self.product_id}, 상품명: {self.product_name}, 가격: {self.product_price}원, "
+                f"수량: {self.quantity}, 고객명: {self.customer_name}, 주소: {self.customer_address}, "
+                f"주문일: {self.order_date}")
+
+    def to_file_string(self):
+        return (f"{self.order_id},{self.product_id},{self.product_name},{self.product_price},{self.quantity},"
+                f"{self.customer_name},{self.customer_address},{self.order_date}\n")
+
+    @staticmethod
+    def from_file_string(order_str):
+        order_data = order_str.strip().split(',')
+        return Order(order_data[0], order_data[1], order_data[2], int(order_data[3]), int(order_data[4]),
+                     order_data[5], order_data[6], order_data[7])  # Add order_date as well
+
+
+
+# 성능 측정값 (카운터, 히스토그램), enabled 가 False 이면 아무것도 기록하지 않음
+# 이름과 라벨은 Prometheus 형식을 따름 (예: kupang_bytes_written_total{file="orders.txt"})
+class Metrics:
+    TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)  # 초
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()  # 서버의 저장 스레드도 기록하므로
+        self.counters = {}  # (이름, 라벨) -> 값
+        self.totals = {}  # 이름 -> 라벨과 상관없이 더한 값 (자주 읽는 합계를 counters 를 훑지 않고 얻음)
+        self.histograms = {}  # (이름, 라벨) -> [버킷별 개수, 합계, 개수]
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.totals[name] = self.totals.get(name, 0) + value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.TIME_BUCKETS) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(self.TIME_BUCKETS, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    # 이름이 같은 카운터를 라벨과 상관없이 더한 값
+    def total(self, name):
+        with self.lock:
+            return self.totals.get(name, 0)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.totals.clear()
+            self.histograms.clear()
+
+    def to_dict(self):
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = []
+            for (name, labels), (buckets, total, count) in sorted(self.histograms.items()):
+                cumulative = list(itertools.accumulate(buckets))
+                histograms.append({'name': name, 'labels': dict(labels), 'count': count, 'sum': total,
+                                   'buckets': dict(zip([*map(str, self.TIME_BUCKETS), '+Inf'], cumulative))})
+        return {'counters': counters, 'histograms': histograms}
+
+    # Prometheus 텍스트 형식
+    def to_prometheus(self):
+        snapshot = self.to_dict()
+        lines = []
+        typed = set()
+        for counter in snapshot['counters']:
+            if counter['name'] not in typed:
+                typed.add(counter['name'])
+                lines.append(f"# TYPE {counter['name']} counter\n")
+            lines.append(f"{counter['name']}{prometheus_labels(counter['labels'])} {counter['value']}\n")
+        for histogram in snapshot['histograms']:
+            name, labels = histogram['name'], histogram['labels']
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram\n")
+            for le, count in histogram['buckets'].items():
+                lines.append(f"{name}_bucket{prometheus_labels({**labels, 'le': le})} {count}\n")
+            lines.append(f"{name}_sum{prometheus_labels(labels)} {histogram['sum']}\n")
+            lines.append(f"{name}_count{prometheus_labels(labels)} {histogram['count']}\n")
+        return ''.join(lines)
+
+    # 파일로 저장 (.json 이면 JSON, 그 외에는 Prometheus 텍스트)
+    def dump(self, path):
+        if path.endswith('.json'):
+            text = json.dumps(self.to_dict(), ensure_ascii=False, indent=2) + '\n'
+        else:
+            text = self.to_prometheus()
+        atomic_write(path, [text])
+
+
+def prometheus_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+METRICS = Metrics()
+
+
+# 함수 실행 시간을 kupang_operation_seconds{operation=...} 에 기록 (측정을 켰을 때만)
+def timed(operation):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                METRICS.observe('kupang_operation_seconds', time.perf_counter() - started, operation=operation)
+        return wrapper
+    return decorate
+
+
+# SIGUSR1 을 받으면 측정값을 파일에 저장하는 스레드
+# 시그널 처리기는 METRICS.lock 을 잡은 채 끼어들 수 있으므로 깨우기만 하고 저장은 이 스레드에서 함
+class MetricsDumper:
+    def __init__(self, path):
+        self.path = path
+        self.requested = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='kupang-metrics', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    # 시그널 처리기 (잠금을 잡지 않음)
+    def request(self, signum=None, frame=None):
+        self.requested.set()
+
+    def run(self):
+        while True:
+            self.requested.wait()
+            self.requested.clear()
+            try:
+                METRICS.dump(self.path)
+            except OSError as error:
+                print(f"측정값 저장 실패: {error}", file=sys.stderr)
+
+
+# 측정 켜기, path 가 있으면 종료할 때와 SIGUSR1 을 받을 때 그 파일에 저장
+def enable_metrics(path=None):
+    METRICS.enabled = True
+    if path:
+        atexit.register(METRICS.dump, path)
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, MetricsDumper(path).start().request)
+
+
+# 데이터 폴더 잠금 (여러 프로세스가 같은 파일을 동시에 고치지 않도록 하는 권고 잠금)
+# 같은 프로세스 안에서는 겹쳐서 잡아도 됨
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            try:
+                self.file = open(self.path, 'a+b')
+                if fcntl is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self.file.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            pass  # LK_LOCK 은 10초 뒤 포기하므로 다시 시도
+            except BaseException:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+
+
+# 임시 파일에 다 쓴 뒤 한 번에 바꿔치기 (쓰는 도중 죽어도 원래 파일이 그대로 남음)
+# before_replace: 바꿔치기 직전에 부를 함수 (같은 파일을 매핑 중인 LazyOrderFile 닫기 등)
+# binary 이면 lines 는 bytes 조각들, sync 가 False 이면 fsync 하지 않음 (디스크 기록은 OS 에 맡김)
+def atomic_write(path, lines, before_replace=None, binary=False, sync=True):
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with (open(temp_path, 'wb') if binary else open(temp_path, 'w', encoding='utf-8')) as f:
+            f.writelines(lines)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+            METRICS.count('kupang_bytes_written_total', os.fstat(f.fileno()).st_size, file=os.path.basename(path))
+        if before_replace is not None:
+            before_replace()
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+# 파일(끝에 추가한 내용)이나 폴더(이름을 바꾼 파일)를 디스크에 기록
+def fsync_paths(paths):
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY if os.path.isdir(path) else os.O_RDWR)
+        except FileNotFoundError:
+            continue
+        except PermissionError:
+            continue  # 폴더는 열 수 없는 OS (Windows), 이름 바꾸기는 OS 가 바로 기록함
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# 파일이 바뀌었는지 확인하기 위한 값 (없으면 None)
+def file_identity(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+# 주문 줄들을 읽음, 끝에 줄바꿈 없이 잘린 줄(쓰다가 죽은 경우)은 건너뜀
+def parse_order_lines(lines, orders):
+    for line in lines:
+        if not line.strip():
+            continue
+        if not line.endswith('\n'):
+            continue  # 다음에 주문을 추가할 때 저장소가 잘라냄
+        try:
+            orders.append(Order.from_file_string(line))
+        except (ValueError, IndexError):
+            raise ValueError(f"잘못된 주문 정보: {line.strip()}")
+
+
+# 잠금 안에서 끝에 추가하기 전에 호출, 쓰다가 잘린 마지막 줄(size 앞의 줄바꿈 뒤)을 잘라내고 새 끝을 돌려줌
+# 줄바꿈을 붙여서 남기면 잘린 조각이 그대로 기록이 되어버림
+def truncate_torn_tail(f, size, block_size=4096):
+    end = size
+    while end > 0:
+        start = max(0, end - block_size)
+        f.seek(start)
+        newline = f.read(end - start).rfind(b'\n')
+        if newline >= 0:
+            end = start + newline + 1
+            break
+        end = start
+    if end < size:
+        f.truncate(end)
+    return end
+
+
+# 상품 변경 기록의 커밋 표시 줄: ORD,주문 파일 inode,커밋된 주문 파일 길이 (주문 파일이 없었으면 0,0)
+# 저장 한 번의 변경 기록 끝에 함께 쓰며, 이 줄까지 써져야 그 저장(주문 + 재고 변경)이 확정됨
+# 표시 뒤의 변경 기록과 표시가 가리키는 길이 뒤의 주문은 저장하다 실패한 것이므로 읽지 않고, 다음에 쓸 때 잘라냄
+def commit_mark_line(mark):
+    return f"ORD,{mark[0]},{mark[1]}\n".encode('utf-8')
+
+
+def parse_commit_mark(line):
+    kind, inode, length = line.split(b',')
+    return int(inode), int(length)
+
+
+# 변경 기록 파일 f (크기 size) 의 마지막 커밋 표시를 찾아 (표시, 표시 줄의 끝) 을 돌려줌
+# 표시가 하나도 없으면 (None, 마지막 줄바꿈 뒤), 이전 형식의 기록은 다 쓰인 줄이 모두 확정된 것
+def find_commit_mark(f, size, block_size=4096):
+    start = size
+    while True:
+        start = max(0, start - block_size)
+        f.seek(start)
+        data = f.read(size - start)
+        data = data[:data.rfind(b'\n') + 1]
+        line_start = data.rfind(b'\nORD,') + 1
+        if line_start == 0 and not (start == 0 and data.startswith(b'ORD,')):
+            if start == 0:
+                return None, len(data)
+            block_size *= 2
+            continue
+        line_end = data.index(b'\n', line_start) + 1
+        return parse_commit_mark(data[line_start:line_end - 1]), start + line_end
+
+
+# 파일을 줄바꿈에 맞춘 바이트 구간 [(시작, 끝)] 으로 나눔 (구간은 parts 개 이하, 각각 min_bytes 이상)
+def split_line_ranges(path, parts, min_bytes=1024 * 1024):
+    size = os.path.getsize(path)
+    parts = max(1, min(parts, size // min_bytes))
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, bounds[-1]))
+            f.readline()  # 줄 중간이면 다음 줄 처음으로
+            if f.tell() >= size:
+                break
+            bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+# 주문 파일의 start ~ end 구간을 읽음 (load_orders_parallel 의 작업 프로세스에서 실행)
+# (줄 수, OrderStore.to_columns() 또는 None, SalesRollup 또는 None, [(구간 안 줄 번호, 오류)]) 를 돌려줌
+def parse_order_range(path, start, end, keep_orders=True, sales=False):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = data.split(b'\n')
+    lines.pop()  # 마지막 줄바꿈 뒤 (쓰다가 잘린 줄이면 parse_order_lines 처럼 건너뜀)
+    store = OrderStore() if keep_orders else None
+    rollup = SalesRollup() if sales else None
+    errors = []
+    for line_no, raw in enumerate(lines, 1):
+        try:
+            line = raw.decode('utf-8')
+            if not line.strip():
+                continue
+            order = Order.from_file_string(line)
+        except (ValueError, IndexError):
+            errors.append((line_no, f"잘못된 주문 정보: {raw.decode('utf-8', 'replace').strip()}"))
+            continue
+        if store is not None:
+            store.append(order)
+        if rollup is not None:
+            rollup.add(order)
+    return len(lines), store.to_columns() if store is not None else None, rollup, errors
+
+
+# 큰 주문 파일(오프라인 대조용 내보내기 등)을 여러 프로세스로 나눠 읽음
+# orders 에는 파일 순서대로 붙이고 (None 이면 주문은 모으지 않음)
+# sales 이면 작업 프로세스마다 매출을 집계해서 부분 합계만 받아 합침
+# (SalesRollup 또는 None, [(줄 번호, 오류)]) 를 돌려줌, 잘못된 줄은 건너뛰고 오류 목록에 남김
+def load_orders_parallel(path, orders=None, sales=False, workers=None, min_chunk_bytes=1024 * 1024):
+    workers = workers or os.cpu_count() or 1
+    ranges = split_line_ranges(path, workers * 4, min_chunk_bytes)  # 구간 크기가 달라도 고르게 나눠지도록 여러 개로
+    tasks = [(path, start, end, orders is not None, sales) for start, end in ranges]
+    rollup = SalesRollup() if sales else None
+    errors = []
+    line_base = 0
+    with contextlib.ExitStack() as stack:
+        if workers == 1 or len(tasks) == 1:
+            results = itertools.starmap(parse_order_range, tasks)
+        else:
+            pool = stack.enter_context(ProcessPoolExecutor(min(workers, len(tasks))))
+            results = pool.map(parse_order_range, *zip(*tasks))
+        for line_count, columns, partial, chunk_errors in results:
+            if columns is not None:
+                orders.extend_columns(*columns)
+            if partial is not None:
+                rollup.merge(partial)
+            errors.extend((line_base + line_no, message) for line_no, message in chunk_errors)
+            line_base += line_count
+    return rollup, errors
+
+
+# 이진 저장 형식 (products.bin, orders.bin)
+# 파일 = 8바이트 표식 + 덩어리들, 덩어리마다 자기 문자열 사전이 있어서 파일 끝에 덩어리를 이어 붙일 수 있음
+# 덩어리 = 머리(표식, 행 수, 문자열 수, 본문 크기, 본문 CRC32) + 본문(문자열 길이 배열, 열 배열들, 문자열을 이은 UTF-8)
+# 문자열 열('I')에는 덩어리 안 문자열 번호를 저장하므로 상품명에 쉼표가 있어도 행이 어긋나지 않음
+class BinaryTable:
+    CHUNK_HEADER = struct.Struct('<4sIIQI')
+    CHUNK_MAGIC = b'KPCK'
+
+    def __init__(self, magic, columns):
+        self.magic = magic
+        self.columns = columns  # (열 이름, array 형식) 목록
+        self.row_size = sum(array(typecode).itemsize for name, typecode in columns)
+
+    # strings: 문자열 목록, columns: 열 이름 -> 배열 (문자열 열은 strings 의 번호)
+    def pack_chunk(self, strings, columns):
+        rows = len(columns[self.columns[0][0]])
+        parts = [array('I', map(len, strings))]
+        for name, typecode in self.columns:
+            column = columns[name]
+            parts.append(column if column.typecode == typecode else array(typecode, column))
+        body = b''.join(map(little_endian_bytes, parts)) + ''.join(strings).encode('utf-8')
+        return self.CHUNK_HEADER.pack(self.CHUNK_MAGIC, rows, len(strings), len(body), zlib.crc32(body)) + body
+
+    # pos 에서 시작하는 덩어리 하나를 읽어 (문자열 목록, 열들, 끝 위치) 를 돌려줌
+    # 파일 끝에서 다 쓰이지 않은 덩어리(쓰다가 죽은 경우)면 None, 중간이 깨졌으면 ValueError
+    def read_chunk(self, data, pos):
+        if pos + self.CHUNK_HEADER.size > len(data):
+            return None
+        magic, rows, string_count, body_size, crc = self.CHUNK_HEADER.unpack_from(data, pos)
+        start = pos + self.CHUNK_HEADER.size
+        end = start + body_size
+        if magic != self.CHUNK_MAGIC:
+            if not any(data[pos:]):
+                return None  # 미리 잡힌 빈 공간만 남음
+            raise ValueError(f"잘못된 데이터 ({pos} 바이트 위치)")
+        if end > len(data):
+            return None
+        body = memoryview(data)[start:end]
+        if zlib.crc32(body) != crc or body_size < 4 * string_count + rows * self.row_size:
+            if end == len(data):
+                return None
+            raise ValueError(f"손상된 데이터 ({pos} 바이트 위치)")
+
+        lengths = array('I')
+        lengths.frombytes(body[:4 * string_count])
+        offset = 4 * string_count
+        columns = {}
+        for name, typecode in self.columns:
+            column = array(typecode)
+            size = rows * column.itemsize
+            column.frombytes(body[offset:offset + size])
+            offset += size
+            columns[name] = column
+        if sys.byteorder != 'little':
+            lengths.byteswap()
+            for column in columns.values():
+                column.byteswap()
+        text = str(body[offset:], 'utf-8')
+        ends = list(itertools.accumulate(lengths))
+        strings = [text[begin:finish] for begin, finish in zip([0, *ends], ends)]
+        return strings, columns, end
+
+    # pos 부터 다 쓰인 덩어리들을 차례로 돌려줌
+    def read_chunks(self, data, pos):
+        while True:
+            chunk = self.read_chunk(data, pos)
+            if chunk is None:
+                return
+            yield chunk
+            pos = chunk[2]
+
+    # pos 부터 다 쓰인 덩어리가 끝나는 곳
+    def complete_end(self, data, pos):
+        for strings, columns, pos in self.read_chunks(data, pos):
+            pass
+        return pos
+
+    # 파일 전체를 읽어 (내용, 덩어리 시작 위치) 를 돌려줌, 없으면 (b'', 0)
+    def read_file(self, path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return b'', 0
+        if not data:
+            return data, 0
+        if data[:len(self.magic)] != self.magic:
+            raise ValueError(f"이진 데이터 파일이 아닙니다: {path}")
+        return data, len(self.magic)
+
+
+# 주문 파일 조각이 표식으로 시작하면 표식 길이, 아니면 0
+def skip_magic(data):
+    return len(ORDER_TABLE.magic) if data[:len(ORDER_TABLE.magic)] == ORDER_TABLE.magic else 0
+
+
+def little_endian_bytes(column):
+    if sys.byteorder != 'little':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+PRODUCT_TABLE = BinaryTable(b'KPPRD001', (('product_ids', 'I'), ('names', 'I'), ('prices', 'q'), ('quantities', 'q')))
+ORDER_TABLE = BinaryTable(b'KPORD001', (
+    ('order_numbers', 'q'), ('other_ids', 'I'), ('product_ids', 'I'), ('product_names', 'I'), ('prices', 'q'),
+    ('quantities', 'q'), ('customer_names', 'I'), ('customer_addresses', 'I'), ('order_dates', 'I')))
+
+
+# 상품 변경 기록 한 줄 -> (상품번호, (상품명, 가격, 수량)), 삭제 기록이면 (상품번호, None)
+# SET,상품번호,상품명,가격,수량 / DEL,상품번호 (상품명에 쉼표가 있어도 뒤에서부터 나눔)
+def parse_product_change(line):
+    kind, rest = line.split(',', 1)
+    if kind == 'DEL':
+        return rest, None
+    if kind != 'SET':
+        raise ValueError(f"잘못된 상품 변경 기록: {line}")
+    product_id, rest = rest.split(',', 1)
+    name, price, quantity = rest.rsplit(',', 2)
+    return product_id, (name, int(price), int(quantity))
+
+
+# 저장소 인터페이스 (상품/주문/매출/유저 정보를 어디에 어떻게 저장할지 담당)
+# 여러 프로세스가 같은 데이터를 쓸 때는 locked() 안에서 refresh 한 뒤 고치고 저장함
+class Storage:
+    lock = None  # 데이터 폴더 잠금 (FileLock)
+
+    # 데이터 잠금, 다른 프로세스는 이 안에서 저장소를 고칠 수 없음
+    def locked(self):
+        return self.lock if self.lock is not None else contextlib.nullcontext()
+
+    # 안에서 부른 저장을 모두 확정하거나 하나도 확정하지 않음 (저장소 잠금 안, 다시 불러도 바깥 것에 모음)
+    def write_batch(self):
+        return contextlib.nullcontext()
+
+    # 마지막으로 읽거나 쓴 뒤에 다른 프로세스가 상품 정보를 바꿨는지
+    def products_changed(self):
+        return False
+
+    # 마지막으로 읽거나 쓴 뒤에 다른 프로세스가 바꾼 상품 [(상품번호, 상품 또는 삭제면 None)]
+    # 하나씩 알 수 없으면 None (전부 다시 읽어야 함)
+    def read_product_changes(self):
+        return None if self.products_changed() else []
+
+    # 마지막으로 읽거나 쓴 뒤에 다른 프로세스가 추가한 주문 목록
+    # 주문 파일이 통째로 바뀌었으면 None (전부 다시 읽어야 함)
+    def read_new_orders(self):
+        return []
+
+    # 스냅샷에 아직 합쳐지지 않은 변경 기록 크기(바이트)
+    def journal_size(self):
+        return 0
+
+    # 마지막 sync 뒤에 쓴 내용을 디스크에 기록 (fsync)
+    def sync(self):
+        pass
+
+    # 저장 방식이 스스로 정하는 내구성 수준을 맞춤 (DURABILITY_LEVELS 중 하나)
+    def set_durability(self, durability):
+        pass
+
+    # 변경 기록을 스냅샷에 합침 (압축), 다른 스레드에서 불러도 됨
+    def compact(self):
+        pass
+
+    # 상품 전체를 products 딕셔너리에 읽어옴 (형식 오류 시 ValueError)
+    def load_products(self, products):
+        raise NotImplementedError
+
+    # 상품 전체를 다시 저장
+    def save_products(self, products):
+        raise NotImplementedError
+
+    # 상품 한 건(추가/수정) 저장
+    def save_product(self, products, product_id):
+        raise NotImplementedError
+
+    # 상품 여러 건(추가/수정) 저장, 일괄 처리 시 한 번만 호출
+    def save_product_changes(self, products, product_ids):
+        for product_id in product_ids:
+            self.save_product(products, product_id)
+
+    # 상품 한 건 삭제
+    def delete_product(self, products, product_id):
+        raise NotImplementedError
+
+    # 상품 번호로 상품 조회, 없으면 None
+    def get_product(self, product_id):
+        raise NotImplementedError
+
+    # 주문 전체를 orders 리스트에 읽어옴 (형식 오류 시 ValueError)
+    def load_orders(self, orders):
+        raise NotImplementedError
+
+    # 주문 목록 열기, 기본은 orders 에 전부 읽어와서 그대로 돌려줌
+    def open_orders(self, orders):
+        self.load_orders(orders)
+        return orders
+
+    # 주문 한 건 추가
+    def append_order(self, order):
+        raise NotImplementedError
+
+    # 주문 여러 건 추가, 일괄 처리 시 한 번만 호출
+    def append_orders(self, orders):
+        for order in orders:
+            self.append_order(order)
+
+    # 주문 전체를 다시 저장
+    def save_orders(self, orders):
+        raise NotImplementedError
+
+    # 주문 번호로 주문 조회, 없으면 None
+    def get_order(self, order_id):
+        raise NotImplementedError
+
+    # 매출 정보 한 건 저장
+    def save_sale(self, order):
+        raise NotImplementedError
+
+    # 매출 정보 여러 건 저장, 일괄 처리 시 한 번만 호출
+    def save_sales_records(self, orders):
+        for order in orders:
+            self.save_sale(order)
+
+    # 매출 집계 읽어오기, 없거나 읽을 수 없으면 None
+    def load_sales_rollup(self):
+        raise NotImplementedError
+
+    # 매출 집계 저장 (orders: 이번에 집계에 반영된 주문들, None 이면 전체)
+    def save_sales_rollup(self, rollup, orders=None):
+        raise NotImplementedError
+
+    # 번호 발급기가 예약해 둔 번호 (없으면 None)
+    def load_sequence(self, name):
+        raise NotImplementedError
+
+    def save_sequence(self, name, value):
+        raise NotImplementedError
+
+    # 유저 정보 저장소 준비
+    def save_user(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# 기존 텍스트 파일(products.txt, orders.txt, sales.txt, users.txt) 저장소
+# lazy_orders 이면 orders.txt 를 미리 읽지 않고 LazyOrderFile 로 필요할 때만 읽음
+# 통째로 다시 쓰는 파일은 임시 파일에 쓴 뒤 바꿔치기하고, 추가만 하는 파일은 잠금 안에서 끝에 붙임
+class TextFileStorage(Storage):
+    def __init__(self, data_dir='.', lazy_orders=False):
+        self.data_dir = data_dir
+        self.lazy_orders = lazy_orders
+        self.products_path = os.path.join(data_dir, 'products.txt')
+        self.orders_path = os.path.join(data_dir, 'orders.txt')
+        self.sales_path = os.path.join(data_dir, 'sales.txt')
+        self.sales_summary_path = os.path.join(data_dir, 'sales_summary.json')
+        self.users_path = os.path.join(data_dir, 'users.txt')
+        self.sequences_path = os.path.join(data_dir, 'sequences.txt')
+        self.journal_path = os.path.join(data_dir, 'products.journal')
+        self.snapshot_path = os.path.join(data_dir, 'orders.snapshot')
+        self.lock = FileLock(os.path.join(data_dir, '.kupang.lock'))
+        self.products_identity = None  # 마지막으로 읽거나 쓴 products.txt
+        self.journal_inode = None  # 읽고 있는 products.journal (압축하면 바뀜)
+        self.journal_consumed = 0  # products.journal 에서 이미 읽은 곳
+        self.orders_inode = None  # 읽고 있는 orders.txt (다시 쓰이면 바뀜)
+        self.orders_consumed = 0  # orders.txt 에서 이미 읽은 곳
+        self.own_appends = []  # 직접 추가한 구간 [(시작, 끝)], 새 주문을 읽을 때 건너뜀
+        self.unsynced = set()  # 마지막 sync 뒤에 끝에 추가로 쓴 파일
+        self.commit_mark = None  # 마지막으로 읽은 커밋 표시 (주문 파일 inode, 커밋된 길이), 표시가 없는 기록이면 None
+        self.batch = None  # write_batch 안에서 모으는 {'journal': [...], 'sales': [...], 'mark': 새 커밋 표시}
+        # 주문할 때마다 통째로 다시 쓰는 파일(번호, 매출 집계, 주문 전체)을 fsync 할지
+        # durability 가 batch/commit 일 때만 함, 압축 때 쓰는 파일은 기록을 비우기 전에 항상 fsync
+        self.sync_writes = False
+
+    # 상품 = products.txt (마지막 압축 시점) + products.journal (그 뒤의 변경 기록)
+    def load_products(self, products):
+        with self.lock:  # 압축 중인 파일을 반만 읽지 않도록
+            self.products_identity = file_identity(self.products_path)
+            self.read_products_file(products)
+            self.journal_inode, self.journal_consumed, self.commit_mark = self.replay_journal(products)
+
+    def read_products_file(self, products):
+        try:
+            with open(self.products_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():  # Check if the line is not empty
+                        product_id, product_name, product_price, product_quantity,  = line.strip().split(',')
+                        products[product_id] = (product_name, int(product_price), int(product_quantity))
+        except FileNotFoundError:
+            pass  # File not found, do nothing
+
+    def write_products_file(self, products):
+        atomic_write(self.products_path, (f"{product_id},{name},{price},{quantity}\n"
+                                          for product_id, (name, price, quantity) in products.items()))
+
+    # 변경 기록을 start 부터 마지막 커밋 표시까지 읽어서
+    # (journal inode, 읽은 곳, [(상품번호, 상품 또는 None)], 마지막 커밋 표시 또는 None) 을 돌려줌
+    # marked 는 start 앞에 커밋 표시가 있었는지, 표시가 한 번도 없는 이전 형식이면 다 쓰인 줄을 모두 읽음
+    def read_journal(self, start=0, marked=False):
+        try:
+            with open(self.journal_path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                f.seek(start)
+                data = f.read()
+        except FileNotFoundError:
+            return None, 0, [], None
+        data = data[:data.rfind(b'\n') + 1]  # 쓰다가 잘린 마지막 줄은 빼고
+        committed, changes, mark = [], [], None
+        pos = end = 0
+        for line in data.splitlines(keepends=True):
+            pos += len(line)
+            if line.startswith(b'ORD,'):
+                mark = parse_commit_mark(line.rstrip(b'\r\n'))
+                committed.extend(changes)
+                changes = []
+                end = pos
+            else:
+                changes.append(parse_product_change(line.decode('utf-8').rstrip('\r\n')))
+        if mark is None and not marked:
+            committed, end = changes, pos
+        return inode, start + end, committed, mark
+
+    # 변경 기록을 start 부터 products 에 반영하고 (journal inode, 읽은 곳, 마지막 커밋 표시) 를 돌려줌
+    def replay_journal(self, products, start=0):
+        inode, consumed, changes, mark = self.read_journal(start)
+        for product_id, product in changes:
+            if product is None:
+                products.pop(product_id, None)
+            else:
+                products[product_id] = product
+        return inode, consumed, mark
+
+    # 상품 전체를 다시 저장하고 변경 기록은 커밋 표시만 남기고 비움
+    def save_products(self, products):
+        with self.lock:
+            self.write_products_file(products)
+            fsync_paths([self.data_dir])  # 기록을 비우기 전에 새 products 파일이 남도록
+            self.reset_journal(self.journal_commit_mark()[0])
+            self.products_identity = file_identity(self.products_path)
+
+    # 변경 기록을 mark 만 남기고 비움 (다시 읽을 필요 없음)
+    def reset_journal(self, mark):
+        data = commit_mark_line(mark) if mark is not None else b''
+        atomic_write(self.journal_path, [data], binary=True)
+        self.journal_inode, self.journal_consumed = file_identity(self.journal_path)[0], len(data)
+        self.commit_mark = mark
+
+    # 지금 변경 기록의 (마지막 커밋 표시, 표시 줄의 끝), 표시가 없으면 (None, 마지막 줄바꿈 뒤) (잠금 안)
+    def journal_commit_mark(self):
+        journal = file_identity(self.journal_path)
+        if self.commit_mark is not None and journal is not None and journal[:2] == (self.journal_inode,
+                                                                                     self.journal_consumed):
+            return self.commit_mark, self.journal_consumed  # 끝까지 읽었으면 마지막 표시는 이미 알고 있음
+        try:
+            with open(self.journal_path, 'rb') as f:
+                return find_commit_mark(f, os.fstat(f.fileno()).st_size)
+        except FileNotFoundError:
+            return None, 0
+
+    # 커밋 표시로 본 주문 파일(inode)의 커밋된 길이, 표시가 없거나 다른 파일의 표시면 None (끝까지)
+    def committed_length(self, inode, mark=None):
+        mark = self.commit_mark if mark is None else mark
+        if mark is None:
+            return None
+        mark_inode, length = mark
+        if mark_inode == 0:
+            return 0  # 표시할 때는 주문 파일이 없었음
+        return length if mark_inode == inode else None
+
+    # 지금 주문 파일을 그대로 커밋하는 표시 (이전 형식이라 표시가 없을 때 처음 쓸 표시)
+    def orders_file_mark(self):
+        identity = file_identity(self.orders_path)
+        return (0, 0) if identity is None else (identity[0], identity[1])
+
+    # 저장을 모았다가 변경 기록과 커밋 표시를 한 번에 씀 (여기가 확정 시점), 매출 기록은 확정된 뒤에 씀
+    # 안에서 예외가 나면 아무것도 쓰지 않음 (이미 추가한 주문은 표시 뒤에 남아 읽히지 않고 다음에 잘림)
+    @contextlib.contextmanager
+    def write_batch(self):
+        if self.batch is not None:
+            yield
+            return
+        with self.lock:
+            self.batch = {'journal': [], 'sales': [], 'mark': None}
+            try:
+                yield
+                batch = self.batch
+            finally:
+                self.batch = None
+            if batch['journal'] or batch['mark'] is not None:
+                self.write_journal(b''.join(batch['journal']), batch['mark'])
+            if batch['sales']:
+                self.write_sales(b''.join(batch['sales']))
+
+    def products_changed(self):
+        if file_identity(self.products_path) != self.products_identity:
+            return True
+        journal = file_identity(self.journal_path)
+        if journal is None:
+            return self.journal_inode is not None
+        return journal[0] != self.journal_inode or journal[1] != self.journal_consumed
+
+    # 다른 프로세스가 남긴 변경 기록만 읽음 (기록이 압축됐으면 None)
+    def read_product_changes(self):
+        journal = file_identity(self.journal_path)
+        if file_identity(self.products_path) != self.products_identity:
+            return None
+        if journal is None:
+            return [] if self.journal_inode is None else None
+        inode, size, mtime = journal
+        if self.journal_inode is not None and inode != self.journal_inode or size < self.journal_consumed:
+            return None
+        self.journal_inode = inode
+        if size == self.journal_consumed:
+            return []
+        self.journal_inode, self.journal_consumed, changes, mark = self.read_journal(
+            self.journal_consumed, self.commit_mark is not None)
+        if mark is not None:
+            self.commit_mark = mark
+        return changes
+
+    # 상품 변경은 기록 끝에 한 줄씩 추가 (같은 기록을 다시 적용해도 결과가 같음)
+    def save_product(self, products, product_id):
+        self.save_product_changes(products, [product_id])
+
+    def save_product_changes(self, products, product_ids):
+        lines = []
+        for product_id in product_ids:
+            if product_id in products:
+                name, price, quantity = products[product_id]
+                lines.append(f"SET,{product_id},{name},{price},{quantity}\n")
+            else:
+                lines.append(f"DEL,{product_id}\n")
+        self.append_journal(''.join(lines).encode('utf-8'))
+
+    def delete_product(self, products, product_id):
+        self.append_journal(f"DEL,{product_id}\n".encode('utf-8'))
+
+    def append_journal(self, data):
+        with self.write_batch():
+            self.batch['journal'].append(data)
+
+    # 변경 기록 끝에 data 와 커밋 표시를 한 번에 추가 (mark 가 None 이면 주문은 그대로인 표시)
+    def write_journal(self, data, mark):
+        with open(self.journal_path, 'a+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            last_mark, start = find_commit_mark(f, size)
+            if start < size:
+                f.truncate(start)  # 쓰다가 잘렸거나 커밋하지 못한 기록은 버림
+            if mark is None:
+                mark = last_mark if last_mark is not None else self.orders_file_mark()
+            data += commit_mark_line(mark)
+            f.write(data)
+            inode = os.fstat(f.fileno()).st_ino
+        self.unsynced.add(self.journal_path)
+        METRICS.count('kupang_bytes_written_total', len(data), file=os.path.basename(self.journal_path))
+        if self.journal_inode in (None, inode) and start == self.journal_consumed:
+            # 다른 프로세스의 기록이 사이에 없으면 직접 쓴 부분은 다시 읽지 않음
+            self.journal_inode, self.journal_consumed, self.commit_mark = inode, start + len(data), mark
+
+    def get_product(self, product_id):
+        products = {}
+        with self.lock:
+            self.read_products_file(products)
+            self.replay_journal(products)
+        return products.get(product_id)
+
+    # 스냅샷이 맞으면 스냅샷을 읽고 orders.txt 는 그 뒤부터만 읽음
+    def load_orders(self, orders):
+        self.orders_inode = None
+        self.orders_consumed = 0
+        self.own_appends = []
+        try:
+            with open(self.orders_path, 'rb') as f:
+                self.orders_inode = os.fstat(f.fileno()).st_ino
+                limit = self.committed_length(self.orders_inode)
+                self.orders_consumed = self.load_orders_snapshot(f, orders, limit)
+                f.seek(self.orders_consumed)
+                parse_order_lines(self.read_lines(f, limit), orders)  # Parse each order
+        except FileNotFoundError:
+            pass
+
+    # orders.snapshot = 머리(표식, orders.txt inode, 담고 있는 길이) + 그 길이 바로 앞의 CHECK_BYTES 바이트
+    #                   + ORDER_TABLE 덩어리
+    SNAPSHOT_HEADER = struct.Struct('<8sQQ')
+    SNAPSHOT_MAGIC = b'KPSNAP01'
+    CHECK_BYTES = 64
+
+    # f(orders.txt) 와 맞는 스냅샷이 있으면 orders 에 읽고 담고 있는 길이를, 없으면 0 을 돌려줌
+    # limit: 커밋된 길이 (스냅샷이 이보다 많이 담고 있으면 쓰지 않음)
+    def load_orders_snapshot(self, f, orders, limit=None):
+        if self.snapshot_path is None:
+            return 0
+        snapshot = self.read_orders_snapshot(f)
+        if snapshot is None:
+            return 0
+        covered, chunks = snapshot
+        if limit is not None and covered > limit:
+            return 0
+        store = orders if isinstance(orders, OrderStore) else OrderStore()
+        for strings, columns, pos in chunks:
+            store.extend_columns(strings, columns)
+        if store is not orders:
+            orders.extend(store)
+        return covered
+
+    # (담고 있는 길이, 덩어리들), 스냅샷이 없거나 f 의 내용과 맞지 않으면 None
+    def read_orders_snapshot(self, f):
+        try:
+            with open(self.snapshot_path, 'rb') as snapshot:
+                data = snapshot.read()
+        except FileNotFoundError:
+            return None
+        start = self.SNAPSHOT_HEADER.size + self.CHECK_BYTES
+        if len(data) < start:
+            return None
+        magic, inode, covered = self.SNAPSHOT_HEADER.unpack_from(data)
+        stat = os.fstat(f.fileno())
+        if magic != self.SNAPSHOT_MAGIC or inode != stat.st_ino or covered > stat.st_size:
+            return None
+        if data[self.SNAPSHOT_HEADER.size:start] != self.check_bytes(f, covered):
+            return None  # orders.txt 가 다시 쓰였음
+        try:
+            return covered, list(ORDER_TABLE.read_chunks(data, start))
+        except ValueError:
+            return None
+
+    def check_bytes(self, f, covered):
+        f.seek(max(0, covered - self.CHECK_BYTES))
+        return f.read(min(covered, self.CHECK_BYTES)).ljust(self.CHECK_BYTES, b'\0')
+
+    def journal_size(self):
+        size = 0
+        journal = file_identity(self.journal_path)
+        if journal is not None and not self.journal_is_empty(journal[1]):
+            size += journal[1]
+        orders = file_identity(self.orders_path)
+        if orders is not None and self.snapshot_path is not None:
+            size += orders[1] - self.snapshot_covered(orders[0], orders[1])
+        return size
+
+    # 확정 표시 한 줄만 남은 저널(압축 직후)은 빈 저널로 침
+    def journal_is_empty(self, size):
+        if size > 64:
+            return False
+        try:
+            with open(self.journal_path, 'rb') as f:
+                data = f.read(size)
+        except FileNotFoundError:
+            return True
+        return data == b'' or (data.startswith(b'ORD,') and data.find(b'\n') == len(data) - 1)
+
+    # 스냅샷 머리만 보고 담고 있는 orders.txt 길이를 돌려줌 (맞지 않으면 0)
+    def snapshot_covered(self, inode, size):
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                header = f.read(self.SNAPSHOT_HEADER.size)
+        except FileNotFoundError:
+            return 0
+        if len(header) < self.SNAPSHOT_HEADER.size:
+            return 0
+        magic, snapshot_inode, covered = self.SNAPSHOT_HEADER.unpack(header)
+        if magic != self.SNAPSHOT_MAGIC or snapshot_inode != inode or covered > size:
+            return 0
+        return covered
+
+    def compact(self):
+        self.compact_orders()
+        self.compact_products()
+        self.compact_sales_summary()
+
+    def close(self):
+        self.compact_sales_summary()
+
+    # 이전 스냅샷 + 그 뒤에 추가된 주문으로 새 스냅샷을 만듦
+    # orders.txt 는 끝에 추가만 되므로 잠그지 않고 파일만 읽음 (주문 처리를 막지 않음)
+    def compact_orders(self):
+        if self.snapshot_path is None:
+            return
+        try:
+            f = open(self.orders_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            with self.lock:
+                limit = self.committed_length(os.fstat(f.fileno()).st_ino, self.journal_commit_mark()[0])
+            orders = OrderStore()
+            covered = self.load_orders_snapshot(f, orders, limit)
+            f.seek(covered)
+            data = f.read() if limit is None else f.read(max(0, limit - covered))
+            data = data[:data.rfind(b'\n') + 1]  # 아직 다 쓰지 않은 마지막 줄은 다음에
+            if not data:
+                return
+            parse_order_lines(data.decode('utf-8').splitlines(keepends=True), orders)
+            covered += len(data)
+            header = (self.SNAPSHOT_HEADER.pack(self.SNAPSHOT_MAGIC, os.fstat(f.fileno()).st_ino, covered)
+                      + self.check_bytes(f, covered))
+        atomic_write(self.snapshot_path, [header, ORDER_TABLE.pack_chunk(*orders.to_columns())], binary=True)
+
+    # products.txt 에 변경 기록을 합치고 기록을 비움
+    # 합친 뒤 기록을 비우기 전에 죽어도, 기록을 다시 적용한 결과가 같으므로 안전함
+    def compact_products(self):
+        with self.lock:
+            journal = file_identity(self.journal_path)
+            if journal is None or self.journal_is_empty(journal[1]):
+                return
+            up_to_date = not self.products_changed()
+            products = {}
+            self.read_products_file(products)
+            inode, consumed, mark = self.replay_journal(products)
+            if mark is not None and consumed == len(commit_mark_line(mark)):
+                return  # 커밋 표시만 있음 (합칠 변경이 없음)
+            self.write_products_file(products)
+            fsync_paths([self.data_dir])  # 기록을 비우기 전에 새 products 파일이 남도록
+            journal = self.journal_inode, self.journal_consumed, self.commit_mark
+            self.reset_journal(mark)
+            if up_to_date:
+                # 이미 모두 읽은 상태였으면 다시 읽을 필요 없음
+                self.products_identity = file_identity(self.products_path)
+            else:
+                self.journal_inode, self.journal_consumed, self.commit_mark = journal
+
+    # 읽은 만큼 orders_consumed 를 늘리면서 한 줄씩 돌려줌 (limit 은 커밋된 길이, None 이면 끝까지)
+    def read_lines(self, f, limit=None):
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                return  # 쓰다가 잘린 마지막 줄은 읽은 것으로 치지 않음
+            if limit is not None and self.orders_consumed + len(raw) > limit:
+                return  # 커밋하지 못한 주문
+            self.orders_consumed += len(raw)
+            yield raw.decode('utf-8')
+
+    def open_orders(self, orders):
+        if self.lazy_orders:
+            identity = file_identity(self.orders_path)
+            lazy = LazyOrderFile(self.orders_path, identity and self.committed_length(identity[0]))
+            self.orders_inode = file_identity(self.orders_path)[0] if lazy.size else None
+            self.orders_consumed = lazy.size
+            self.own_appends = []
+            return lazy
+        return super().open_orders(orders)
+
+    def read_new_orders(self):
+        identity = file_identity(self.orders_path)
+        if identity is None:
+            return [] if self.orders_inode is None else None
+        inode, size, mtime = identity
+        if self.orders_inode is not None and inode != self.orders_inode or size < self.orders_consumed:
+            return None  # 다른 프로세스가 통째로 다시 씀
+        self.orders_inode = inode
+        limit = self.committed_length(inode)
+        if limit is not None:
+            size = min(size, limit)  # 커밋 표시 뒤의 주문은 아직 확정되지 않음
+        if size <= self.orders_consumed:
+            return []
+
+        with open(self.orders_path, 'rb') as f:
+            f.seek(self.orders_consumed)
+            data = f.read(size - self.orders_consumed)
+        data = data[:self.complete_length(data)]  # 아직 다 쓰지 않은 마지막 부분은 다음에
+        start = self.orders_consumed
+        end = start + len(data)
+        # 직접 추가한 구간은 이미 메모리에 있으므로 빼고 읽음
+        pieces = []
+        pos = start
+        for own_start, own_end in sorted(self.own_appends):
+            if own_end <= pos or own_start >= end:
+                continue
+            pieces.append(data[pos - start:own_start - start])
+            pos = own_end
+        pieces.append(data[pos - start:])
+        self.own_appends = [(own_start, own_end) for own_start, own_end in self.own_appends if own_end > end]
+        self.orders_consumed = end
+        return self.parse_new_orders(b''.join(pieces))
+
+    # 새로 읽은 부분 중 다 쓰인 곳까지의 길이 (마지막 줄바꿈까지)
+    def complete_length(self, data):
+        return data.rfind(b'\n') + 1
+
+    def parse_new_orders(self, data):
+        orders = []
+        parse_order_lines(data.decode('utf-8').splitlines(keepends=True), orders)
+        return orders
+
+    def append_order(self, order):
+        self.append_orders([order])
+
+    def append_orders(self, orders):
+        data = self.encode_orders(orders)
+        with self.write_batch():
+            with open(self.orders_path, 'a+b') as f:
+                size = f.seek(0, os.SEEK_END)
+                inode = os.fstat(f.fileno()).st_ino
+                committed = self.committed_length(inode, self.batch['mark'] or self.journal_commit_mark()[0])
+                if committed is not None and committed < size:
+                    f.truncate(committed)  # 커밋하지 못한 주문은 버림
+                    size = committed
+                start, data = self.fix_tail(f, size, data)
+                f.write(data)
+                self.batch['mark'] = (inode, start + len(data))
+            self.unsynced.add(self.orders_path)
+            METRICS.count('kupang_bytes_written_total', len(data), file=os.path.basename(self.orders_path))
+            if self.orders_inode is None:
+                self.orders_inode = file_identity(self.orders_path)[0]
+            if start == self.orders_consumed:
+                self.orders_consumed = start + len(data)
+            else:
+                self.own_appends.append((start, start + len(data)))
+
+    def encode_orders(self, orders):
+        return ''.join(order.to_file_string() for order in orders).encode('utf-8')
+
+    # 파일 끝(start)에 data 를 붙이기 전 처리, 쓰다가 잘린 마지막 줄(읽을 때도 건너뜀)은 잘라냄
+    def fix_tail(self, f, start, data):
+        end = truncate_torn_tail(f, start)
+        self.orders_consumed = min(self.orders_consumed, end)
+        return end, data
+
+    # 임시 파일에 다 쓴 뒤 교체 (LazyOrderFile 이 같은 파일을 읽고 있어도 안전)
+    def save_orders(self, orders):
+        lazy = orders if isinstance(orders, LazyOrderFile) else None
+        with self.write_batch():
+            atomic_write(self.orders_path, (order.to_file_string() for order in orders),
+                         lazy.close if lazy is not None else None, sync=self.sync_writes)
+            if lazy is not None:
+                lazy.reopen()
+            self.orders_inode, self.orders_consumed, mtime = file_identity(self.orders_path)
+            self.own_appends = []
+            self.batch['mark'] = (self.orders_inode, self.orders_consumed)
+
+    def get_order(self, order_id):
+        try:
+            with open(self.orders_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith(order_id + ','):
+                        return Order.from_file_string(line)
+        except FileNotFoundError:
+            pass
+        return None
+
+    def save_sale(self, order):
+        self.save_sales_records([order])
+
+    def save_sales_records(self, orders):
+        data = ''.join(f"{order.product_id},{order.product_name},{order.quantity},{order.product_price * order.quantity}원\n"
+                       for order in orders).encode('utf-8')
+        with self.write_batch():
+            self.batch['sales'].append(data)
+
+    # sales.txt 는 주문에서 다시 만들 수 있는 기록이므로 저장이 확정된 뒤에 씀
+    def write_sales(self, data):
+        with open(self.sales_path, 'ab') as f:
+            f.write(data)
+        self.unsynced.add(self.sales_path)
+        METRICS.count('kupang_bytes_written_total', len(data), file='sales.txt')
+
+    # sales_summary.json = 매출 집계 + 집계에 반영된 주문 파일 위치 (orders_inode, orders_offset)
+    # 위치가 방금 읽은 주문 파일의 것이 아니면 (다시 쓰였거나 이전 형식) 쓰지 않고 주문 목록으로 다시 집계
+    def load_sales_rollup(self):
+        summary = self.read_sales_summary()
+        if summary is None:
+            return None
+        rollup, inode, offset = summary
+        if inode != self.orders_inode or offset > self.orders_consumed:
+            return None
+        return rollup
+
+    def read_sales_summary(self):
+        try:
+            with open(self.sales_summary_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return SalesRollup.from_dict(data), data['orders_inode'], int(data['orders_offset'])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return None  # 없거나 깨졌으면 주문 목록으로 다시 집계
+
+    def write_sales_summary(self, rollup, inode, offset):
+        data = {**rollup.to_dict(), 'orders_inode': inode, 'orders_offset': offset}
+        atomic_write(self.sales_summary_path, [json.dumps(data, ensure_ascii=False)], sync=self.sync_writes)
+
+    # 주문마다 쓰지 않고 압축할 때와 닫을 때 파일의 주문으로 맞춤 (compact_sales_summary)
+    # 전체를 다시 집계했을 때(orders 가 None)만 방금 읽은 주문 파일 위치와 함께 바로 씀
+    def save_sales_rollup(self, rollup, orders=None):
+        if orders is None and self.orders_inode is not None:
+            self.write_sales_summary(rollup, self.orders_inode, self.orders_consumed)
+
+    # 매출 집계를 커밋된 주문까지 맞춰 씀 (저장된 집계의 위치 뒤의 주문만 더함)
+    # 메모리의 집계를 쓰지 않으므로 저장하다 실패한 주문이나 쓰는 중인 집계가 들어가지 않음
+    def compact_sales_summary(self):
+        orders_file = file_identity(self.orders_path)
+        if orders_file is None:
+            return
+        with self.lock:
+            limit = self.committed_length(orders_file[0], self.journal_commit_mark()[0])
+        end = orders_file[1] if limit is None else limit
+        rollup, start = SalesRollup(), 0
+        summary = self.read_sales_summary()
+        if summary is not None and summary[1] == orders_file[0] and summary[2] <= end:
+            rollup, inode, start = summary
+        try:
+            orders, inode, end = self.read_committed_orders(start, limit)
+        except FileNotFoundError:
+            return
+        if inode != orders_file[0] or summary is not None and summary[1:] == (inode, end):
+            return  # 그 사이에 다시 쓰였거나 이미 맞음
+        for order in orders:
+            rollup.add(order)
+        self.write_sales_summary(rollup, inode, end)
+
+    # 주문 파일의 start 부터 커밋된 길이(limit, None 이면 다 쓰인 줄까지)까지의 주문, (주문들, inode, 읽은 끝)
+    def read_committed_orders(self, start, limit):
+        with open(self.orders_path, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            f.seek(start)
+            data = f.read() if limit is None else f.read(max(0, limit - start))
+        data = data[:data.rfind(b'\n') + 1]
+        orders = OrderStore()
+        parse_order_lines(data.decode('utf-8').splitlines(keepends=True), orders)
+        return orders, inode, start + len(data)
+
+    def load_sequences(self):
+        sequences = {}
+        try:
+            with open(self.sequences_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        name, value = line.strip().split(',')
+                        sequences[name] = int(value)
+        except FileNotFoundError:
+            pass
+        return sequences
+
+    def load_sequence(self, name):
+        return self.load_sequences().get(name)
+
+    def save_sequence(self, name, value):
+        with self.lock:
+            sequences = self.load_sequences()
+            sequences[name] = value
+            atomic_write(self.sequences_path, (f"{seq_name},{seq_value}\n" for seq_name, seq_value in sequences.items()),
+                         sync=self.sync_writes)
+
+    def save_user(self):
+        try:
+            with open(self.users_path, 'x', encoding='utf-8') as f:
+                f.write("고객명,주소,아이디,비밀번호\n")
+            self.unsynced.add(self.users_path)
+        except FileExistsError:
+            pass
+
+    def set_durability(self, durability):
+        self.sync_writes = durability != 'none'
+
+    # 끝에 추가한 파일들과, 교체한 파일(batch/commit 이면 atomic_write 가 내용은 이미 fsync 함)의 이름이 바뀐 폴더를 기록
+    def sync(self):
+        with self.lock:  # 목록만 바꿔 들고, fsync 하는 동안에는 다른 커밋이 계속 쓸 수 있음
+            paths, self.unsynced = self.unsynced, set()
+        fsync_paths(sorted(paths) + [self.data_dir])
+
+
+# 이진 파일 저장소 (products.bin, orders.bin 을 BinaryTable 형식으로 저장)
+# 매출/유저/번호 파일과 잠금, 다른 프로세스 변경 반영 방식은 텍스트 저장소와 같음
+class BinaryStorage(TextFileStorage):
+    def __init__(self, data_dir='.'):
+        super().__init__(data_dir)
+        self.products_path = os.path.join(data_dir, 'products.bin')
+        self.orders_path = os.path.join(data_dir, 'orders.bin')
+        # 변경 기록도 따로 둠 (같이 쓰면 다른 형식의 상품 파일에 잘못 적용되고, 형식을 바꿀 때 비워짐)
+        self.journal_path = os.path.join(data_dir, 'products.bin.journal')
+        self.snapshot_path = None  # orders.bin 은 이미 빠르게 읽히므로 스냅샷을 만들지 않음
+
+    # 상품 = products.bin + products.bin.journal (변경 기록은 텍스트 저장소와 같은 형식)
+    def read_products_file(self, products):
+        data, pos = PRODUCT_TABLE.read_file(self.products_path)
+        for strings, columns, pos in PRODUCT_TABLE.read_chunks(data, pos):
+            string_at = strings.__getitem__
+            products.update(zip(map(string_at, columns['product_ids']),
+                                zip(map(string_at, columns['names']), columns['prices'], columns['quantities'])))
+
+    def write_products_file(self, products):
+        strings = StringTable()
+        columns = {
+            'product_ids': array('I', map(strings.encode, products)),
+            'names': array('I', [strings.encode(name) for name, price, quantity in products.values()]),
+            'prices': array('q', [price for name, price, quantity in products.values()]),
+            'quantities': array('q', [quantity for name, price, quantity in products.values()]),
+        }
+        atomic_write(self.products_path, [PRODUCT_TABLE.magic, PRODUCT_TABLE.pack_chunk(strings.strings, columns)],
+                     binary=True)
+
+    def load_orders(self, orders):
+        self.orders_inode = None
+        self.orders_consumed = 0
+        self.own_appends = []
+        identity = file_identity(self.orders_path)
+        data, pos = ORDER_TABLE.read_file(self.orders_path)
+        limit = identity and self.committed_length(identity[0])
+        if limit is not None and limit < len(data):
+            data = data[:limit]  # 커밋 표시 뒤의 덩어리는 저장하다 실패한 주문
+        store = orders if isinstance(orders, OrderStore) else OrderStore()
+        for strings, columns, pos in ORDER_TABLE.read_chunks(data, pos):
+            store.extend_columns(strings, columns)
+        if store is not orders:
+            orders.extend(store)
+        if identity is not None:
+            self.orders_inode = identity[0]
+            self.orders_consumed = pos
+
+    def read_committed_orders(self, start, limit):
+        with open(self.orders_path, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            f.seek(start)
+            data = f.read() if limit is None else f.read(max(0, limit - start))
+        orders = OrderStore()
+        pos = skip_magic(data) if start == 0 else 0
+        for strings, columns, pos in ORDER_TABLE.read_chunks(data, pos):
+            orders.extend_columns(strings, columns)
+        return orders, inode, start + pos
+
+    # 이진 파일은 한 번에 읽는 것이 충분히 빠르므로 lazy_orders 는 사용하지 않음
+    def open_orders(self, orders):
+        self.load_orders(orders)
+        return orders
+
+    # 다른 프로세스가 파일을 새로 만들었으면 맨 앞에 표식이 있음
+    def complete_length(self, data):
+        return ORDER_TABLE.complete_end(data, skip_magic(data))
+
+    def parse_new_orders(self, data):
+        orders = OrderStore()
+        for strings, columns, pos in ORDER_TABLE.read_chunks(data, skip_magic(data)):
+            orders.extend_columns(strings, columns)
+        return list(orders)
+
+    def encode_orders(self, orders):
+        return ORDER_TABLE.pack_chunk(*OrderStore(orders).to_columns())
+
+    # 빈 파일이면 표식부터 쓰고, 끝에 다 쓰이지 않은 덩어리가 있으면 잘라낸 뒤 이어 붙임
+    def fix_tail(self, f, start, data):
+        if start < len(ORDER_TABLE.magic):
+            f.truncate(0)
+            return 0, ORDER_TABLE.magic + data
+        pos = self.orders_consumed if len(ORDER_TABLE.magic) <= self.orders_consumed <= start else len(ORDER_TABLE.magic)
+        f.seek(pos)
+        end = pos + ORDER_TABLE.complete_end(f.read(start - pos), 0)
+        if end < start:
+            f.truncate(end)
+        return end, data
+
+    def save_orders(self, orders):
+        store = orders if isinstance(orders, OrderStore) else OrderStore(orders)
+        with self.write_batch():
+            atomic_write(self.orders_path, [ORDER_TABLE.magic, ORDER_TABLE.pack_chunk(*store.to_columns())], binary=True,
+                         sync=self.sync_writes)
+            self.orders_inode, self.orders_consumed, mtime = file_identity(self.orders_path)
+            self.own_appends = []
+            self.batch['mark'] = (self.orders_inode, self.orders_consumed)
+
+    def get_order(self, order_id):
+        data, pos = ORDER_TABLE.read_file(self.orders_path)
+        for strings, columns, pos in ORDER_TABLE.read_chunks(data, pos):
+            orders = OrderStore()
+            orders.extend_columns(strings, columns)
+            for order in orders:
+                if order.order_id == order_id:
+                    return order
+        return None
+
+
+# SQLite 저장소, 변경된 행만 쓰고 상품번호/주문번호 조회는 인덱스를 사용
+class SQLiteStorage(Storage):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS products (
+            product_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            price INTEGER NOT NULL,
+            quantity INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS orders (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT NOT NULL,
+            product_id TEXT NOT NULL,
+            product_name TEXT NOT NULL,
+            product_price INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            customer_name TEXT NOT NULL,
+            customer_address TEXT NOT NULL,
+            order_date TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS orders_order_id ON orders (order_id);
+        CREATE INDEX IF NOT EXISTS orders_product_id ON orders (product_id);
+        CREATE TABLE IF NOT EXISTS sales (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id TEXT NOT NULL,
+            product_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            total_price INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sales_total (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            order_count INTEGER NOT NULL,
+            revenue INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sales_product (
+            product_id TEXT PRIMARY KEY,
+            product_name TEXT NOT NULL,
+            units INTEGER NOT NULL,
+            revenue INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sales_day (
+            order_date TEXT PRIMARY KEY,
+            units INTEGER NOT NULL,
+            revenue INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sequences (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta (name, value) VALUES ('products_version', 0), ('orders_generation', 0);
+        CREATE TABLE IF NOT EXISTS users (
+            customer_name TEXT,
+            address TEXT,
+            user_id TEXT,
+            password TEXT
+        );
+    """
+
+    ORDER_COLUMNS = ("order_id, product_id, product_name, product_price, quantity, "
+                     "customer_name, customer_address, order_date")
+
+    def __init__(self, path='kupang.db'):
+        self.path = path
+        # 서버는 별도 스레드 하나에서만 저장하므로 스레드 확인은 끔
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.executescript(self.SCHEMA)
+        self.lock = FileLock(path + '.lock')
+        self.products_version = None  # 마지막으로 읽거나 쓴 상품 버전 (meta 테이블)
+        self.orders_generation = None  # save_orders 로 통째로 바뀔 때마다 증가 (meta 테이블)
+        self.last_seq = 0  # 이미 읽은 주문의 마지막 seq
+        self.own_seqs = []  # 직접 추가한 주문 seq 구간 [(시작, 끝)], 새 주문을 읽을 때 건너뜀
+        self.in_batch = False  # write_batch 안인지 (안에서는 저장 메서드마다 커밋하지 않음)
+
+    # 안에서 부른 저장을 한 트랜잭션으로 묶음 (예외가 나면 모두 되돌림)
+    @contextlib.contextmanager
+    def write_batch(self):
+        if self.in_batch:
+            yield
+            return
+        self.in_batch = True
+        try:
+            with self.conn:
+                yield
+        finally:
+            self.in_batch = False
+
+    def meta(self, name):
+        return self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()[0]
+
+    # 상품을 고칠 때마다 같은 트랜잭션 안에서 호출
+    def bump_products_version(self):
+        self.conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'products_version'")
+        self.products_version = self.meta('products_version')
+
+    def products_changed(self):
+        return self.meta('products_version') != self.products_version
+
+    def load_products(self, products):
+        self.products_version = self.meta('products_version')
+        # rowid 순서 = 등록 순서 (수정 시에도 UPSERT 로 rowid 유지)
+        for product_id, name, price, quantity in self.conn.execute(
+                "SELECT product_id, name, price, quantity FROM products ORDER BY rowid"):
+            products[product_id] = (name, price, quantity)
+
+    def save_products(self, products):
+        with self.write_batch():
+            self.conn.execute("DELETE FROM products")
+            self.conn.executemany(
+                "INSERT INTO products (product_id, name, price, quantity) VALUES (?, ?, ?, ?)",
+                ((product_id, name, price, quantity) for product_id, (name, price, quantity) in products.items()))
+            self.bump_products_version()
+
+    def save_product(self, products, product_id):
+        self.save_product_changes(products, [product_id])
+
+    def save_product_changes(self, products, product_ids):
+        with self.write_batch():
+            self.conn.executemany(
+                "INSERT INTO products (product_id, name, price, quantity) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (product_id) DO UPDATE SET "
+                "name = excluded.name, price = excluded.price, quantity = excluded.quantity",
+                ((product_id, *products[product_id]) for product_id in product_ids))
+            self.bump_products_version()
+
+    def delete_product(self, products, product_id):
+        with self.write_batch():
+            self.conn.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
+            self.bump_products_version()
+
+    def get_product(self, product_id):
+        row = self.conn.execute(
+            "SELECT name, price, quantity FROM products WHERE product_id = ?", (product_id,)).fetchone()
+        return tuple(row) if row else None
+
+    def load_orders(self, orders):
+        self.orders_generation = self.meta('orders_generation')
+        self.last_seq = 0
+        self.own_seqs = []
+        for seq, *row in self.conn.execute(f"SELECT seq, {self.ORDER_COLUMNS} FROM orders ORDER BY seq"):
+            orders.append(Order(*row))
+            self.last_seq = seq
+
+    def read_new_orders(self):
+        if self.meta('orders_generation') != self.orders_generation:
+            return None  # 다른 프로세스가 통째로 다시 씀
+        orders = []
+        for seq, *row in self.conn.execute(f"SELECT seq, {self.ORDER_COLUMNS} FROM orders WHERE seq > ? ORDER BY seq",
+                                           (self.last_seq,)):
+            if not any(start <= seq <= end for start, end in self.own_seqs):
+                orders.append(Order(*row))
+            self.last_seq = seq
+        self.own_seqs = [(start, end) for start, end in self.own_seqs if end > self.last_seq]
+        return orders
+
+    def _order_row(self, order):
+        return (order.order_id, order.product_id, order.product_name, order.product_price, order.quantity,
+                order.customer_name, order.customer_address, order.order_date)
+
+    def append_order(self, order):
+        self.append_orders([order])
+
+    def append_orders(self, orders):
+        rows = [self._order_row(order) for order in orders]
+        if not rows:
+            return
+        with self.write_batch():
+            self.conn.executemany(f"INSERT INTO orders ({self.ORDER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            # 같은 트랜잭션 안이므로 방금 넣은 주문은 연속된 seq
+            end = self.conn.execute("SELECT max(seq) FROM orders").fetchone()[0]
+        start = end - len(rows) + 1
+        if start == self.last_seq + 1:
+            self.last_seq = end
+        else:
+            self.own_seqs.append((start, end))
+
+    def save_orders(self, orders):
+        with self.write_batch():
+            self.conn.execute("DELETE FROM orders")
+            self.conn.executemany(f"INSERT INTO orders ({self.ORDER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                  (self._order_row(order) for order in orders))
+            self.conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'orders_generation'")
+            self.orders_generation = self.meta('orders_generation')
+            self.last_seq = self.conn.execute("SELECT coalesce(max(seq), 0) FROM orders").fetchone()[0]
+            self.own_seqs = []
+
+    def get_order(self, order_id):
+        row = self.conn.execute(f"SELECT {self.ORDER_COLUMNS} FROM orders WHERE order_id = ? ORDER BY seq",
+                                (order_id,)).fetchone()
+        return Order(*row) if row else None
+
+    def save_sale(self, order):
+        self.save_sales_records([order])
+
+    def save_sales_records(self, orders):
+        with self.write_batch():
+            self.conn.executemany(
+                "INSERT INTO sales (product_id, product_name, quantity, total_price) VALUES (?, ?, ?, ?)",
+                ((order.product_id, order.product_name, order.quantity, order.product_price * order.quantity)
+                 for order in orders))
+
+    def load_sales_rollup(self):
+        total = self.conn.execute("SELECT order_count, revenue FROM sales_total WHERE id = 0").fetchone()
+        if total is None:
+            return None
+        rollup = SalesRollup()
+        rollup.order_count, rollup.total_revenue = total
+        for product_id, product_name, units, revenue in self.conn.execute(
+                "SELECT product_id, product_name, units, revenue FROM sales_product"):
+            rollup.by_product[product_id] = [product_name, units, revenue]
+        for order_date, units, revenue in self.conn.execute(
+                "SELECT order_date, units, revenue FROM sales_day ORDER BY order_date"):
+            rollup.by_day[order_date] = [units, revenue]
+            rollup.days.append(order_date)
+        return rollup
+
+    # 이번 주문에 해당하는 상품/날짜 행만 갱신
+    def save_sales_rollup(self, rollup, orders=None):
+        if orders is None:
+            product_ids = rollup.by_product.keys()
+            days = rollup.by_day.keys()
+        else:
+            product_ids = {order.product_id for order in orders}
+            days = {order.order_date for order in orders}
+        with self.write_batch():
+            self.conn.execute(
+                "INSERT INTO sales_total (id, order_count, revenue) VALUES (0, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET order_count = excluded.order_count, revenue = excluded.revenue",
+                (rollup.order_count, rollup.total_revenue))
+            self.conn.executemany(
+                "INSERT INTO sales_product (product_id, product_name, units, revenue) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (product_id) DO UPDATE SET "
+                "product_name = excluded.product_name, units = excluded.units, revenue = excluded.revenue",
+                ((product_id, *rollup.by_product[product_id]) for product_id in product_ids))
+            self.conn.executemany(
+                "INSERT INTO sales_day (order_date, units, revenue) VALUES (?, ?, ?) "
+                "ON CONFLICT (order_date) DO UPDATE SET units = excluded.units, revenue = excluded.revenue",
+                ((order_date, *rollup.by_day[order_date]) for order_date in days))
+
+    def load_sequence(self, name):
+        row = self.conn.execute("SELECT value FROM sequences WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def save_sequence(self, name, value):
+        with self.write_batch():
+            self.conn.execute(
+                "INSERT INTO sequences (name, value) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = excluded.value", (name, value))
+
+    # users 테이블은 생성 시 이미 만들어짐
+    def save_user(self):
+        pass
+
+    # SQLite 는 커밋마다 스스로 기록하므로 synchronous 설정으로 맞춤
+    SYNCHRONOUS = {'none': 'OFF', 'batch': 'NORMAL', 'commit': 'FULL'}
+
+    def set_durability(self, durability):
+        self.conn.execute(f"PRAGMA synchronous = {self.SYNCHRONOUS[durability]}")
+
+    def close(self):
+        self.conn.close()
+
+
+# 저장소 선택 (text: 기존 .txt 파일, sqlite: SQLite 데이터베이스)
+def open_storage(kind='text', data_dir='.', db_path='kupang.db', lazy_orders=False):
+    if kind == 'sqlite':
+        return SQLiteStorage(os.path.join(data_dir, db_path))
+    if kind == 'binary':
+        return BinaryStorage(data_dir)
+    return TextFileStorage(data_dir, lazy_orders)
+
+
+# 데이터 폴더의 상품/주문 파일을 텍스트 <-> 이진 형식으로 변환 (원래 파일은 그대로 두므로 되돌릴 수 있음)
+# to_format: 'binary' 또는 'text', 반환: (상품 수, 주문 수)
+def convert_data(data_dir, to_format):
+    text, binary = TextFileStorage(data_dir), BinaryStorage(data_dir)
+    binary.lock = text.lock  # 같은 잠금 파일을 두 번 열면 서로 기다리므로 하나를 같이 씀
+    binary.set_durability('commit')
+    text.set_durability('commit')  # 변환한 파일은 한 번만 쓰므로 항상 fsync
+    source, target = (text, binary) if to_format == 'binary' else (binary, text)
+    products, orders = {}, OrderStore()
+    with text.locked():
+        source.load_products(products)
+        source.load_orders(orders)
+        if target is text:
+            # 텍스트 형식은 쉼표/줄바꿈이 들어간 값을 저장할 수 없음
+            values = itertools.chain(products, (name for name, price, quantity in products.values()),
+                                     orders.strings.strings, orders.other_ids.values())
+            if any(',' in value or '\n' in value for value in values):
+                raise MallError("쉼표나 줄바꿈이 들어간 값이 있어 텍스트 형식으로 바꿀 수 없습니다.")
+        target.save_products(products)
+        target.save_orders(orders)
+    return len(products), len(orders)
+
+
+# 한글 자모 분해 (초성 검색, 입력 중인 글자 검색용)
+CHOSUNG = 'ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ'
+JUNGSUNG = 'ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ'
+JONGSUNG = ['', 'ㄱ', 'ㄲ', 'ㄳ', 'ㄴ', 'ㄵ', 'ㄶ', 'ㄷ', 'ㄹ', 'ㄺ', 'ㄻ', 'ㄼ', 'ㄽ', 'ㄾ', 'ㄿ', 'ㅀ',
+            'ㅁ', 'ㅂ', 'ㅄ', 'ㅅ', 'ㅆ', 'ㅇ', 'ㅈ', 'ㅊ', 'ㅋ', 'ㅌ', 'ㅍ', 'ㅎ']
+# 겹모음/겹받침은 입력 순서대로 나눔 (예: '고' 까지 친 상태에서 '과' 를 찾도록)
+COMPOUND_JAMO = {'ㅘ': 'ㅗㅏ', 'ㅙ': 'ㅗㅐ', 'ㅚ': 'ㅗㅣ', 'ㅝ': 'ㅜㅓ', 'ㅞ': 'ㅜㅔ', 'ㅟ': 'ㅜㅣ', 'ㅢ': 'ㅡㅣ',
+                 'ㄳ': 'ㄱㅅ', 'ㄵ': 'ㄴㅈ', 'ㄶ': 'ㄴㅎ', 'ㄺ': 'ㄹㄱ', 'ㄻ': 'ㄹㅁ', 'ㄼ': 'ㄹㅂ', 'ㄽ': 'ㄹㅅ',
+                 'ㄾ': 'ㄹㅌ', 'ㄿ': 'ㄹㅍ', 'ㅀ': 'ㄹㅎ', 'ㅄ': 'ㅂㅅ'}
+
+
+# 글자 -> 자모 문자열, 글자 -> 초성 변환표 (str.translate 용, 한 번만 만듦)
+def build_jamo_tables():
+    jamo, chosung = {}, {}
+    for char, parts in COMPOUND_JAMO.items():
+        jamo[ord(char)] = parts
+    for code in range(0xAC00, 0xD7A4):
+        initial, rest = divmod(code - 0xAC00, 21 * 28)
+        vowel, final = divmod(rest, 28)
+        parts = CHOSUNG[initial] + JUNGSUNG[vowel] + JONGSUNG[final]
+        jamo[code] = ''.join(COMPOUND_JAMO.get(part, part) for part in parts)
+        chosung[code] = CHOSUNG[initial]
+    return jamo, chosung
+
+
+JAMO_TABLE, CHOSUNG_TABLE = build_jamo_tables()
+
+
+# '삼성' -> 'ㅅㅏㅁㅅㅓㅇ' (한글이 아닌 글자는 그대로)
+def split_jamo(text):
+    return text.translate(JAMO_TABLE)
+
+
+# '삼성' -> 'ㅅㅅ' (한글이 아닌 글자는 그대로)
+def chosung_of(text):
+    return text.translate(CHOSUNG_TABLE)
+
+
+# 상품명 n-gram 역색인
+# 소문자 상품명, 공백을 제거한 상품명, 그 자모/초성 문자열의 1글자/2글자 조각 -> 상품번호 집합
+class ProductNameIndex:
+    def __init__(self, cache_size=256):
+        self.grams = {}  # 조각 -> 상품번호 집합
+        self.keys = {}  # 상품번호 -> (소문자 상품명, 공백 제거 상품명, 자모 문자열, 초성 문자열)
+        self.seq = {}  # 상품번호 -> 등록 순서 (검색 결과를 상품 목록 순서대로 돌려주기 위함)
+        self.next_seq = 0
+        self.version = 0  # 상품명 목록이 바뀔 때마다 증가
+        self.cache = OrderedDict()  # (검색어, strip_spaces, jamo) -> 검색 결과, 최근에 쓴 것이 뒤
+        self.cache_size = cache_size
+        self.cache_version = 0  # cache 를 채울 때의 version
+
+    @staticmethod
+    def split_grams(text):
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+
+    def add(self, product_id, name):
+        lowered = name.lower()
+        if product_id in self.keys:
+            if self.keys[product_id][0] == lowered:
+                return  # 상품명이 그대로면 색인도 그대로
+            self.unlink(product_id)
+        else:
+            self.seq[product_id] = self.next_seq
+            self.next_seq += 1
+        self.version += 1
+        stripped = lowered.replace(' ', '')
+        self.keys[product_id] = keys = (lowered, stripped, split_jamo(stripped), chosung_of(stripped))
+        for gram in self.key_grams(keys):
+            self.grams.setdefault(gram, set()).add(product_id)
+
+    # 자모 조각은 한글 글자와 겹치지 않으므로 같은 색인에 넣음
+    def key_grams(self, keys):
+        grams = set()
+        for key in keys:
+            grams |= self.split_grams(key)
+        return grams
+
+    # 조각 목록에서만 상품번호를 뺌 (등록 순서는 유지)
+    def unlink(self, product_id):
+        self.version += 1
+        for gram in self.key_grams(self.keys.pop(product_id)):
+            postings = self.grams[gram]
+            postings.discard(product_id)
+            if not postings:
+                del self.grams[gram]
+
+    def remove(self, product_id):
+        if product_id in self.keys:
+            self.unlink(product_id)
+            del self.seq[product_id]
+
+    def rebuild(self, products):
+        self.grams.clear()
+        self.keys.clear()
+        self.seq.clear()
+        self.next_seq = 0
+        self.version += 1
+        for product_id, (name, price, quantity) in products.items():
+            self.add(product_id, name)
+
+    # query 가 상품명(또는 strip_spaces 이면 공백 제거 상품명)에 포함된 상품번호 목록
+    # jamo 이면 초성만 입력한 검색어('ㅅㅅ' -> 삼성)와 입력 중인 글자('삼서' -> 삼성)도 찾음 (공백 무시)
+    # 같은 검색이 반복되면 최근 결과를 돌려줌 (상품명이 바뀌면 전부 버림)
+    def search(self, query, strip_spaces=True, jamo=False):
+        if self.cache_version != self.version:
+            self.cache.clear()
+            self.cache_version = self.version
+        key = (query, strip_spaces, jamo)
+        matches = self.cache.get(key)
+        if matches is not None:
+            self.cache.move_to_end(key)
+            METRICS.count('kupang_search_cache_total', result='hit')
+            return list(matches)
+        METRICS.count('kupang_search_cache_total', result='miss')
+        matches = self.scan_jamo(query) if jamo else self.scan(query, strip_spaces)
+        if self.cache_size:
+            self.cache[key] = tuple(matches)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)  # 가장 오래 안 쓴 검색부터
+        return matches
+
+    # text 의 조각을 모두 가진 상품번호 집합
+    def candidates(self, text):
+        if not text:
+            return set(self.keys)
+        grams = {text} if len(text) == 1 else {text[i:i + 2] for i in range(len(text) - 1)}
+        postings = []
+        for gram in grams:
+            if gram not in self.grams:
+                return set()
+            postings.append(self.grams[gram])
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def scan(self, query, strip_spaces):
+        query = query.lower()
+        matches = []
+        for product_id in self.candidates(query):
+            lowered, stripped = self.keys[product_id][:2]
+            if query in lowered or (strip_spaces and query in stripped):
+                matches.append(product_id)
+        matches.sort(key=self.seq.__getitem__)
+        return matches
+
+    def scan_jamo(self, query):
+        stripped = query.lower().replace(' ', '')
+        query_jamo = split_jamo(stripped)
+        matches = {product_id for product_id in self.candidates(query_jamo) if query_jamo in self.keys[product_id][2]}
+        if stripped and all(char in CHOSUNG for char in stripped):
+            matches.update(product_id for product_id in self.candidates(stripped)
+                           if stripped in self.keys[product_id][3])
+        return sorted(matches, key=self.seq.__getitem__)
+
+
+# 매출 집계 (주문이 확정될 때마다 O(1) 로 갱신, 매출 조회는 주문 목록을 다시 훑지 않음)
+class SalesRollup:
+    def __init__(self):
+        self.order_count = 0  # 집계에 반영된 주문 수
+        self.total_revenue = 0  # 총매출
+        self.by_product = {}  # 상품번호 -> [상품명, 판매량, 매출]
+        self.by_day = {}  # 주문일 -> [판매량, 매출]
+        self.days = []  # 정렬된 주문일 목록 (기간 조회용)
+
+    def add(self, order):
+        revenue = order.product_price * order.quantity
+        self.order_count += 1
+        self.total_revenue += revenue
+
+        product = self.by_product.get(order.product_id)
+        if product is None:
+            self.by_product[order.product_id] = [order.product_name, order.quantity, revenue]
+        else:
+            product[0] = order.product_name
+            product[1] += order.quantity
+            product[2] += revenue
+
+        day = self.by_day.get(order.order_date)
+        if day is None:
+            self.by_day[order.order_date] = [order.quantity, revenue]
+            # 주문일은 보통 증가하는 순서로 들어오므로 대부분 끝에 추가됨
+            if not self.days or self.days[-1] < order.order_date:
+                self.days.append(order.order_date)
+            else:
+                bisect.insort(self.days, order.order_date)
+        else:
+            day[0] += order.quantity
+            day[1] += revenue
+
+    # 뒤쪽 주문들의 집계를 더함 (나눠서 집계한 부분 합계를 합칠 때)
+    def merge(self, other):
+        self.order_count += other.order_count
+        self.total_revenue += other.total_revenue
+        for product_id, (name, units, revenue) in other.by_product.items():
+            product = self.by_product.get(product_id)
+            if product is None:
+                self.by_product[product_id] = [name, units, revenue]
+            else:
+                product[0] = name
+                product[1] += units
+                product[2] += revenue
+        for day, (units, revenue) in other.by_day.items():
+            sales = self.by_day.get(day)
+            if sales is None:
+                self.by_day[day] = [units, revenue]
+            else:
+                sales[0] += units
+                sales[1] += revenue
+        self.days = sorted(self.by_day)
+
+    def copy(self):
+        rollup = SalesRollup()
+        rollup.order_count = self.order_count
+        rollup.total_revenue = self.total_revenue
+        rollup.by_product = {product_id: list(product) for product_id, product in self.by_product.items()}
+        rollup.by_day = {day: list(sales) for day, sales in self.by_day.items()}
+        rollup.days = list(self.days)
+        return rollup
+
+    @staticmethod
+    def from_orders(orders):
+        rollup = SalesRollup()
+        for order in orders:
+            rollup.add(order)
+        return rollup
+
+    # 상품별 (판매량, 매출), 판매 기록이 없으면 (0, 0)
+    def product_sales(self, product_id):
+        product = self.by_product.get(product_id)
+        if product is None:
+            return 0, 0
+        return product[1], product[2]
+
+    # start ~ end (YYYY-MM-DD, 양끝 포함) 기간의 일별 [(주문일, 판매량, 매출)]
+    def sales_between(self, start, end):
+        lo = bisect.bisect_left(self.days, start)
+        hi = bisect.bisect_right(self.days, end)
+        return [(day, *self.by_day[day]) for day in self.days[lo:hi]]
+
+    def to_dict(self):
+        return {
+            'order_count': self.order_count,
+            'total_revenue': self.total_revenue,
+            'by_product': self.by_product,
+            'by_day': self.by_day,
+        }
+
+    @staticmethod
+    def from_dict(data):
+        rollup = SalesRollup()
+        rollup.order_count = int(data['order_count'])
+        rollup.total_revenue = int(data['total_revenue'])
+        rollup.by_product = {product_id: [name, int(units), int(revenue)]
+                             for product_id, (name, units, revenue) in data['by_product'].items()}
+        rollup.by_day = {day: [int(units), int(revenue)] for day, (units, revenue) in data['by_day'].items()}
+        rollup.days = sorted(rollup.by_day)
+        return rollup
+
+
+# 주문일 -> 주문 위치 색인 (기간별 주문 조회, 마지막 주문일 확인용)
+# 주문일을 YYYYMMDD 정수로 바꿔 정렬된 배열에 담고 bisect 로 기간을 찾음
+# 주문일은 마지막 주문일 이후만 허용되므로 대부분 끝에 추가됨
+class OrderDateIndex:
+    def __init__(self):
+        self.keys = array('l')  # 정렬된 주문일 (YYYYMMDD)
+        self.positions = array('L')  # keys 와 같은 순서의 주문 위치
+        self.latest = None  # 가장 늦은 주문일 (YYYY-MM-DD)
+        self.unindexed = None  # 아직 색인하지 않은 주문 목록 (LazyOrderFile 은 처음 조회할 때 색인)
+
+    @staticmethod
+    def date_key(order_date):
+        try:
+            return int(order_date[:4] + order_date[5:7] + order_date[8:10])
+        except ValueError:
+            return -1  # 형식이 잘못된 옛 주문은 맨 앞으로
+
+    # 주문 목록 전체로 다시 만듦
+    def rebuild(self, orders):
+        self.keys = array('l')
+        self.positions = array('L')
+        self.latest = None
+        self.unindexed = None
+        if isinstance(orders, OrderStore):
+            self.add_store(orders)
+        elif orders:
+            # 전부 읽으면 느리므로 마지막 주문일만 보고 색인은 나중에
+            self.latest = orders[-1].order_date
+            self.unindexed = orders
+
+    # OrderStore 는 주문일 열(문자열 번호)만 보고, 서로 다른 주문일마다 한 번씩만 변환
+    def add_store(self, orders):
+        strings = orders.strings.strings
+        key_of = {}
+        for code in set(orders.order_dates):
+            key_of[code] = self.date_key(strings[code])
+        keys = array('l', map(key_of.__getitem__, orders.order_dates))
+        if all(a <= b for a, b in zip(keys, itertools.islice(keys, 1, None))):
+            self.keys, self.positions = keys, array('L', range(len(keys)))
+        else:
+            pairs = sorted(zip(keys, range(len(keys))))
+            self.keys = array('l', [key for key, position in pairs])
+            self.positions = array('L', [position for key, position in pairs])
+        if keys:
+            self.latest = strings[orders.order_dates[self.positions[-1]]]
+
+    def add(self, order_date, position):
+        if self.latest is None or order_date > self.latest:
+            self.latest = order_date
+        if self.unindexed is not None:
+            return  # 색인을 만들 때 함께 들어감
+        key = self.date_key(order_date)
+        if not self.keys or self.keys[-1] <= key:
+            self.keys.append(key)
+            self.positions.append(position)
+        else:
+            index = bisect.bisect_right(self.keys, key)
+            self.keys.insert(index, key)
+            self.positions.insert(index, position)
+
+    def build(self):
+        orders, self.unindexed = self.unindexed, None
+        latest = self.latest
+        for position, order in enumerate(orders):
+            self.add(order.order_date, position)
+        self.latest = latest
+
+    # start ~ end (YYYY-MM-DD, 양끝 포함) 기간 주문의 위치 목록 (주문일 순)
+    def positions_between(self, start, end):
+        if self.unindexed is not None:
+            self.build()
+        lo = bisect.bisect_left(self.keys, self.date_key(start))
+        hi = bisect.bisect_right(self.keys, self.date_key(end))
+        return self.positions[lo:hi]
+
+
+# 고객(고객명, 주소) -> 주문 위치와 누적 구매액 색인 (고객별 주문 내역, 우수 고객 조회용)
+class CustomerIndex:
+    def __init__(self):
+        self.customers = {}  # (고객명, 주소) -> [주문 위치 array, 총 구매액]
+        self.by_name = {}  # 고객명 -> [(고객명, 주소)]
+        self.unindexed = None  # 아직 색인하지 않은 주문 목록 (LazyOrderFile 은 처음 조회할 때 색인)
+
+    def rebuild(self, orders):
+        self.customers = {}
+        self.by_name = {}
+        self.unindexed = None
+        if isinstance(orders, OrderStore):
+            self.add_store(orders)
+        elif orders:
+            self.unindexed = orders
+
+    # OrderStore 는 고객명/주소 열(문자열 번호)로 먼저 묶고, 고객마다 한 번씩만 문자열로 바꿈
+    def add_store(self, orders):
+        grouped = {}
+        columns = zip(orders.customer_names, orders.customer_addresses, orders.prices, orders.quantities)
+        for position, (name, address, price, quantity) in enumerate(columns):
+            customer = grouped.get((name, address))
+            if customer is None:
+                customer = grouped[(name, address)] = [array('L'), 0]
+            customer[0].append(position)
+            customer[1] += price * quantity
+        strings = orders.strings.strings
+        for (name, address), customer in grouped.items():
+            self.insert((strings[name], strings[address]), customer)
+
+    def insert(self, key, customer):
+        self.customers[key] = customer
+        self.by_name.setdefault(key[0], []).append(key)
+
+    def add(self, order, position):
+        if self.unindexed is not None:
+            return  # 색인을 만들 때 함께 들어감
+        key = (order.customer_name, order.customer_address)
+        customer = self.customers.get(key)
+        if customer is None:
+            customer = [array('L'), 0]
+            self.insert(key, customer)
+        customer[0].append(position)
+        customer[1] += order.product_price * order.quantity
+
+    def build(self):
+        orders, self.unindexed = self.unindexed, None
+        for position, order in enumerate(orders):
+            self.add(order, position)
+
+    # 고객명이 같은 고객들 [((고객명, 주소), [주문 위치, 총 구매액])], address 가 있으면 그 주소만
+    def find(self, name, address=None):
+        if self.unindexed is not None:
+            self.build()
+        if address is not None:
+            customer = self.customers.get((name, address))
+            return [] if customer is None else [((name, address), customer)]
+        return [(key, self.customers[key]) for key in self.by_name.get(name, ())]
+
+    # 총 구매액 상위 n 명 [((고객명, 주소), [주문 위치, 총 구매액])]
+    def top(self, n):
+        if self.unindexed is not None:
+            self.build()
+        return heapq.nlargest(n, self.customers.items(), key=lambda item: item[1][1])
+
+
+# 매출 분석 (상품 순위, 기간별 매출, 평균 장바구니 금액)
+# Order 를 만들지 않고 OrderStore 의 열(주문번호, 상품번호, 가격, 수량, 주문일)만 모아서 한꺼번에 계산
+# NumPy 가 있으면 배열 연산으로, 없으면 array 를 한 번씩 훑어서 계산
+# positions: 분석할 주문 위치 (OrderDateIndex.positions_between 등), None 이면 전체
+class SalesAnalytics:
+    PERIODS = ('day', 'week', 'month')
+    METRIC_NAMES = ('revenue', 'units')
+
+    def __init__(self, orders, positions=None, use_numpy=True):
+        if not isinstance(orders, OrderStore):
+            # LazyOrderFile 등은 필요한 주문만 열로 옮김
+            orders = OrderStore(orders if positions is None else map(orders.__getitem__, positions))
+            positions = None
+        self.strings = orders.strings.strings
+        self.numpy = numpy if use_numpy else None
+        names = ('order_numbers', 'product_ids', 'product_names', 'prices', 'quantities', 'order_dates')
+        if self.numpy is not None:
+            take = self.numpy.array(positions, dtype=self.numpy.int64) if positions is not None else slice(None)
+            columns = [self.numpy.array(getattr(orders, name), dtype=self.numpy.int64)[take] for name in names]
+        elif positions is not None:
+            columns = [array(getattr(orders, name).typecode, map(getattr(orders, name).__getitem__, positions))
+                       for name in names]
+        else:
+            columns = [getattr(orders, name) for name in names]
+        (self.order_numbers, self.product_codes, self.name_codes,
+         self.prices, self.quantities, self.date_codes) = columns
+        if positions is None:
+            self.other_ids = set(orders.other_ids.values())
+        else:
+            self.other_ids = {orders.other_ids[position] for position in positions if position in orders.other_ids}
+        if self.numpy is not None:
+            self.revenues = self.prices * self.quantities
+        else:
+            self.revenues = array('q', map(int.__mul__, self.prices, self.quantities))
+
+    def __len__(self):
+        return len(self.quantities)
+
+    # 그룹 번호(0 ~ size-1)별 [주문 줄 수, 판매량, 매출, 그룹의 마지막 상품명 번호]
+    def group_totals(self, keys, size):
+        if not len(self):
+            return [0] * size, [0] * size, [0] * size, [0] * size
+        if self.numpy is not None:
+            np = self.numpy
+            lines = np.bincount(keys, minlength=size)
+            units = np.zeros(size, dtype=np.int64)
+            revenue = np.zeros(size, dtype=np.int64)
+            np.add.at(units, keys, self.quantities)
+            np.add.at(revenue, keys, self.revenues)
+            last_rows = np.zeros(size, dtype=np.int64)
+            np.maximum.at(last_rows, keys, np.arange(len(keys)))
+            return lines.tolist(), units.tolist(), revenue.tolist(), self.name_codes[last_rows].tolist()
+        lines = [0] * size
+        units = [0] * size
+        revenue = [0] * size
+        last_names = [0] * size
+        for key, quantity, amount, name in zip(keys, self.quantities, self.revenues, self.name_codes):
+            lines[key] += 1
+            units[key] += quantity
+            revenue[key] += amount
+            last_names[key] = name
+        return lines, units, revenue, last_names
+
+    # 판매 상위 k 개 상품 [(상품번호, 상품명, 판매량, 매출)], by: revenue 또는 units
+    def top_products(self, k=10, by='revenue'):
+        if by not in self.METRIC_NAMES:
+            raise ValueError(f"정렬 기준은 {', '.join(self.METRIC_NAMES)} 중 하나여야 합니다.")
+        lines, units, revenue, last_names = self.group_totals(self.product_codes, len(self.strings))
+        metric = revenue if by == 'revenue' else units
+        sold = [code for code, count in enumerate(lines) if count]
+        top = heapq.nlargest(k, sold, key=lambda code: (metric[code], self.strings[code]))
+        return [(self.strings[code], self.strings[last_names[code]], units[code], revenue[code]) for code in top]
+
+    # 기간별 [(기간, 주문 줄 수, 판매량, 매출)], period: day(YYYY-MM-DD), week(YYYY-Www), month(YYYY-MM)
+    def revenue_by_period(self, period='day'):
+        if period not in self.PERIODS:
+            raise ValueError(f"기간은 {', '.join(self.PERIODS)} 중 하나여야 합니다.")
+        # 서로 다른 주문일마다 한 번씩만 기간으로 바꿈
+        if self.numpy is not None:
+            date_codes = self.numpy.unique(self.date_codes).tolist()
+        else:
+            date_codes = set(self.date_codes)
+        labels = sorted({self.period_of(self.strings[code], period) for code in date_codes})
+        label_index = {label: index for index, label in enumerate(labels)}
+        table = [0] * len(self.strings)
+        for code in date_codes:
+            table[code] = label_index[self.period_of(self.strings[code], period)]
+        if self.numpy is not None:
+            keys = self.numpy.array(table, dtype=self.numpy.int64)[self.date_codes]
+        else:
+            keys = array('L', map(table.__getitem__, self.date_codes))
+        lines, units, revenue, last_names = self.group_totals(keys, len(labels))
+        return list(zip(labels, lines, units, revenue))
+
+    @staticmethod
+    def period_of(order_date, period):
+        if period == 'month':
+            return order_date[:7]
+        if period == 'week':
+            try:
+                year, week, weekday = datetime.date.fromisoformat(order_date).isocalendar()
+            except ValueError:
+                return order_date  # 날짜가 아니면 그대로
+            return f"{year}-W{week:02d}"
+        return order_date
+
+    # 주문(주문번호) 수, 주문 줄 수, 판매량, 매출, 주문 하나당 평균 금액/수량
+    def basket_stats(self):
+        if self.numpy is not None:
+            numbers = self.numpy.sort(self.order_numbers[self.order_numbers >= 0])  # 보통 이미 정렬되어 있음
+            order_count = int(numbers.size and 1 + self.numpy.count_nonzero(numbers[1:] != numbers[:-1]))
+            units, revenue = int(self.quantities.sum()), int(self.revenues.sum())
+        else:
+            order_count = len(set(self.order_numbers) - {-1})
+            units, revenue = sum(self.quantities), sum(self.revenues)
+        order_count += len(self.other_ids)
+        return {
+            'orders': order_count,
+            'lines': len(self),
+            'units': units,
+            'revenue': revenue,
+            'average_basket': revenue / order_count if order_count else 0,
+            'average_units': units / order_count if order_count else 0,
+        }
+
+
+# 상품/주문 번호 발급기
+# 접두어별로 단조 증가하는 번호를 발급하므로 중복 검사나 재시도가 필요 없음
+# 번호는 block_size 개씩 미리 예약해 저장하므로 발급할 때마다 파일을 쓰지 않음
+class IdAllocator:
+    def __init__(self, storage, prefix, existing_ids=(), block_size=100, start=1000):
+        self.storage = storage
+        self.prefix = prefix
+        self.block_size = block_size
+        reserved = storage.load_sequence(prefix)
+        if reserved is None:
+            # 예약 기록이 없으면(이전 버전 데이터) 기존 번호 중 가장 큰 번호 다음부터 발급
+            reserved = start
+            for existing_id in existing_ids:
+                number = existing_id[len(prefix):]
+                if existing_id.startswith(prefix) and number.isdigit():
+                    reserved = max(reserved, int(number) + 1)
+        self.next_number = reserved
+        self.limit = reserved  # 예약된 번호의 끝 (이 번호부터는 아직 예약되지 않음)
+
+    def allocate(self):
+        if self.next_number >= self.limit:
+            # 다른 프로세스가 먼저 예약한 번호는 건너뛰고 다음 블록을 예약
+            with self.storage.locked():
+                reserved = self.storage.load_sequence(self.prefix)
+                if reserved is not None and reserved > self.next_number:
+                    self.next_number = reserved
+                self.limit = self.next_number + self.block_size
+                self.storage.save_sequence(self.prefix, self.limit)
+        number = self.next_number
+        self.next_number += 1
+        return f"{self.prefix}{number}"
+
+
+# 입력 검사 규칙 (화면 입력과 일괄 등록이 같은 규칙을 사용)
+CUSTOMER_NAME_PATTERN = re.compile(r'^[a-zA-Z가-힣\s]+$')
+CUSTOMER_ADDRESS_PATTERN = re.compile(r'^[a-zA-Z0-9가-힣\s\-]+$')
+ORDER_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+# 상품명이 숫자로만 되어 있으면 사용할 수 없음 ('0' 은 뒤로가기)
+def is_product_name_allowed(product_name):
+    return not product_name.isdigit()
+
+
+# 검색어 검사, (검색어 또는 None, "empty"/"special"/"valid") 를 돌려줌 (콘솔 검색과 서버가 함께 사용)
+def remove_space(query):
+    # 공백만 있는 경우 검사
+    if query.strip() == '':
+        return None, "empty"
+
+    # 특수문자 검사 (알파벳, 숫자, 한글, 공백 제외한 문자)
+    if re.search(r'[^\w\s가-힣]', query):
+        return None, "special"
+
+    # 검색 가능한 경우
+    return query, "valid"
+
+
+# 줄 번호별 오류를 limit 건까지 출력
+def print_line_errors(errors, limit=20):
+    for line_no, message in errors[:limit]:
+        print(f"  {line_no}번째 줄: {message}")
+    if len(errors) > limit:
+        print(f"  ... 외 {len(errors) - limit}건")
+
+
+# 일괄 등록 파일 읽기 (.csv 는 첫 줄이 열 이름, 그 외에는 한 줄에 JSON 객체 하나)
+# (줄 번호, 딕셔너리) 를 차례로 돌려주고, 읽을 수 없는 줄은 (줄 번호, None)
+def read_records(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield line_no, record if isinstance(record, dict) else None
+
+
+# 숫자만 입력한 상품번호(예: 1234)를 PRODxxxx 형태로 바꿈
+def normalize_product_id(product_id):
+    if len(product_id) >= 4 and product_id.isdigit():
+        return 'PROD' + product_id
+    return product_id
+
+
+# 문자열 사전 (같은 문자열은 한 번만 저장하고 번호로 가리킴)
+class StringTable:
+    def __init__(self):
+        self.strings = []
+        self.codes = {}
+
+    def encode(self, text):
+        code = self.codes.get(text)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(text)
+            self.codes[text] = code
+        return code
+
+    def __len__(self):
+        return len(self.strings)
+
+
+# 주문 목록 (열 단위 배열 저장)
+# 주문마다 Order 객체를 들고 있지 않고, 문자열 열은 StringTable 번호로, 숫자 열은 array 로 저장
+# list 처럼 append / len / 인덱스 / 반복이 되고, 꺼낼 때마다 Order 객체를 만들어 돌려줌
+class OrderStore:
+    ORDER_PREFIX = 'ORD'
+
+    def __init__(self, orders=()):
+        self.strings = StringTable()  # 모든 문자열 열이 함께 쓰는 사전
+        self.order_numbers = array('q')  # ORD 뒤의 숫자, 형식이 다르면 -1
+        self.other_ids = {}  # 위치 -> 주문번호 (ORD+숫자 형식이 아닌 주문번호)
+        self.product_ids = array('L')
+        self.product_names = array('L')
+        self.prices = array('q')
+        self.quantities = array('q')
+        self.customer_names = array('L')
+        self.customer_addresses = array('L')
+        self.order_dates = array('L')
+        self.extend(orders)
+
+    def append(self, order):
+        encode = self.strings.encode
+        number = order.order_id[len(self.ORDER_PREFIX):]
+        if (order.order_id.startswith(self.ORDER_PREFIX) and number.isdigit()
+                and not (number.startswith('0') and len(number) > 1)):
+            self.order_numbers.append(int(number))
+        else:
+            self.other_ids[len(self.order_numbers)] = order.order_id
+            self.order_numbers.append(-1)
+        self.product_ids.append(encode(order.product_id))
+        self.product_names.append(encode(order.product_name))
+        self.prices.append(order.product_price)
+        self.quantities.append(order.quantity)
+        self.customer_names.append(encode(order.customer_name))
+        self.customer_addresses.append(encode(order.customer_address))
+        self.order_dates.append(encode(order.order_date))
+
+    def extend(self, orders):
+        for order in orders:
+            self.append(order)
+
+    def clear(self):
+        self.__init__()
+
+    # 다른 문자열 목록의 번호로 된 열들을 한 번에 붙임 (이진 파일 읽기용, 열 이름은 ORDER_TABLE)
+    def extend_columns(self, strings, columns):
+        codes = list(map(self.strings.encode, strings))
+        code_at = codes.__getitem__
+        base = len(self.order_numbers)
+        numbers = columns['order_numbers']
+        self.order_numbers.extend(numbers)
+        if numbers and min(numbers) < 0:
+            other_ids = columns['other_ids']
+            for index, number in enumerate(numbers):
+                if number < 0:
+                    self.other_ids[base + index] = strings[other_ids[index]]
+        for name in ('product_ids', 'product_names', 'customer_names', 'customer_addresses', 'order_dates'):
+            getattr(self, name).extend(map(code_at, columns[name]))
+        self.prices.extend(columns['prices'])
+        self.quantities.extend(columns['quantities'])
+
+    # (문자열 목록, 열들) 로 내보냄, extend_columns 의 반대
+    def to_columns(self):
+        strings = list(self.strings.strings)
+        other_ids = array('I', bytes(4 * len(self.order_numbers)))
+        for index, order_id in self.other_ids.items():
+            other_ids[index] = len(strings)
+            strings.append(order_id)
+        columns = {'order_numbers': self.order_numbers, 'other_ids': other_ids,
+                   'prices': self.prices, 'quantities': self.quantities}
+        for name in ('product_ids', 'product_names', 'customer_names', 'customer_addresses', 'order_dates'):
+            columns[name] = array('I', getattr(self, name))
+        return strings, columns
+
+    def order_id_at(self, index):
+        number = self.order_numbers[index]
+        if number < 0:
+            return self.other_ids[index % len(self.order_numbers)]
+        return f"{self.ORDER_PREFIX}{number}"
+
+    def __len__(self):
+        return len(self.order_numbers)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        strings = self.strings.strings
+        return Order(self.order_id_at(index), strings[self.product_ids[index]], strings[self.product_names[index]],
+                     self.prices[index], self.quantities[index], strings[self.customer_names[index]],
+                     strings[self.customer_addresses[index]], strings[self.order_dates[index]])
+
+    def __iter__(self):
+        strings = self.strings.strings
+        columns = zip(self.order_numbers, self.product_ids, self.product_names, self.prices, self.quantities,
+                      self.customer_names, self.customer_addresses, self.order_dates)
+        for index, (number, product_id, product_name, price, quantity, name, address, date) in enumerate(columns):
+            order_id = self.other_ids[index] if number < 0 else f"{self.ORDER_PREFIX}{number}"
+            yield Order(order_id, strings[product_id], strings[product_name], price, quantity,
+                        strings[name], strings[address], strings[date])
+
+
+# orders.txt 를 메모리 매핑해서 필요할 때만 읽는 주문 목록 (OrderStore 와 같은 방식으로 사용)
+# 줄 시작 위치 색인은 처음 필요할 때 만들고 orders.txt.idx 에 저장해 두어,
+# 다음 실행에서는 그 뒤에 추가된 부분만 훑음
+class LazyOrderFile:
+    INDEX_HEADER = struct.Struct('<8sQQ')  # 표식, 색인이 다룬 파일 크기, 줄 수
+    INDEX_MAGIC = b'KPIDX001'
+    CHECK_BYTES = 64  # 색인이 다룬 마지막 부분이 그대로인지 확인할 길이
+
+    def __init__(self, path, limit=None):
+        self.path = path
+        self.limit = limit  # 커밋된 길이 (그 뒤는 저장하다 실패한 주문), None 이면 끝까지
+        self.index_path = path + '.idx'
+        self.tail = OrderStore()  # 이번 실행 중에 추가된 주문
+        self.offsets = None  # 각 줄의 시작 위치 (처음 필요할 때 만듦)
+        self.mm = None
+        self.size = 0
+        self.open()
+
+    def open(self):
+        try:
+            with open(self.path, 'rb') as f:
+                self.size = os.fstat(f.fileno()).st_size
+                if self.size:
+                    self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    # 쓰다가 잘린 마지막 줄과 커밋하지 못한 주문은 없는 것으로 (다음에 추가할 때 저장소가 잘라냄)
+                    end = self.size if self.limit is None else min(self.size, self.limit)
+                    self.size = self.mm.rfind(b'\n', 0, end) + 1
+        except FileNotFoundError:
+            self.size = 0
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.mm = None
+        self.size = 0
+        self.offsets = None
+
+    # save_orders 처럼 파일을 통째로 다시 쓴 뒤 다시 매핑
+    def reopen(self):
+        self.close()
+        self.limit = None
+        self.tail = OrderStore()
+        self.open()
+
+    def load_index(self):
+        offsets = array('Q')
+        try:
+            with open(self.index_path, 'rb') as f:
+                magic, covered, count = self.INDEX_HEADER.unpack(f.read(self.INDEX_HEADER.size))
+                check = f.read(self.CHECK_BYTES)
+                offsets.fromfile(f, count)
+        except (FileNotFoundError, EOFError, struct.error):
+            return array('Q'), 0
+        if magic != self.INDEX_MAGIC or covered > self.size:
+            return array('Q'), 0
+        if self.tail_bytes(covered) != check:
+            return array('Q'), 0  # 파일이 다시 쓰였으면 처음부터
+        return offsets, covered
+
+    # covered 바로 앞의 CHECK_BYTES 바이트 (색인 검증용)
+    def tail_bytes(self, covered):
+        return self.mm[max(0, covered - self.CHECK_BYTES):covered].ljust(self.CHECK_BYTES, b'\0')
+
+    def save_index(self, offsets):
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(self.INDEX_HEADER.pack(self.INDEX_MAGIC, self.size, len(offsets)))
+            f.write(self.tail_bytes(self.size))
+            offsets.tofile(f)
+        os.replace(temp_path, self.index_path)
+
+    def build_index(self):
+        if self.offsets is not None:
+            return self.offsets
+        if self.mm is None:
+            self.offsets = array('Q')
+            return self.offsets
+
+        offsets, pos = self.load_index()
+        covered = pos
+        mm = self.mm
+        while pos < self.size:
+            end = mm.find(b'\n', pos)
+            if end < 0:
+                end = self.size
+            if mm[pos:end].strip():  # 빈 줄은 건너뜀
+                offsets.append(pos)
+            pos = end + 1
+        self.offsets = offsets
+        if covered != self.size:
+            try:
+                self.save_index(offsets)
+            except OSError:
+                pass  # 색인 저장은 다음 실행을 빠르게 할 뿐이므로 실패해도 무시
+        return offsets
+
+    def line_at(self, pos):
+        end = self.mm.find(b'\n', pos)
+        if end < 0:
+            end = self.size
+        return self.mm[pos:end].decode('utf-8')
+
+    # 마지막 주문, 색인 없이 파일 끝에서부터 한 줄만 읽음
+    def last(self):
+        if self.tail:
+            return self.tail[-1]
+        end = self.size
+        while end > 0 and self.mm is not None:
+            start = self.mm.rfind(b'\n', 0, end) + 1
+            if self.mm[start:end].strip():
+                return Order.from_file_string(self.line_at(start))
+            end = start - 1
+        raise IndexError('order index out of range')
+
+    # 새 주문은 메모리에만 추가 (파일에는 저장소가 append_order 로 추가)
+    def append(self, order):
+        self.tail.append(order)
+
+    def extend(self, orders):
+        self.tail.extend(orders)
+
+    def __len__(self):
+        return len(self.build_index()) + len(self.tail)
+
+    def __bool__(self):
+        if self.tail:
+            return True
+        if self.offsets is not None:
+            return len(self.offsets) > 0
+        try:
+            self.last()
+            return True
+        except IndexError:
+            return False
+
+    def __getitem__(self, index):
+        if index == -1:
+            return self.last()
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        offsets = self.build_index()
+        if index < 0:
+            index += len(self)
+        if index < 0:
+            raise IndexError('order index out of range')
+        if index < len(offsets):
+            return Order.from_file_string(self.line_at(offsets[index]))
+        return self.tail[index - len(offsets)]
+
+    def __iter__(self):
+        mm = self.mm
+        pos = 0
+        while mm is not None and pos < self.size:
+            end = mm.find(b'\n', pos)
+            if end < 0:
+                end = self.size
+            line = mm[pos:end]
+            if line.strip():
+                yield Order.from_file_string(line.decode('utf-8'))
+            pos = end + 1
+        yield from self.tail
+
+# 내구성 수준
+# none: fsync 하지 않음 (OS 에 맡김, 가장 빠름)
+# batch: 함께 들어온 커밋들을 모아 fsync 한 번 (group commit)
+# commit: 커밋마다 fsync 한 뒤 돌아감 (가장 안전)
+DURABILITY_LEVELS = ('none', 'batch', 'commit')
+
+
+# 한 번에 저장할 변경 사항 (주문, 바뀐 상품, 삭제된 상품)
+class UnitOfWork:
+    def __init__(self):
+        self.orders = []
+        self.product_ids = set()
+        self.deleted_ids = set()
+
+    def __bool__(self):
+        return bool(self.orders or self.product_ids or self.deleted_ids)
+
+    def add_orders(self, orders, product_ids=()):
+        self.orders.extend(orders)
+        self.save_products(product_ids)
+
+    def save_products(self, product_ids):
+        self.product_ids.update(product_ids)
+        self.deleted_ids.difference_update(product_ids)
+
+    def delete_products(self, product_ids):
+        self.deleted_ids.update(product_ids)
+        self.product_ids.difference_update(product_ids)
+
+    def merge(self, other):
+        self.orders.extend(other.orders)
+        self.delete_products(other.deleted_ids)
+        self.save_products(other.product_ids)
+
+
+# 여러 스레드의 커밋을 모아 fsync 를 한 번에 함 (group commit)
+# 커밋은 저장소 잠금 안에서 쓰기만 하고 번호를 받은 뒤, 잠금 밖에서 그 번호까지 기록되기를 기다림
+# fsync 는 한 스레드만 하고, 그동안 쓰기를 마친 다른 커밋들은 다음 fsync 한 번에 함께 기록됨
+class GroupCommit:
+    def __init__(self, storage):
+        self.storage = storage
+        self.sync_lock = threading.Lock()
+        self.written = 0  # 쓰기를 마친 마지막 커밋 번호
+        self.synced = 0  # fsync 까지 마친 마지막 커밋 번호
+        self.syncs = 0  # fsync 횟수
+
+    # 저장소 잠금 안에서 쓰기를 마친 직후 호출
+    def ticket(self):
+        self.written += 1
+        return self.written
+
+    def wait(self, ticket):
+        with self.sync_lock:
+            if self.synced >= ticket:
+                return  # 다른 스레드의 fsync 에 함께 기록됨
+            target = self.written  # 여기까지의 커밋은 이미 다 썼으므로 아래 sync 에 포함됨
+            self.storage.sync()
+            self.synced = target
+            self.syncs += 1
+
+
+# 뒤에서 주기적으로 변경 기록을 스냅샷에 합치는 스레드
+# 합치지 않은 기록이 max_journal_bytes 를 넘거나, 마지막으로 합친 뒤 max_age 초가 지나면 합침
+class Compactor:
+    def __init__(self, storage, max_journal_bytes=4 * 1024 * 1024, max_age=3600, interval=10):
+        self.storage = storage
+        self.max_journal_bytes = max_journal_bytes
+        self.max_age = max_age
+        self.interval = interval  # 기록 크기를 확인하는 간격(초)
+        self.last_compacted = time.monotonic()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='kupang-compactor', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+
+    def due(self):
+        size = self.storage.journal_size()
+        if size >= self.max_journal_bytes:
+            return True
+        return size > 0 and time.monotonic() - self.last_compacted >= self.max_age
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            if self.due():
+                self.compact()
+
+    @timed('compact')
+    def compact(self):
+        try:
+            self.storage.compact()
+        except Exception as error:
+            # 합치지 못해도 원래 파일은 그대로이므로 다음에 다시 시도 (어떤 오류든 스레드는 계속 돎)
+            METRICS.count('kupang_compaction_errors_total')
+            print(f"압축 실패: {error!r}", file=sys.stderr)
+        self.last_compacted = time.monotonic()
+
+
+# 쇼핑몰 처리 중 규칙에 맞지 않는 요청 (메시지는 화면에 그대로 출력)
+class MallError(Exception):
+    pass
+
+
+# 쇼핑몰 핵심 기능 (입출력 없이 상품/주문/매출을 다룸, 화면 메뉴와 서버가 함께 사용)
+class MallCore:
+    def __init__(self, storage=None, order_journal=True, durability=None):
+        self.storage = storage if storage is not None else TextFileStorage()
+        # DURABILITY_LEVELS 중 하나, None 이면 fsync 하지 않고 저장소 기본 설정을 그대로 씀
+        self.durability = durability
+        if durability is not None:
+            self.storage.set_durability(durability)
+        self.group_commit = GroupCommit(self.storage)
+        self.work = None  # 진행 중인 transaction 에서 모으고 있는 변경 사항
+        self.orders = OrderStore()  # 주문 목록
+        # True 이면 새 주문을 orders.txt 끝에 한 줄씩 추가(저널), False 이면 매번 전체를 다시 씀
+        self.order_journal = order_journal
+        self.products = {}  # 상품 목록 (상품명: (가격, 수량))
+        self.name_index = ProductNameIndex()  # 상품명 검색 색인
+        self.sales = SalesRollup()  # 매출 집계
+        self.order_dates = OrderDateIndex()  # 주문일 색인
+        self.customer_index = CustomerIndex()  # 고객별 주문 색인
+        self.compactor = None  # 변경 기록 압축 스레드 (start_compaction 으로 시작)
+        with self.storage.locked():
+            self.load_items()
+            self.load_orders()
+            self.load_sales()
+            self.product_ids = IdAllocator(self.storage, 'PROD', self.products)  # 상품 번호 발급기
+            self.order_ids = IdAllocator(self.storage, 'ORD', (order.order_id for order in self.orders))  # 주문 번호 발급기
+
+    # 뒤에서 변경 기록 압축 시작 (인자는 Compactor 와 같음)
+    def start_compaction(self, **options):
+        self.compactor = Compactor(self.storage, **options).start()
+        return self.compactor
+
+    def stop_compaction(self):
+        if self.compactor is not None:
+            self.compactor.stop()
+            self.compactor = None
+
+    # 다른 프로세스가 저장한 변경 사항 반영 (저장소 잠금 안에서 호출)
+    @timed('refresh')
+    def refresh(self):
+        self.refresh_items()
+        new_orders = self.storage.read_new_orders()
+        if new_orders is None:
+            # 주문 파일이 통째로 바뀌었으면 다시 읽음
+            self.orders = OrderStore()
+            self.load_orders()
+            self.load_sales()
+        else:
+            for order in new_orders:
+                self.record_order(order)
+
+    # 다른 프로세스가 바꾼 상품만 반영, 바뀐 것이 없으면 상품 파일을 다시 읽지 않음
+    def refresh_items(self):
+        with self.storage.locked():
+            changes = self.storage.read_product_changes()
+            if changes is None:
+                self.load_items()
+                return
+            for product_id, product in changes:
+                if product is not None:
+                    self.set_product(product_id, product)
+                elif product_id in self.products:
+                    self.remove_product(product_id)
+
+    # 고치고 저장하는 동안 저장소를 잠그고, 시작할 때 다른 프로세스의 변경 사항을 먼저 반영
+    # 안에서 생긴 변경 사항은 UnitOfWork 에 모았다가 끝날 때 한 번에 저장
+    # transaction 안에서 다시 부르면 바깥 것에 모음 (여러 작업을 한 번에 저장할 때)
+    # 예외가 나면 아무것도 저장하지 않고 저장소에서 다시 읽음
+    # commit 이 False 이면 저장을 호출한 쪽에서 하므로 아무것도 하지 않음 (None 을 돌려줌)
+    @contextlib.contextmanager
+    def transaction(self, commit=True):
+        if not commit:
+            yield None
+            return
+        with self.storage.locked():
+            if self.work is not None:
+                yield self.work
+                return
+            self.refresh()
+            work = self.work = UnitOfWork()
+            try:
+                yield work
+                ticket = self.commit_work(work)
+            except BaseException:
+                if work:
+                    self.rollback()
+                raise
+            finally:
+                self.work = None
+        if ticket:
+            self.group_commit.wait(ticket)  # 잠금을 푼 뒤 다른 커밋과 함께 fsync
+
+    # 모은 변경 사항 저장 (저장소 잠금 안), durability 가 batch 이면 fsync 를 기다릴 번호를 돌려줌
+    def commit_work(self, work):
+        if not work:
+            return 0
+        self.write_unlocked(work.orders, work.product_ids, work.deleted_ids, self.products, self.sales)
+        if self.durability == 'commit':
+            self.storage.sync()
+        elif self.durability == 'batch':
+            return self.group_commit.ticket()
+        return 0
+
+    # 저장하지 못한 변경 사항을 버리고 저장소에서 다시 읽음
+    def rollback(self):
+        self.load_items()
+        self.orders = OrderStore()
+        self.load_orders()
+        self.load_sales()
+
+    # 상품 등록/수정 (상품명 색인도 함께 갱신)
+    def set_product(self, product_id, product):
+        self.products[product_id] = product
+        self.name_index.add(product_id, product[0])
+
+    # 상품 삭제 (상품명 색인에서도 삭제)
+    def remove_product(self, product_id):
+        del self.products[product_id]
+        self.name_index.remove(product_id)
+
+    # 상품 검사 규칙 (화면 입력, 일괄 등록, 서버가 같은 규칙 사용)
+    @staticmethod
+    def check_product(product_name, product_price, product_quantity):
+        if not product_name or not is_product_name_allowed(product_name):
+            raise MallError("잘못된 상품명입니다.")
+        if product_price < 0:
+            raise MallError("가격은 음수일 수 없습니다.")
+        if product_quantity < 0:
+            raise MallError("수량은 음수일 수 없습니다.")
+
+    # 상품 등록, 새 상품번호를 돌려줌 (commit 이 False 이면 저장은 호출한 쪽에서 함, 아래도 같음)
+    def create_product(self, product_name, product_price, product_quantity, commit=True):
+        self.check_product(product_name, product_price, product_quantity)
+        with self.transaction(commit) as work:
+            product_id = self.product_ids.allocate()  # 항상 새로운 번호
+            self.set_product(product_id, (product_name, product_price, product_quantity))
+            if work is not None:
+                work.save_products([product_id])
+        return product_id
+
+    # 상품 수정 (None 인 항목은 그대로 둠)
+    def modify_product(self, product_id, product_name=None, product_price=None, product_quantity=None, commit=True):
+        with self.transaction(commit) as work:
+            if product_id not in self.products:
+                raise MallError("유효하지 않은 상품번호 입니다.")
+            name, price, quantity = self.products[product_id]
+            product = (name if product_name is None else product_name,
+                       price if product_price is None else product_price,
+                       quantity if product_quantity is None else product_quantity)
+            self.check_product(*product)
+            self.set_product(product_id, product)
+            if work is not None:
+                work.save_products([product_id])
+        return product
+
+    # 단종 (상품 삭제)
+    def discontinue_product(self, product_id, commit=True):
+        with self.transaction(commit) as work:
+            if product_id not in self.products:
+                raise MallError("해당 상품이 존재하지 않습니다.")
+            self.remove_product(product_id)
+            if work is not None:
+                work.delete_products([product_id])
+
+    # 상품명 검색 (strip_spaces 이면 공백을 뺀 상품명도 비교, jamo 이면 초성/입력 중인 글자도 비교)
+    @timed('search')
+    def find_products(self, query, strip_spaces=True, jamo=False):
+        return {product_id: self.products[product_id]
+                for product_id in self.name_index.search(query, strip_spaces, jamo)}
+
+    # 주문 검사 규칙 (add_order, 일괄 주문, 서버가 같은 규칙 사용)
+    def check_order(self, product_id, quantity, customer_name, customer_address, order_date, last_order_date):
+        if product_id not in self.products:
+            raise MallError(f"유효하지 않은 상품번호 입니다: {product_id}")
+        product_quantity = self.products[product_id][2]
+        if quantity <= 0:
+            raise MallError("수량은 1 이상이어야 합니다.")
+        if quantity > product_quantity:
+            raise MallError(f"재고가 부족합니다 (남은 수량 {product_quantity}).")
+        if not CUSTOMER_NAME_PATTERN.match(customer_name):
+            raise MallError("잘못된 고객명입니다.")
+        if not CUSTOMER_ADDRESS_PATTERN.match(customer_address):
+            raise MallError("잘못된 주소입니다.")
+        if not ORDER_DATE_PATTERN.match(order_date):
+            raise MallError("날짜는 'YYYY-MM-DD' 형식이어야 합니다.")
+        if last_order_date is not None and order_date < last_order_date:
+            raise MallError("주문일은 마지막 주문일 이후여야 합니다.")
+
+    # 주문 한 건 처리, 재고 확인과 차감을 중간에 다른 작업 없이 한 번에 함
+    # commit 이 False 이면 저장은 호출한 쪽에서 모아서 함
+    @timed('place_order')
+    def place_order(self, product_id, quantity, customer_name, customer_address, order_date, commit=True):
+        return self.checkout([(product_id, quantity)], customer_name, customer_address, order_date, commit)[0]
+
+    # 장바구니 주문 (items: [(상품번호, 수량)]), 주문번호 하나 아래 상품별로 한 줄씩 기록
+    # 모든 상품을 먼저 확인하고 하나라도 안 되면 아무것도 바꾸지 않음, 저장도 장바구니 전체에 한 번만 함
+    @timed('checkout')
+    def checkout(self, items, customer_name, customer_address, order_date, commit=True):
+        cart = {}  # 같은 상품을 여러 번 담았으면 수량을 합침
+        for product_id, quantity in items:
+            if quantity <= 0:
+                raise MallError("수량은 1 이상이어야 합니다.")
+            cart[product_id] = cart.get(product_id, 0) + quantity
+        if not cart:
+            raise MallError("장바구니가 비어 있습니다.")
+
+        with self.transaction(commit) as work:
+            last_order_date = self.order_dates.latest
+            for product_id, quantity in cart.items():
+                self.check_order(product_id, quantity, customer_name, customer_address, order_date, last_order_date)
+            order_id = self.order_ids.allocate()
+            orders = []
+            for product_id, quantity in cart.items():
+                product_name, product_price, product_quantity = self.products[product_id]
+                order = Order(order_id, product_id, product_name, product_price, quantity,
+                              customer_name, customer_address, order_date)
+                self.record_order(order)
+                self.set_product(product_id, (product_name, product_price, product_quantity - quantity))  # 수량 업데이트
+                orders.append(order)
+            if work is not None:
+                work.add_orders(orders, cart)
+        METRICS.count('kupang_orders_placed_total')
+        return orders
+
+
+    # 모아둔 변경 사항 저장 (서버처럼 transaction 밖에서 모은 경우), 한 번 부를 때마다 fsync 한 번
+    # 다른 스레드에서 저장할 때는 products/sales 에 그 시점의 복사본을 넘김
+    @timed('write_changes')
+    def write_changes(self, orders, product_ids, deleted_ids=(), products=None, sales=None):
+        products = self.products if products is None else products
+        sales = self.sales if sales is None else sales
+        with self.storage.locked():
+            self.write_unlocked(orders, product_ids, deleted_ids, products, sales)
+            if self.durability in ('batch', 'commit'):
+                self.storage.sync()
+
+    # 주문, 재고, 매출을 한 번에 확정 (중간에 실패하면 다시 읽었을 때 아무것도 저장되지 않은 상태)
+    def write_unlocked(self, orders, product_ids, deleted_ids, products, sales):
+        with self.storage.write_batch():
+            if orders:
+                if self.order_journal:
+                    self.storage.append_orders(orders)  # 새 주문만 추가
+                else:
+                    self.save_orders()
+            for product_id in deleted_ids:
+                self.storage.delete_product(products, product_id)
+            if product_ids:
+                self.storage.save_product_changes(products, product_ids)  # 상품 정보 저장
+            if orders:
+                self.storage.save_sales_records(orders)  # 매출 정보 저장
+                self.storage.save_sales_rollup(sales, orders)
+                self.save_user()
+
+    # 상품 일괄 등록 (records: name/price/quantity 딕셔너리, (줄 번호, 딕셔너리) 도 가능)
+    # 화면 입력과 같은 규칙으로 검사하고 저장은 마지막에 한 번만 함
+    # 반환: (등록된 상품번호 목록, [(줄 번호, 오류 내용)])
+    @timed('import_products')
+    def import_products(self, records):
+        added = []
+        errors = []
+        # 다른 프로세스와 겹치지 않도록 일괄 처리 전체를 잠금 안에서 처리
+        with self.transaction() as work:
+            for line_no, record in self.numbered(records):
+                if record is None:
+                    errors.append((line_no, "읽을 수 없는 줄입니다."))
+                    continue
+                try:
+                    product_name = str(record['name']).strip()
+                    product_price = int(record['price'])
+                    product_quantity = int(record['quantity'])
+                except (KeyError, TypeError, ValueError):
+                    errors.append((line_no, "name, price, quantity 가 필요하며 가격과 수량은 정수여야 합니다."))
+                    continue
+                try:
+                    self.check_product(product_name, product_price, product_quantity)
+                except MallError as error:
+                    errors.append((line_no, str(error)))
+                    continue
+                product_id = self.product_ids.allocate()
+                self.set_product(product_id, (product_name, product_price, product_quantity))
+                added.append(product_id)
+
+            work.save_products(added)
+        return added, errors
 
-    def to_file_string(self):
-        return (f"{self.order_id},{self.product_id},{self.product_name},{self.product_price},{self.quantity},"
-                f"{self.customer_name},{self.customer_address},{self.order_date}\n")
+    # 주문 일괄 처리 (records: product_id/quantity/customer_name/customer_address/order_date 딕셔너리,
+    # (줄 번호, 딕셔너리) 도 가능)
+    # add_order 와 같은 규칙으로 검사하고, 재고는 메모리에서 차감한 뒤 마지막에 한 번에 저장
+    # 반환: (확정된 주문 목록, [(줄 번호, 오류 내용)])
+    @timed('place_orders')
+    def place_orders(self, records):
+        placed = []
+        errors = []
+        changed = set()
+        # 다른 프로세스와 겹치지 않도록 일괄 처리 전체를 잠금 안에서 처리
+        with self.transaction() as work:
+            for line_no, record in self.numbered(records):
+                if record is None:
+                    errors.append((line_no, "읽을 수 없는 줄입니다."))
+                    continue
+                try:
+                    product_id = normalize_product_id(str(record['product_id']).strip())
+                    quantity = int(record['quantity'])
+                    customer_name = str(record['customer_name'])
+                    customer_address = str(record['customer_address'])
+                    order_date = str(record['order_date'])
+                except (KeyError, TypeError, ValueError):
+                    errors.append((line_no, "product_id, quantity, customer_name, customer_address, order_date 가 필요합니다."))
+                    continue
+
+                try:
+                    order = self.place_order(product_id, quantity, customer_name, customer_address, order_date,
+                                             commit=False)
+                except MallError as error:
+                    errors.append((line_no, str(error)))
+                    continue
+                changed.add(product_id)
+                placed.append(order)
 
+            work.add_orders(placed, changed)
+        return placed, errors
+
+    # 딕셔너리만 넘어오면 1부터 번호를 붙임
     @staticmethod
-    def from_file_string(order_str):
-        order_data = order_str.strip().split(',')
-        return Order(order_data[0], order_data[1], order_data[2], int(order_data[3]), int(order_data[4]),
-                     order_data[5], order_data[6], order_data[7])  # Add order_date as well
+    def numbered(records):
+        for line_no, record in enumerate(records, 1):
+            if isinstance(record, tuple):
+                yield record
+            else:
+                yield line_no, record
+
+    # 주문 확정 (주문 목록과 매출 집계에 반영)
+    def record_order(self, order):
+        self.orders.append(order)
+        self.order_dates.add(order.order_date, len(self.orders) - 1)
+        self.customer_index.add(order, len(self.orders) - 1)
+        self.sales.add(order)
+
+    # 매출 정보 저장 (매출 내역 한 줄 + 갱신된 집계)
+    def save_sales(self, order):
+        self.storage.save_sale(order)
+        self.storage.save_sales_rollup(self.sales, [order])
+
+    # 매출 집계 읽어오기, 저장된 집계가 없거나 주문 목록과 맞지 않으면 한 번만 다시 집계
+    @timed('load_sales')
+    def load_sales(self):
+        rollup = self.storage.load_sales_rollup()
+        order_count = len(self.orders)
+        if rollup is not None and rollup.order_count < order_count:
+            # 주문은 끝에 추가만 되므로 저장된 집계 뒤의 주문만 더함
+            added = [self.orders[position] for position in range(rollup.order_count, order_count)]
+            for order in added:
+                rollup.add(order)
+            self.sales = rollup  # 저장에 실패해도 메모리는 주문 목록과 맞게
+            self.storage.save_sales_rollup(rollup, added)
+        elif rollup is None or rollup.order_count != order_count:
+            self.sales = rollup = SalesRollup.from_orders(self.orders)
+            self.storage.save_sales_rollup(rollup)
+        else:
+            self.sales = rollup
+
+
+    # 저장소로부터 상품 읽어오기
+    @timed('load_items')
+    def load_items(self):
+        self.products.clear()
+        try:
+            self.storage.load_products(self.products)
+        except ValueError:
+            print("파일 형식이 잘못되었습니다. 상품 정보를 확인하세요.")  # Handle incorrect format
+        self.name_index.rebuild(self.products)
+
+    @timed('save_items')
+    def save_items(self):
+        self.storage.save_products(self.products)
+
+    # 상품 한 건만 저장 (SQLite 는 해당 행만 갱신)
+    @timed('save_item')
+    def save_item(self, product_id):
+        self.storage.save_product(self.products, product_id)
+
+    # 저장소로부터 주문 읽어오기
+    @timed('load_orders')
+    def load_orders(self):
+        try:
+            self.orders = self.storage.open_orders(self.orders)
+        except ValueError:
+            print("파일 형식이 잘못되었습니다. 주문 정보를 확인하세요.")
+        self.order_dates.rebuild(self.orders)
+        self.customer_index.rebuild(self.orders)
+
+    # start ~ end (YYYY-MM-DD, 양끝 포함) 기간의 주문 목록 (주문일 순)
+    def orders_between(self, start, end):
+        return [self.orders[position] for position in self.order_dates.positions_between(start, end)]
+
+    # 장바구니 주문은 주문번호가 같은 여러 줄이므로 주문번호 수를 셈
+    @staticmethod
+    def count_orders(orders):
+        return len({order.order_id for order in orders})
+
+    # 매출 분석, start/end (YYYY-MM-DD, 양끝 포함) 가 있으면 그 기간의 주문만 (주문일 색인으로 찾음)
+    def analytics(self, start=None, end=None):
+        positions = None
+        if start is not None or end is not None:
+            positions = self.order_dates.positions_between(start or '0000-00-00', end or '9999-99-99')
+        return SalesAnalytics(self.orders, positions)
+
+    # 고객별 (고객명, 주소, 주문 목록(상품별 한 줄), 총 구매액), address 가 없으면 이름이 같은 고객 모두
+    def customer_orders(self, name, address=None):
+        return [(name, address, [self.orders[position] for position in positions], spend)
+                for (name, address), (positions, spend) in self.customer_index.find(name, address)]
+
+    # 총 구매액 상위 n 명 [(고객명, 주소, 주문 수, 총 구매액)]
+    def top_customers(self, n=10):
+        return [(name, address, self.count_orders(self.orders[position] for position in positions), spend)
+                for (name, address), (positions, spend) in self.customer_index.top(n)]
+
+    # 주문 한 건을 저널 끝에 추가, load_orders 가 그대로 다시 읽어들임
+    def append_order(self, order):
+        self.storage.append_order(order)
+
+    # 주문 정보를 저장 (전체를 다시 씀, 명시적으로 호출할 때만 사용)
+    @timed('save_orders')
+    def save_orders(self):
+        self.storage.save_orders(self.orders)
+
+    # 유저 정보를 저장
+    def save_user(self):
+        self.storage.save_user()
+
+
+# 표 출력 (목록 전체가 아니라 보이는 한 페이지만 만들어서 한 번에 출력)
+# columns: (머리글, 너비, 값을 꺼내는 함수[, 뒤에 붙일 글자]) 목록
+# rows: 행 목록 (list, OrderStore, LazyOrderFile 처럼 잘라낼 수 있거나 dict.items() 처럼 반복만 되는 것)
+class TableView:
+    def __init__(self, columns, rows, page_size=20):
+        self.columns = [column if len(column) == 4 else (*column, '') for column in columns]
+        self.rows = rows
+        self.count = len(rows)
+        self.page_size = max(1, page_size)
+        self.page = 0
+        self.sort_index = None
+        self.reverse = False
+        self.visible = list(range(len(self.columns)))  # 보여줄 열 번호
+
+    def page_count(self):
+        return max(1, -(-self.count // self.page_size))
+
+    def go(self, page):
+        if not 0 <= page < self.page_count():
+            return False
+        self.page = page
+        return True
+
+    def next_page(self):
+        return self.go(self.page + 1)
+
+    def prev_page(self):
+        return self.go(self.page - 1)
+
+    def column_index(self, header):
+        for index, column in enumerate(self.columns):
+            if column[0].replace(' ', '') == header.replace(' ', ''):
+                return index
+        return None
+
+    # 정렬 (열 이름 앞에 '-' 를 붙이면 내림차순), 정렬을 바꾸면 첫 페이지로
+    def sort_by(self, header):
+        reverse = header.startswith('-')
+        index = self.column_index(header.lstrip('-'))
+        if index is None:
+            return False
+        self.sort_index, self.reverse, self.page = index, reverse, 0
+        return True
+
+    # 보여줄 열 선택 (빈 목록이면 전체)
+    def select(self, headers):
+        if not headers:
+            self.visible = list(range(len(self.columns)))
+            return True
+        indexes = [self.column_index(header) for header in headers]
+        if None in indexes:
+            return False
+        self.visible = indexes
+        return True
+
+    # 지금 페이지에 해당하는 행만 꺼냄
+    def page_rows(self):
+        start = self.page * self.page_size
+        stop = start + self.page_size
+        if self.sort_index is not None:
+            # 전체를 정렬하지 않고 이 페이지 끝까지만 골라냄
+            key = self.columns[self.sort_index][2]
+            pick = heapq.nlargest if self.reverse else heapq.nsmallest
+            return pick(stop, self.rows, key=key)[start:stop]
+        if hasattr(self.rows, '__getitem__'):
+            return self.rows[start:stop]
+        return list(itertools.islice(self.rows, start, stop))
+
+    def render_lines(self):
+        columns = [self.columns[index] for index in self.visible]
+        line_format = ' '.join(f"{{:<{width}}}{suffix}" for header, width, get, suffix in columns)
+        lines = [' '.join(f"{header:<{width}}" for header, width, get, suffix in columns)]
+        lines.extend(line_format.format(*[get(row) for header, width, get, suffix in columns])
+                     for row in self.page_rows())
+        if self.page_count() > 1:
+            lines.append(f"\n({self.page + 1}/{self.page_count()} 페이지, 전체 {self.count}건)")
+        return lines
+
+    def render(self, out=None):
+        (out or sys.stdout).write('\n'.join(self.render_lines()) + '\n')
+
+
+PRODUCT_COLUMNS = (
+    ('상품번호', 15, lambda item: item[0]),
+    ('상품명', 15, lambda item: item[1][0]),
+    ('가격(단위: 원)', 15, lambda item: item[1][1]),
+    ('수량(단위: 개)', 10, lambda item: item[1][2]),
+)
+
+ORDER_COLUMNS = (
+    ('주문번호', 15, lambda order: order.order_id),
+    ('고객명', 15, lambda order: order.customer_name),
+    ('주소', 30, lambda order: order.customer_address),
+    ('주문상품명', 15, lambda order: order.product_name),
+    ('상품번호', 15, lambda order: order.product_id),
+    ('가격(원)', 15, lambda order: order.product_price),
+    ('수량', 10, lambda order: order.quantity),
+    ('주문일', 15, lambda order: order.order_date),
+)
+
+TOP_PRODUCT_COLUMNS = (
+    ('상품번호', 15, lambda row: row[0]),
+    ('상품명', 15, lambda row: row[1]),
+    ('판매량(개)', 15, lambda row: row[2]),
+    ('매출(원)', 15, lambda row: row[3], '원'),
+)
+
+PERIOD_COLUMNS = (
+    ('기간', 15, lambda row: row[0]),
+    ('주문 줄 수', 15, lambda row: row[1]),
+    ('판매량(개)', 15, lambda row: row[2]),
+    ('매출(원)', 15, lambda row: row[3], '원'),
+)
+
+CUSTOMER_COLUMNS = (
+    ('고객명', 15, lambda customer: customer[0]),
+    ('주소', 30, lambda customer: customer[1]),
+    ('주문 수', 10, lambda customer: customer[2]),
+    ('총 구매액(원)', 15, lambda customer: customer[3], '원'),
+)
+
+SALES_COLUMNS = (
+    ('상품번호', 15, lambda item: item[0]),
+    ('상품명', 15, lambda item: item[1][0]),
+    ('판매량(개)', 15, lambda item: item[1][1]),
+    ('매출(원)', 10, lambda item: item[1][2], '원'),
+)
 
-# 쇼핑몰 클래스
-class ShoppingMall:
-    def __init__(self):
-        self.orders = []  # 주문 목록
-        self.products = {}  # 상품 목록 (상품명: (가격, 수량))
-        self.load_items()
-        self.load_orders()
+
+# 화면 이동 (ShoppingMall.run 참고), 화면 메서드는 입력을 한 번 처리하고 다음 이동을 돌려줌
+#   None: 같은 화면 다시, ('push', 화면): 새 화면으로, ('replace', 화면): 지금 화면을 바꿈,
+#   ('home', 화면): 첫 화면 위에 그 화면만 남김, SCREEN_BACK: 이전 화면으로, SCREEN_EXIT: 종료
+SCREEN_BACK = ('back', None)
+SCREEN_EXIT = ('exit', None)
+
+
+# 쇼핑몰 클래스 (콘솔 메뉴, MallCore 의 기능을 사용)
+class ShoppingMall(MallCore):
+    page_size = 20  # 표 한 페이지에 보여줄 행 수
+    max_screen_depth = 16  # 화면 스택 최대 깊이 (넘으면 가장 오래된 화면부터 버림)
+
+    # script: 입력 대신 차례로 사용할 문자열들 (자동 실행/재현용)
+    def __init__(self, storage=None, order_journal=True, script=None, durability=None):
+        super().__init__(storage, order_journal, durability)
+        self.script = iter(script) if script is not None else None
+        self.screen = None  # 지금 실행 중인 화면 (측정/기록용)
+        self.last_view = None  # 마지막으로 보여준 여러 페이지짜리 표 (메뉴의 (p) 로 넘겨 봄)
+
+    # 모든 화면 입력은 여기를 거침, script 가 있으면 거기서 꺼내고 다 쓰면 EOFError (input 과 같음)
+    def input(self, prompt=''):
+        if self.script is None:
+            return input(prompt)
+        answer = next(self.script, None)
+        if answer is None:
+            raise EOFError
+        return answer
+
+    # 표의 첫 페이지만 보여주고 돌아감 (뒤에 이어지는 메뉴 입력을 페이지 명령으로 읽지 않도록 입력은 받지 않음)
+    # 여러 페이지면 기억해 두었다가 메뉴의 (p) 에서 page_through 로 넘겨 봄
+    def browse(self, columns, rows):
+        view = TableView(columns, rows, self.page_size)
+        view.render()
+        self.last_view = view if view.page_count() > 1 else None
+        if self.last_view is not None:
+            print("(나머지 페이지는 메뉴에서 p 를 입력하면 넘겨 볼 수 있습니다)")
+
+    # 마지막 표가 여러 페이지일 때 메뉴에 붙이는 항목
+    def page_menu(self):
+        return "\n(p) 목록 페이지 넘기기" if self.last_view is not None else ""
+
+    # 목록 페이지 넘기기 화면 (마지막으로 보여준 표를 한 페이지씩 봄, Enter 로 메뉴로 돌아감)
+    def page_through(self):
+        view = self.last_view
+        while True:
+            view.render()
+            command = self.input("\n(n) 다음 (p) 이전 (번호) 페이지 이동 (s) 정렬 (c) 열 선택 (Enter) 메뉴로: ").strip().lower()
+            if not command:
+                return
+            if command == 'n':
+                if not view.next_page():
+                    print("마지막 페이지입니다.")
+            elif command == 'p':
+                if not view.prev_page():
+                    print("첫 페이지입니다.")
+            elif command.isdigit():
+                if not view.go(int(command) - 1):
+                    print(f"페이지는 1~{view.page_count()} 사이로 입력하세요.")
+            elif command == 's':
+                header = self.input("정렬할 열 이름 (내림차순은 앞에 '-'): ").strip()
+                if not view.sort_by(header):
+                    print("없는 열입니다.")
+            elif command == 'c':
+                headers = [header.strip() for header in self.input("보여줄 열 이름 (쉼표로 구분, 전체는 Enter): ").split(',')
+                           if header.strip()]
+                if not view.select(headers):
+                    print("없는 열입니다.")
+            else:
+                print("잘못된 입력입니다.")
 
     def check_id(self, product_id):
         #상품 번호가 이미 등록된 상품 번호와 중복되는지 확인하는 함수
@@ -49,41 +3348,38 @@ class ShoppingMall:
 
     def add_product(self):
         while True:
-            product_name = input("상품명: ")
+            product_name = self.input("상품명: ")
 
             if product_name == "0":
                     return
 
             # Validate the product name, and re-prompt until valid
             while not self.is_valid_product_name(product_name):
-                product_name = input("상품명: ")
+                product_name = self.input("상품명: ")
 
 
             try:
                 # Ensure the price is a positive integer
-                product_price = int(input("가격 (원): "))
+                product_price = int(self.input("가격 (원): "))
                 if product_price < 0:
                     print("가격은 음수일 수 없습니다. 다시 입력해주세요.")
                     continue
 
                 # Ensure the quantity is a positive integer
-                product_quantity = int(input("수량 (개): "))
+                product_quantity = int(self.input("수량 (개): "))
                 if product_quantity < 0:
                     print("수량은 음수일 수 없습니다. 다시 입력해주세요.")
                     continue
 
 
-                product_id = f"PROD{random.randint(1000, 9999)}"
-                if not self.check_id(product_id):
-                    break  # Unique ID found, break the loop
-
-                # Register the product
-                self.products[product_id] = (product_name, product_price, product_quantity)
+                # Register the product and save it
+                try:
+                    product_id = self.create_product(product_name, product_price, product_quantity)
+                except MallError as error:
+                    print(f"오류: {error}")
+                    continue
                 print(f"상품 번호 '{product_id}'")
                 print("상품 등록이 완료되었습니다.")
-
-                # Save the product information to file
-                self.save_items()
                 break  # Exit the loop after successful registration
 
             except ValueError:
@@ -96,7 +3392,7 @@ class ShoppingMall:
             print("\n이전 화면으로 돌아갑니다.")
             return False
         # If the product name is any other number, show an error message
-        elif product_name.isdigit():
+        elif not is_product_name_allowed(product_name):
             print("\n오류: 잘못된 입력입니다.")
             return False
         return True
@@ -104,12 +3400,8 @@ class ShoppingMall:
     def update_product_by_name(self, product_name):
         # Find products matching the given name
 
-            self.load_items()
-            matching_products = {
-                product_id: (name, price, quantity)
-                for product_id, (name, price, quantity) in self.products.items()
-                if product_name.lower() in name.lower()
-            }
+            self.refresh_items()
+            matching_products = self.find_products(product_name, strip_spaces=False)
 
             # Check if there are matching products
             if not matching_products:
@@ -119,16 +3411,13 @@ class ShoppingMall:
                 product_id, (product_name, price, quantity) = next(iter(matching_products.items()))
             else:
                 # Display the matching products
-                print("\n[ 검색 결과 ]")
-                print(f"\n{'상품번호':<15} {'상품명':<15} {'가격(단위: 원)':<15} {'수량(단위: 개)':<10}")
-                for product_id, (name, price, quantity) in matching_products.items():
-                    print(f"{product_id:<15} {name:<15} {price:<15} {quantity:<10}")
+                print("\n[ 검색 결과 ]\n")
+                self.browse(PRODUCT_COLUMNS, matching_products.items())
 
                 # Ask for the specific product ID to edit
-                product_id = input("\n수정할 상품번호를 입력하세요: ")
+                product_id = self.input("\n수정할 상품번호를 입력하세요: ")
 
-                if len(product_id) == 4 and product_id.isdigit():
-                    product_id = 'PROD' + product_id
+                product_id = normalize_product_id(product_id)
 
                 if product_id not in matching_products:
                     print("유효하지 않은 상품 번호입니다.")
@@ -142,62 +3431,65 @@ class ShoppingMall:
                 print("(2) 가격")
                 print("(3) 수량")
                 print("(0) 뒤로 가기")
-                choice = input("\n메뉴 번호 입력 (0~3): ")
+                choice = self.input("\n메뉴 번호 입력 (0~3): ")
 
                 if choice == '1':
 
                     try:
                         # Update name
                         print(f"현재 상품명: {matching_products[product_id][0]}")
-                        new_name = input("새로운 상품명 (변경하지 않으려면 Enter): ")
+                        new_name = self.input("새로운 상품명 (변경하지 않으려면 Enter): ")
                         if new_name:
                             if not self.is_valid_product_name(new_name):
                                 continue  # Invalid name, loop back to the options
                             product_name = new_name
-                            self.products[product_id] = (product_name, price, quantity)
-                            self.save_items()
+                            self.modify_product(product_id, product_name=product_name)
                             print("수정이 완료되었습니다.")
 
                     except ValueError:
                         print("상품명은 문자열만 입력 가능합니다.")
+                    except MallError as error:
+                        print(f"오류: {error}")
 
                 elif choice == '2':
 
                     # Update price with non-negative check
                     try:
                         print(f"현재 가격: {matching_products[product_id][1]}")
-                        new_price = input("새로운 가격 (변경하지 않으려면 Enter): ")
+                        new_price = self.input("새로운 가격 (변경하지 않으려면 Enter): ")
                         if new_price:
                             new_price = int(new_price)
                             if new_price < 0:
                                 print("가격은 음수일 수 없습니다. 다시 입력해주세요.")
                                 continue
                             price = new_price
-                            self.products[product_id] = (product_name, price, quantity)
-                            self.save_items()
+                            self.modify_product(product_id, product_price=price)
 
                             print("수정이 완료되었습니다.")
 
                     except ValueError:
                         print("가격은 숫자만 입력 가능합니다.")
+                    except MallError as error:
+                        print(f"오류: {error}")
 
                 elif choice == '3':
 
                     # Update quantity with non-negative check
                     try:
                         print(f"현재 수량: {matching_products[product_id][2]}")
-                        new_quantity = input("새로운 수량 (변경하지 않으려면 Enter): ")
+                        new_quantity = self.input("새로운 수량 (변경하지 않으려면 Enter): ")
                         if new_quantity:
                             new_quantity = int(new_quantity)
                             if new_quantity < 0:
                                 print("수량은 음수일 수 없습니다. 다시 입력해주세요.")
                                 continue
                             quantity = new_quantity
-                            self.products[product_id] = (product_name, price, quantity)
-                            self.save_items()
+                            self.modify_product(product_id, product_quantity=quantity)
                             print("수정이 완료되었습니다.")
                     except ValueError:
                         print("수량은 숫자만 입력 가능합니다.")
+                    except MallError as error:
+                        print(f"오류: {error}")
 
                 elif choice == '0':
                     print("이전 화면으로 돌아갑니다.")
@@ -211,11 +3503,7 @@ class ShoppingMall:
 
     def remove_product_by_name(self, product_name):
         # Find products matching the given name
-        matching_products = {
-            product_id: (name, price, quantity)
-            for product_id, (name, price, quantity) in self.products.items()
-            if product_name.lower() in name.lower()
-        }
+        matching_products = self.find_products(product_name, strip_spaces=False)
 
         # Check if there are matching products
         if not matching_products:
@@ -224,15 +3512,12 @@ class ShoppingMall:
 
         # Display the matching products
         print("\n< 검색 결과 >")
-        print(f"{'상품번호':<15} {'상품명':<15} {'가격(단위: 원)':<15} {'수량(단위: 개)':<10}")
-        for product_id, (name, price, quantity) in matching_products.items():
-            print(f"{product_id:<15} {name:<15} {price:<15} {quantity:<10}")
+        self.browse(PRODUCT_COLUMNS, matching_products.items())
 
         # Ask for the specific product ID to delete
-        product_id = input("\n단종할 상품번호를 입력하세요(뒤로가기 0): ")
+        product_id = self.input("\n단종할 상품번호를 입력하세요(뒤로가기 0): ")
 
-        if len(product_id) == 4 and product_id.isdigit():
-            product_id = 'PROD' + product_id
+        product_id = normalize_product_id(product_id)
 
         if product_id == '0':
             print("\n이전 화면으로 돌아갑니다.")
@@ -244,9 +3529,12 @@ class ShoppingMall:
 
         #Delete the product
 
-        del self.products[product_id]
+        try:
+            self.discontinue_product(product_id)  # Delete and save the updated product list
+        except MallError as error:
+            print(f"오류: {error}")
+            return
         print(f"단종 등록 완료하였습니다.")
-        self.save_items()  # Save the updated product list to file
 
 
     # 상품 목록 조회
@@ -254,28 +3542,11 @@ class ShoppingMall:
         if not self.products:
             print("등록된 상품이 없습니다.")
         else:
-            print("\n[상품 목록]")
-            print(f"\n{'상품 번호':<15} {'상품명':<15} {'가격 (단위 : 원)':<15} {'수량(단위 : 개)':<10}")
-
-            for product_id, (product_name, price, quantity) in self.products.items():
-                print(f"{product_id:<15} {product_name:<15} {price:<15} {quantity:<10}")
-
-    def remove_space(self, query):
-    # 공백만 있는 경우 검사
-        if query.strip() == '':
-            return None, "empty"
-        
-        # 특수문자 검사 (알파벳, 숫자, 한글, 공백 제외한 문자)
-        if re.search(r'[^\w\s가-힣]', query):
-            return None, "special"
-        
-        # 검색 가능한 경우
-        return query, "valid"
+            print("\n[상품 목록]\n")
+            self.browse(PRODUCT_COLUMNS, self.products.items())
 
-
-  
     def search_products(self, query):
-        query, signal = self.remove_space(query)
+        query, signal = remove_space(query)
         
         if signal == "empty":
             print("\n검색어가 비어 있습니다. 다시 입력하세요.")
@@ -284,12 +3555,8 @@ class ShoppingMall:
             print("\n특수문자를 입력할 수 없습니다.")
             return None
         
-        # 검색 로직
-        results = {
-            product_id: (name, price, quantity)
-            for product_id, (name, price, quantity) in self.products.items()
-            if query.lower() in name.lower() or query.lower() in name.lower().replace(' ', '')
-        }
+        # 검색 로직 (상품명 색인에서 후보만 확인, 초성 검색 가능)
+        results = self.find_products(query, jamo=True)
         
         return results
 
@@ -298,18 +3565,20 @@ class ShoppingMall:
     def manage_products(self):
         while True:
             self.view_products()
-            print("\n(1) 상품 등록\n(2) 상품 수정\n(3) 단종 등록\n(0) 뒤로가기")
-            choice = input("메뉴 번호 입력 (0~3): ")
-            if choice == '1':
+            print("\n(1) 상품 등록\n(2) 상품 수정\n(3) 단종 등록" + self.page_menu() + "\n(0) 뒤로가기")
+            choice = self.input("메뉴 번호 입력 (0~3): ")
+            if choice.lower() == 'p' and self.last_view is not None:
+                self.page_through()
+            elif choice == '1':
                 print("\n[ 상품 등록 ]")
                 self.add_product()  # 상품 추가
             elif choice == '2':
                 print("\n[ 상품 수정 ]")
-                product_name = input("수정할 상품명을 입력하세요 : ")
+                product_name = self.input("수정할 상품명을 입력하세요 : ")
                 self.update_product_by_name(product_name)  # 상품 수정
             elif choice == '3':
                 print("[ 단종 등록 ]")
-                product_name = input("단종할 상품명을 입력하세요 : ")
+                product_name = self.input("단종할 상품명을 입력하세요 : ")
                 self.remove_product_by_name(product_name)  # 상품 삭제
             elif choice == '0':
                 print("이전 화면으로 돌아갑니다.")
@@ -317,151 +3586,154 @@ class ShoppingMall:
             else:
                 print("잘못된 입력입니다. 다시 선택하세요.")
 
-    # 주문 추가 (고객용)
+    # 주문 추가 (고객용, 여러 상품을 장바구니에 담아 한 번에 주문), 주문을 마친 뒤 처음 화면으로 가겠다고 하면 True
     def add_order(self):
-        product_id = input("\n주문할 상품 번호를 입력해 주세요: ")
+        while True:
+            cart = self.fill_cart()
+            if cart is None:
+                return False  # 주문 종료
 
-        if len(product_id) == 4 and product_id.isdigit():
-            product_id = 'PROD' + product_id
+            print(f"주문가능 합니다. 고객 정보 입력 화면으로 넘어갑니다.")
+            print("\n[ 고객 정보 ]")
+            customer_name, customer_address, order_date = self.input_customer()
 
-        if product_id == '0':
-            print("주문을 종료합니다.")
-            return  # 주문 종료
+            print(f"\n입력이 완료되었습니다.")
 
-        if product_id in self.products:
-            product_name, product_price, product_quantity = self.products[product_id]
+            #주문 확인
+            self.print_cart(cart)
+            print("고객명:" + customer_name)
+            print("주소:" + customer_address)
+            print("주문일:" + str(order_date))
+            print("\n주문 정보가 일치합니까?")
+            print("\n(1) YES\n(2) NO")
+            while True:
+                choice = self.input("\n선택: ")
+                if choice == '1':
+
+                    # 재고 확인/차감, 주문번호 발급, 주문/상품/매출 정보 저장을 장바구니 전체에 한 번에 처리
+                    try:
+                        orders = self.checkout(cart.items(), customer_name, customer_address, order_date)
+                    except MallError as error:
+                        print(f"오류: {error}")
+                        return False
+                    print(f"주문이 완료되었습니다. 주문 완료 페이지로 넘어갑니다.")
+
+                    print("\n[ 주문 완료 ]")
+                    print(f"주문번호: {orders[0].order_id}")
+                    for order in orders:
+                        print(f"상품명: {order.product_name}, 수량: {order.quantity}, "
+                              f"금액: {order.product_price * order.quantity}원")
+                    print(f"합계: {sum(order.product_price * order.quantity for order in orders)}원")
+                    print(f"\n고객명: {customer_name}")
+                    print(f"주소: {customer_address}")
+                    print(f"주문일: {order_date}")
+                    print("\n이용해주셔서 감사합니다.")
+                    choice = self.input("처음으로 돌아가려면 아무 키나 눌러주세요: ")
+                    return bool(choice)
+                elif choice == '2':
+                    print("주문이 취소되었습니다. 상품 목록 페이지로 넘어갑니다.")
+                    self.view_products()
+                    break  # 상품 번호부터 다시 입력
+                else:
+                    print("\n오류: 잘못된 입력입니다.")
+                    # 주문 추가 실패 후 다시 choice 입력받도록 함
+                    continue
+
+    # 장바구니 담기, 상품번호 -> 수량 (주문을 그만두면 None)
+    def fill_cart(self):
+        cart = {}
+        while True:
+            product_id = self.input("\n주문할 상품 번호를 입력해 주세요: ")
+
+            product_id = normalize_product_id(product_id)
+
+            if product_id == '0':
+                print("주문을 종료합니다.")
+                return None
+
+            if product_id not in self.products:
+                print("유효하지 않은 상품번호 입니다.")
+                continue  # 다시 입력하도록 함
 
-            if product_quantity == 0:
+            # 장바구니에 이미 담은 수량은 빼고 확인
+            product_quantity = self.products[product_id][2] - cart.get(product_id, 0)
+
+            if product_quantity <= 0:
                 print("주문 수량이 없어 주문이 불가합니다. 다른 상품을 선택하세요.")
-                # 상품을 다시 선택하도록 루프의 시작으로 돌아감
-                return
+                continue
 
             while True:
                 try:
-                    quantity = int(input("\n주문할 수량 (0을 입력하면 종료): "))
+                    quantity = int(self.input("\n주문할 수량 (0을 입력하면 종료): "))
                     if quantity == 0:
                         print("\n주문을 종료합니다.")
-                        return  # 주문 종료
-                    if quantity > product_quantity:
+                        return None  # 주문 종료
+                    if quantity < 0 or quantity > product_quantity:
                         print("\n주문이 불가능합니다. 수량이 다시 입력해 주세요.")
                         continue  # 수량이 적절하지 않으면 다시 입력받도록 함
                     break
                 except ValueError:
                     print("\n수량은 정수로 입력해주세요.")
 
-            print(f"주문가능 합니다. 고객 정보 입력 화면으로 넘어갑니다.")
-            print("\n[ 고객 정보 ]")
-
+            cart[product_id] = cart.get(product_id, 0) + quantity
+            self.print_cart(cart)
             while True:
-                #번호 입력 불가, 다시 입력하도록 함
-                customer_name = input("고객명: ")
-                if not re.match(r'^[a-zA-Z가-힣\s]+$', customer_name):
-                    print("오류: 잘못된 입력입니다.")
-                    continue
+                choice = self.input("\n(1) 다른 상품 추가\n(2) 주문하기\n선택: ")
+                if choice in ('1', '2'):
+                    break
+                print("\n오류: 잘못된 입력입니다.")
+            if choice == '2':
+                return cart
 
-                customer_address = input("주소: ")
-                if not re.match(r'^[a-zA-Z0-9가-힣\s\-]+$', customer_address):
-                    print("오류: 잘못된 입력입니다.")
-                    continue
+    def print_cart(self, cart):
+        print("\n[ 장바구니 ]")
+        total = 0
+        for product_id, quantity in cart.items():
+            product_name, product_price, product_quantity = self.products[product_id]
+            total += product_price * quantity
+            print(f"주문 상품:{product_name}, 주문 수량:{quantity}, 금액:{product_price * quantity}원")
+        print(f"합계:{total}원")
 
-                self.last_order_date = Order.from_file_string(self.orders[-1].to_file_string()).order_date if self.orders else None
-                if self.last_order_date is None:
-                    # 첫 주문일 경우, 아무 날짜나 입력받도록 허용
-                    while True:
-                        order_date = input("주문일 (YYYY-MM-DD): ")
-                        if re.match(r"^\d{4}-\d{2}-\d{2}$", order_date):
-                            self.last_order_date = order_date
-                            break
-                        else:
-                            print("오류: 날짜는 'YYYY-MM-DD' 형식이어야 합니다. 다시 입력하세요.")
-                else:
-                    # 마지막 주문일이 있을 경우, 그 날짜 이후로만 입력받도록 함, orders.txt 파일에 저장된 마지막 주문일을 읽어옴
-                    while True:
-                        order_date = input("주문일 (" + str(self.last_order_date) + "~): ")
-                        if re.match(r"^\d{4}-\d{2}-\d{2}$", order_date):
-                            # 입력된 주문일이 마지막 주문일 이전이면 오류 처리
-                            if order_date < self.last_order_date:
-                                print("오류: 주문일은 마지막 주문일 이후여야 합니다.")
-                            else:
-                                # 유효한 날짜 입력되었으면 last_order_date 갱신
-                                self.last_order_date = order_date
-                                break
-                        else:
-                            print("오류: 날짜는 'YYYY-MM-DD' 형식이어야 합니다. 다시 입력하세요.")
-
-                print(f"\n입력이 완료되었습니다.")
-
-                #주문 확인
-                print("\n주문 상품:" + product_name)
-                print("주문 수량:" + str(quantity))
-                print("고객명:" + customer_name)
-                print("주소:" + customer_address)
-                print("주문일:" + str(order_date))
-                print("\n주문 정보가 일치합니까?")
-                print("\n(1) YES\n(2) NO")
+    # 고객 정보 입력 (고객명, 주소, 주문일)
+    def input_customer(self):
+        while True:
+            #번호 입력 불가, 다시 입력하도록 함
+            customer_name = self.input("고객명: ")
+            if not CUSTOMER_NAME_PATTERN.match(customer_name):
+                print("오류: 잘못된 입력입니다.")
+                continue
+
+            customer_address = self.input("주소: ")
+            if not CUSTOMER_ADDRESS_PATTERN.match(customer_address):
+                print("오류: 잘못된 입력입니다.")
+                continue
+
+            self.last_order_date = self.order_dates.latest
+            if self.last_order_date is None:
+                # 첫 주문일 경우, 아무 날짜나 입력받도록 허용
                 while True:
-                    choice = input("\n선택: ")
-                    if choice == '1':
-
-                        order_id = f"ORD{random.randint(1000, 9999)}"  # 고유 주문 ID 생성
-                        # 주문 번호 중복 검사
-                        if not self.check_id(order_id):
-                        # 주문 번호가 중복되면 주문을 종료하거나 다시 입력받도록 처리
-                            print("주문 번호가 중복되었습니다")
-                            return
-
-                        order = Order(order_id, product_id, product_name, product_price, quantity, customer_name, customer_address, order_date)
-                        self.orders.append(order)
-
-                        # 상품 수량 업데이트
-                        new_quantity = product_quantity - quantity
-                        self.products[product_id] = (product_name, product_price, new_quantity)  # 수량 업데이트
-                        print(f"주문이 완료되었습니다. 주문 완료 페이지로 넘어갑니다.")
-
-
-                        # 첫 사용자가 주문을 끝내면 users.txt 생성
-
-
-                        # 파일에 주문과 상품 정보 저장
-                        self.save_orders()
-                        self.save_items()  # 상품 정보도 함께 저장
-                        self.save_sales(order)  # 매출 정보 저장
-                        self.save_user()
-                        # 주문 추가 완료 후 루프 종료
-                        print("\n[ 주문 완료 ]")
-                        print(f"주문번호: {order_id}")
-                        print(f"상품명: {product_name}")
-                        print(f"수량: {quantity}")
-                        print(f"금액: {product_price * quantity}원")
-                        print(f"\n고객명: {customer_name}")
-                        print(f"주소: {customer_address}")
-                        print(f"주문일: {order_date}")
-                        print("\n이용해주셔서 감사합니다.")
-                        choice = input("처음으로 돌아가려면 아무 키나 눌러주세요: ")
-                        if choice:
-                            self.customer_menu()
+                    order_date = self.input("주문일 (YYYY-MM-DD): ")
+                    if ORDER_DATE_PATTERN.match(order_date):
+                        self.last_order_date = order_date
                         break
-                    elif choice == '2':
-                        print("주문이 취소되었습니다. 상품 목록 페이지로 넘어갑니다.")
-                        self.view_products()
-                        self.add_order()
                     else:
-                        print("\n오류: 잘못된 입력입니다.")
-                        # 주문 추가 실패 후 다시 choice 입력받도록 함
-                        continue
-
-        else:
-            print("유효하지 않은 상품번호 입니다.")
-            #다시 입력하도록 함
-            self.add_order()
-
-
-    # 매출 정보 저장
-    def save_sales(self, order):
-        with open('sales.txt', 'a', encoding='utf-8') as f:
-            total_price = order.product_price * order.quantity
-            f.write(f"{order.product_id},{order.product_name},{order.quantity},{total_price}원\n")
+                        print("오류: 날짜는 'YYYY-MM-DD' 형식이어야 합니다. 다시 입력하세요.")
+            else:
+                # 마지막 주문일이 있을 경우, 그 날짜 이후로만 입력받도록 함, orders.txt 파일에 저장된 마지막 주문일을 읽어옴
+                while True:
+                    order_date = self.input("주문일 (" + str(self.last_order_date) + "~): ")
+                    if ORDER_DATE_PATTERN.match(order_date):
+                        # 입력된 주문일이 마지막 주문일 이전이면 오류 처리
+                        if order_date < self.last_order_date:
+                            print("오류: 주문일은 마지막 주문일 이후여야 합니다.")
+                        else:
+                            # 유효한 날짜 입력되었으면 last_order_date 갱신
+                            self.last_order_date = order_date
+                            break
+                    else:
+                        print("오류: 날짜는 'YYYY-MM-DD' 형식이어야 합니다. 다시 입력하세요.")
 
+            return customer_name, customer_address, order_date
 
    # 주문 목록 출력
     def view_orders(self):
@@ -469,84 +3741,137 @@ class ShoppingMall:
         if not self.orders:
             print("등록된 주문이 없습니다.")
         else:
-            # 헤더 출력
-            print(f"{'주문번호':<15} {'고객명':<15} {'주소':<30} {'주문상품명':<15} {'상품번호':<15} {'가격(원)':<15} {'수량':<10} {'주문일':<15}")
-
-            for order in self.orders:
-                print(f"{order.order_id:<15} {order.customer_name:<15} {order.customer_address:<30} {order.product_name:<15} {order.product_id:<15} {order.product_price:<15} {order.quantity:<10} {order.order_date:<15}")
+            self.browse(ORDER_COLUMNS, self.orders)
 
-        # 뒤로 가기 아무나 키나 누르면 이전 화면으로 돌아감
-        input_key = input("\n뒤로가기 (아무 키나 입력하세요): ")
+        # 뒤로 가기 아무나 키나 누르면 이전 화면(관리자 메뉴)으로 돌아감
+        input_key = self.input("\n뒤로가기 (아무 키나 입력하세요): ")
         if input_key:
             print("\n이전 화면으로 돌아갑니다.")
-            self.admin_menu()
 
 
-    # 매출 조회
-    def view_sales(self):
-        total_sales = 0
-        print("\n[ 매출 조회 ]")
-        print(f"{'상품번호':<15} {'상품명':<15} {'판매량(개)':<15} {'매출(원)':<10}")
-        for order in self.orders:
-            total_price = order.product_price * order.quantity
-            print(f"{order.product_id:<15} {order.product_name:<15} {order.quantity:<15} {total_price:<10}원")
-            total_sales += total_price
-        print(f"\n총매출(원): {total_sales}")
-
-        input_key = input("\n뒤로가기 (아무 키나 입력하세요): ")
-        if input_key:
-            print("\n이전 화면으로 돌아갑니다.")
-            self.admin_menu()
+    # 기간별 주문 조회 (주문일 색인으로 해당 기간만 찾음)
+    def view_orders_by_period(self):
+        print("\n[ 기간별 주문 조회 ]")
+        start = self.input("시작일 (YYYY-MM-DD): ")
+        end = self.input("종료일 (YYYY-MM-DD): ")
+        if not (ORDER_DATE_PATTERN.match(start) and ORDER_DATE_PATTERN.match(end)):
+            print("오류: 날짜는 'YYYY-MM-DD' 형식이어야 합니다.")
+            return
 
-    # 파일로부터 상품 읽어오기
-    def load_items(self):
-        self.products.clear()
-        try:
-            with open('products.txt', 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():  # Check if the line is not empty
-                        product_id, product_name, product_price, product_quantity,  = line.strip().split(',')
-                        self.products[product_id] = (product_name, int(product_price), int(product_quantity))
+        orders = self.orders_between(start, end)
+        if not orders:
+            print("해당 기간의 주문이 없습니다.")
+            return
+        print(f"{start} ~ {end} 주문 {len(orders)}건")
+        self.browse(ORDER_COLUMNS, orders)
 
-        except FileNotFoundError:
-            pass  # File not found, do nothing
-        except ValueError:
-            print("파일 형식이 잘못되었습니다. 상품 정보를 확인하세요.")  # Handle incorrect format
+    # 고객별 주문 내역 (고객 색인으로 해당 고객의 주문만 찾음)
+    def view_customer_orders(self):
+        print("\n[ 고객별 주문 조회 ]")
+        name = self.input("고객명: ")
+        address = self.input("주소 (Enter: 이름이 같은 고객 모두): ")
+        customers = self.customer_orders(name, address or None)
+        if not customers:
+            print("해당 고객의 주문이 없습니다.")
+            return
+        for name, address, orders, spend in customers:
+            print(f"\n{name} ({address}) 주문 {self.count_orders(orders)}건, 총 구매액 {spend}원")
+            self.browse(ORDER_COLUMNS, orders)
 
-    def save_items(self):
-        with open("products.txt", "w", encoding="utf-8") as file:
-            for product_id, (name, price, quantity) in self.products.items():
-                #상품 이름에 공백이 포함되어 있으면 없어버리고 저장
-                file.write(f"{product_id},{name},{price},{quantity}\n")
+    # 총 구매액 상위 고객
+    def view_top_customers(self):
+        print("\n[ 우수 고객 조회 ]")
+        count = self.input("몇 명까지 볼까요? (Enter: 10): ")
+        if not count:
+            count = '10'
+        if not count.isdigit() or int(count) == 0:
+            print("오류: 1 이상의 숫자를 입력하세요.")
+            return
+        customers = self.top_customers(int(count))
+        if not customers:
+            print("등록된 주문이 없습니다.")
+            return
+        self.browse(CUSTOMER_COLUMNS, customers)
 
-    # 파일로부터 주문 읽어오기
-    def load_orders(self):
-        try:
-            with open('orders.txt', 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        order = Order.from_file_string(line)  # Parse each order
-                        self.orders.append(order)
-        except FileNotFoundError:
-            pass
-        except ValueError:
-            print("파일 형식이 잘못되었습니다. 주문 정보를 확인하세요.")
+    # 매출 분석 (상품 순위, 일/주/월별 매출, 평균 장바구니 금액), 기간을 비워두면 전체
+    def view_sales_analytics(self):
+        print("\n[ 매출 분석 ]")
+        print("\n(1) 상품 순위 (매출)\n(2) 상품 순위 (판매량)\n(3) 일별 매출\n(4) 주별 매출\n(5) 월별 매출"
+              "\n(6) 평균 장바구니 금액\n(0) 뒤로")
+        choice = self.input("\n메뉴 번호 입력 (0~6): ")
+        if choice == '0':
+            return
+        if choice not in ('1', '2', '3', '4', '5', '6'):
+            print("오류 : 잘못된 입력입니다 .")
+            return
+        start = self.input("시작일 (YYYY-MM-DD, Enter: 처음부터): ") or None
+        end = self.input("종료일 (YYYY-MM-DD, Enter: 끝까지): ") or None
+        if not all(ORDER_DATE_PATTERN.match(day) for day in (start, end) if day is not None):
+            print("오류: 날짜는 'YYYY-MM-DD' 형식이어야 합니다.")
+            return
 
+        analytics = self.analytics(start, end)
+        if not len(analytics):
+            print("해당 기간의 주문이 없습니다.")
+            return
+        if choice in ('1', '2'):
+            count = self.input("몇 개까지 볼까요? (Enter: 10): ") or '10'
+            if not count.isdigit() or int(count) == 0:
+                print("오류: 1 이상의 숫자를 입력하세요.")
+                return
+            self.browse(TOP_PRODUCT_COLUMNS, analytics.top_products(int(count), 'revenue' if choice == '1' else 'units'))
+        elif choice in ('3', '4', '5'):
+            period = {'3': 'day', '4': 'week', '5': 'month'}[choice]
+            self.browse(PERIOD_COLUMNS, analytics.revenue_by_period(period))
+        else:
+            stats = analytics.basket_stats()
+            print(f"\n주문 수: {stats['orders']}건 (상품 {stats['lines']}줄, {stats['units']}개)")
+            print(f"총매출(원): {stats['revenue']}")
+            print(f"평균 장바구니 금액(원): {stats['average_basket']:.0f}")
+            print(f"평균 장바구니 수량(개): {stats['average_units']:.2f}")
 
-    # 주문 정보를 파일에 저장
-    def save_orders(self):
-        with open('orders.txt', 'w', encoding='utf-8') as f:
-            for order in self.orders:
-                f.write(order.to_file_string())
+    # 매출 조회 (매출 집계에서 바로 출력)
+    def view_sales(self):
+        print("\n[ 매출 조회 ]")
+        self.browse(SALES_COLUMNS, self.sales.by_product.items())
+        print(f"\n총매출(원): {self.sales.total_revenue}")
+
+        input_key = self.input("\n뒤로가기 (아무 키나 입력하세요): ")
+        if input_key:
+            print("\n이전 화면으로 돌아갑니다.")
 
+    # 기간별 매출 조회
+    def view_sales_by_period(self):
+        print("\n[ 기간별 매출 조회 ]")
+        start = self.input("시작일 (YYYY-MM-DD): ")
+        end = self.input("종료일 (YYYY-MM-DD): ")
+        if not (ORDER_DATE_PATTERN.match(start) and ORDER_DATE_PATTERN.match(end)):
+            print("오류: 날짜는 'YYYY-MM-DD' 형식이어야 합니다.")
+            return
 
-    # 유저 정보를 파일에 저장
-    def save_user(self):
-        if not os.path.isfile('users.txt'):
-            with open('users.txt', 'w', encoding='utf-8') as f:
-                f.write("고객명,주소,아이디,비밀번호\n")
+        days = self.sales.sales_between(start, end)
+        if not days:
+            print("해당 기간의 매출이 없습니다.")
+            return
+        print(f"\n{'주문일':<15} {'판매량(개)':<15} {'매출(원)':<10}")
+        for day, units, revenue in days:
+            print(f"{day:<15} {units:<15} {revenue:<10}원")
+        print(f"\n기간 매출(원): {sum(revenue for day, units, revenue in days)}")
+
+    # 상품별 매출 조회
+    def view_product_sales(self):
+        print("\n[ 상품별 매출 조회 ]")
+        product_id = self.input("상품번호: ")
+        product_id = normalize_product_id(product_id)
+        if product_id not in self.sales.by_product and product_id not in self.products:
+            print("유효하지 않은 상품번호 입니다.")
+            return
+        units, revenue = self.sales.product_sales(product_id)
+        print(f"상품번호: {product_id}")
+        print(f"판매량(개): {units}")
+        print(f"매출(원): {revenue}")
 
-    # 고객 메뉴
+    # 고객 첫 화면
     def customer_menu(self):
         print("\n[고객]")
         print(f"\n*((**(: 환영합니다  :) **))*")
@@ -554,144 +3879,234 @@ class ShoppingMall:
         # Step 1: Ask if the customer wants to view products
         print("상품 목록을 조회하시겠습니까? \n\n(1) YES \n(2) NO")
 
-        view_choice = input("\n선택: ")
+        view_choice = self.input("\n선택: ")
         if view_choice == '1':
             self.view_products()  # Show products if they choose "YES"
+            return 'replace', 'customer_shop'
         elif view_choice == '2':
             print("이전 화면으로 돌아갑니다.")
-            # return to the role selection menu
-            self.role_selection()
         else:
-            print("오류 잘못된 입력입니다.")  # Prompt again for valid input
+            print("오류 잘못된 입력입니다.")
+        return SCREEN_BACK  # 첫 화면으로
 
-        # Step 2: Only view_choice 1 will proceed to the next step
-        if view_choice == '1':
-            while True:
-                print("\n(1) 상품 검색\n(2) 상품 선택\n(0) 종료")
-                choice = input("선택: ")
+    # 고객 메뉴 (상품 검색 / 상품 선택)
+    def customer_shop(self):
+        print("\n(1) 상품 검색\n(2) 상품 선택" + self.page_menu() + "\n(0) 종료")
+        choice = self.input("선택: ")
 
-                if choice == '1':
-                    self.load_items()
-                    search_choice_save = ''
-                    while True:
-                        if search_choice_save == '0':
-                            break
-                        print("상품 검색 화면으로 넘어갑니다.")
-                        print("\n[상품 검색]")
-
-                        search_query = input("\n검색어를 입력하세요: ")
-
-
-                        search_results = self.search_products(search_query)
-                    # while True:
-                        if search_results == None:
-                            print("\n(1) 다시 검색하기 \n(0) 검색 종료")
-                            search_choice = input("선택: ")
-                            if search_choice == '1':
-                                continue  # Restart search input
-                            elif search_choice == '0':
-                                self.view_products()
-                                search_choice_save = search_choice
-                                break  # Go back to main menu
-                            else:
-                                print("잘못된 입력입니다. 다시 선택하세요.")
-                                continue
-                        if search_results:
-                            print(f"\n해당되는 데이터가 {len(search_results)}개 있습니다.")
-                            print(f"\n{'상품 번호':<15} {'상품명':<15} {'가격 (단위 : 원)':<15} {'수량 (단위 : 개)':<10}")
-                            for product_id, (name, price, quantity) in search_results.items():
-                                print(f"{product_id:<15} {name:<15} {price:<15} {quantity:<10}")
-
-                            print("\n(1) 상품 주문하기 \n(2) 다시 검색하기 \n(0) 검색 종료")
-                            search_choice = input("선택: ")
-                            if search_choice == '1':
-                                self.add_order()
-                                break  # Exit to main menu after order
-                            elif search_choice == '2':
-                                continue  # Restart search input
-                            elif search_choice == '0':
-                                self.view_products()
-                                break  # Go back to main menu
-                            else:
-                                print("잘못된 입력입니다. 다시 선택하세요.")
-                        else:
-                            print("\n해당되는 데이터가 없습니다.")
-                            search_choice = ''   
-                            while search_choice != '1' or '0':
-                                print("\n(1) 다시 검색하기 \n(0) 검색 종료")
-                                search_choice = input("선택: ")
-                                if search_choice == '1':
-                                    search_choice_save = '1';
-                                    break  # Restart search input
-                                     
-                                elif search_choice == '0':
-                                    search_choice_save = '0'
-                                    self.view_products()
-                                    break
-                                else:
-                                    print("잘못된 입력입니다. 다시 선택하세요.")
-                                    continue
-                   
+        if choice.lower() == 'p' and self.last_view is not None:
+            self.page_through()
+        elif choice == '1':
+            self.refresh_items()
+            return 'push', 'product_search'
+        elif choice == '2':
+            print("상품 선택 화면으로 넘어갑니다.")
+            print("\n[상품 선택]")
+            self.view_products()
+            if self.add_order():  # Proceed to order selection
+                return 'home', 'customer_menu'
+        elif choice == '0':
+            print("이전 화면으로 돌아갑니다.")
+            return SCREEN_BACK
+        else:
+            print("잘못된 입력입니다. 다시 선택하세요.")
+        return None
 
-                elif choice == '2':
-                    print("상품 선택 화면으로 넘어갑니다.")
-                    print("\n[상품 선택]")
-                    self.view_products()
-                    self.add_order()  # Proceed to order selection
+    # 상품 검색 화면 (검색 한 번 처리)
+    def product_search(self):
+        print("상품 검색 화면으로 넘어갑니다.")
+        print("\n[상품 검색]")
 
-                elif choice == '0':
-                    print("이전 화면으로 돌아갑니다.")
-                    break
-                else:
-                    print("잘못된 입력입니다. 다시 선택하세요.")
+        search_query = self.input("\n검색어를 입력하세요 (초성 검색 가능): ")
+        search_results = self.search_products(search_query)
+        if search_results:
+            print(f"\n해당되는 데이터가 {len(search_results)}개 있습니다.")
+            print()
+            self.browse(PRODUCT_COLUMNS, search_results.items())
+            menu, search_again = "\n(1) 상품 주문하기 \n(2) 다시 검색하기 \n(0) 검색 종료", '2'
+        else:
+            if search_results is not None:
+                print("\n해당되는 데이터가 없습니다.")
+            menu, search_again = "\n(1) 다시 검색하기 \n(0) 검색 종료", '1'
 
+        while True:
+            print(menu + self.page_menu())
+            search_choice = self.input("선택: ")
+            if search_choice.lower() == 'p' and self.last_view is not None:
+                self.page_through()
+                continue
+            if search_choice == search_again:
+                return None  # Restart search input
+            elif search_choice == '0':
+                self.view_products()
+                return SCREEN_BACK  # Go back to main menu
+            elif search_choice == '1' and search_results:
+                return ('home', 'customer_menu') if self.add_order() else SCREEN_BACK
+            print("잘못된 입력입니다. 다시 선택하세요.")
 
     # 관리자 메뉴
     def admin_menu(self):
-        while True:
-            print("\n[ 관 리 자 ]")
-            print("\n(1) 상품 목록 조회\n(2) 주문 조회\n(3) 매출 조회\n(0) 종료")
-            choice = input("\n메뉴 번호 입력 (0~3): ")
-            if choice == '1':
-                self.manage_products()  # 상품 목록 및 관리
-            elif choice == '2':
-                self.view_orders()  # 주문 조회
-            elif choice == '3':
-                self.view_sales()  # 매출 조회
-            elif choice == '0':
-                print("프로그램이 종료합니다 .")
-                break;
-            else:
-                print("오류 : 잘못된 입력입니다 .")
+        print("\n[ 관 리 자 ]")
+        print("\n(1) 상품 목록 조회\n(2) 주문 조회\n(3) 매출 조회\n(4) 기간별 매출 조회\n(5) 상품별 매출 조회"
+              "\n(6) 기간별 주문 조회\n(7) 고객별 주문 조회\n(8) 우수 고객 조회\n(9) 매출 분석" + self.page_menu() + "\n(0) 종료")
+        choice = self.input("\n메뉴 번호 입력 (0~9): ")
+        if choice.lower() == 'p' and self.last_view is not None:
+            self.page_through()
+        elif choice == '1':
+            self.manage_products()  # 상품 목록 및 관리
+        elif choice == '2':
+            self.view_orders()  # 주문 조회
+        elif choice == '3':
+            self.view_sales()  # 매출 조회
+        elif choice == '4':
+            self.view_sales_by_period()  # 기간별 매출 조회
+        elif choice == '5':
+            self.view_product_sales()  # 상품별 매출 조회
+        elif choice == '6':
+            self.view_orders_by_period()  # 기간별 주문 조회
+        elif choice == '7':
+            self.view_customer_orders()  # 고객별 주문 조회
+        elif choice == '8':
+            self.view_top_customers()  # 우수 고객 조회
+        elif choice == '9':
+            self.view_sales_analytics()  # 매출 분석
+        elif choice == '0':
+            print("프로그램이 종료합니다 .")
+            return SCREEN_BACK
+        else:
+            print("오류 : 잘못된 입력입니다 .")
+        return None
 
-    # 사용자 역할 선택
-    def role_selection(self):
-        while True:
-            print("\n[ 쇼 핑 몰 ]")
-            print("\n(1) 관리자 페이지\n(2) 고객 페이지\n(0) 종료")
-            role = input("이용하실 서비스를 선택해주세요 (0~2): ")
-            if role == '2':
-                self.customer_menu()  # 고객 메뉴로 이동
-            elif role == '1':
-                while True:
-                    admin_code = input("관리자 코드 : ")
-                    if admin_code == '0':
-                        print("첫 화면으로 돌아갑니다.")
-                        break  # 관리자 코드 입력을 종료하고 상위 메뉴로 돌아감
-                    elif admin_code == "1234":  # 관리자 코드 수정
-                        self.admin_menu()  # 관리자 메뉴로 이동
-                        break
-                    else:
-                        print("잘못된 코드입니다.")
-            elif role == '0':
-                print("프로그램이 종료 됩니다 .") # 프로그램 종료
-                sys.exit()
+    # 첫 화면 (사용자 역할 선택)
+    def role_menu(self):
+        print("\n[ 쇼 핑 몰 ]")
+        print("\n(1) 관리자 페이지\n(2) 고객 페이지\n(0) 종료")
+        role = self.input("이용하실 서비스를 선택해주세요 (0~2): ")
+        if role == '2':
+            return 'push', 'customer_menu'  # 고객 메뉴로 이동
+        elif role == '1':
+            while True:
+                admin_code = self.input("관리자 코드 : ")
+                if admin_code == '0':
+                    print("첫 화면으로 돌아갑니다.")
+                    return None  # 관리자 코드 입력을 종료하고 첫 화면으로 돌아감
+                elif admin_code == "1234":  # 관리자 코드 수정
+                    return 'push', 'admin_menu'  # 관리자 메뉴로 이동
+                else:
+                    print("잘못된 코드입니다.")
+        elif role == '0':
+            print("프로그램이 종료 됩니다 .") # 프로그램 종료
+            return SCREEN_EXIT
+        else:
+            print("잘못된 입력입니다.")
+        return None
 
-            else:
-                print("잘못된 입력입니다.")
+    # 화면 스택이 빌 때까지 맨 위 화면을 실행하고 돌려준 이동을 적용 (입력이 끝나도 종료)
+    def run(self, start='role_menu'):
+        screens = deque([start], maxlen=self.max_screen_depth)
+        while screens:
+            self.screen = screens[-1]
+            try:
+                action = getattr(self, self.screen)()
+            except EOFError:
+                return
+            except MallError as error:
+                print(f"오류: {error}")  # 화면에서 처리하지 않은 규칙 위반은 알리고 같은 화면을 다시 보여줌
+                continue
+            if action is None:
+                continue
+            kind, screen = action
+            if kind == 'push':
+                screens.append(screen)
+            elif kind == 'replace':
+                screens[-1] = screen
+            elif kind == 'back':
+                screens.pop()
+            elif kind == 'home':
+                while len(screens) > 1:
+                    screens.pop()
+                screens.append(screen)
+            elif kind == 'exit':
+                screens.clear()
+
+    # 사용자 역할 선택부터 시작해서 종료하면 프로그램도 끝냄
+    def role_selection(self):
+        self.run('role_menu')
+        sys.exit()
 
 # 프로그램 실행
 if __name__ == "__main__":
-    shopping_mall = ShoppingMall()
+    parser = argparse.ArgumentParser(description="쇼핑몰")
+    parser.add_argument('--storage', choices=['text', 'binary', 'sqlite'], default='text', help="저장소 종류")
+    parser.add_argument('--data-dir', default='.', help="데이터 파일 위치")
+    parser.add_argument('--db', default='kupang.db', help="SQLite 데이터베이스 파일명")
+    parser.add_argument('--lazy-orders', action='store_true', help="orders.txt 를 필요할 때만 읽음 (text 저장소)")
+    parser.add_argument('--import-products', metavar='FILE', help="상품 일괄 등록 (.csv 또는 JSON lines) 후 종료")
+    parser.add_argument('--import-orders', metavar='FILE', help="주문 일괄 처리 (.csv 또는 JSON lines) 후 종료")
+    parser.add_argument('--convert', choices=['binary', 'text'],
+                        help="데이터 폴더의 상품/주문 파일을 이 형식으로 변환 후 종료 (원래 파일은 남겨둠)")
+    parser.add_argument('--metrics', metavar='FILE', default=os.environ.get('KUPANG_METRICS'),
+                        help="성능 측정을 켜고 종료 시(또는 SIGUSR1) 이 파일에 저장, .json 이 아니면 Prometheus 형식 "
+                             "(환경 변수 KUPANG_METRICS 로도 지정 가능)")
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS,
+                        help="저장 후 디스크 기록 수준: none(fsync 안 함), batch(모아서 fsync), commit(커밋마다 fsync)")
+    parser.add_argument('--compact', action='store_true', help="변경 기록을 스냅샷에 한 번 합친 뒤 종료")
+    parser.add_argument('--reconcile', metavar='FILE',
+                        help="주문 파일(orders.txt 형식)을 여러 프로세스로 나눠 읽고 매출 합계와 오류를 출력한 뒤 종료")
+    parser.add_argument('--workers', type=int, help="--reconcile 에 쓸 프로세스 수 (기본: CPU 수)")
+    parser.add_argument('--compact-bytes', type=int, default=4 * 1024 * 1024,
+                        help="합치지 않은 변경 기록이 이 크기(바이트)를 넘으면 뒤에서 합침 (0 이면 끔)")
+    parser.add_argument('--compact-age', type=float, default=3600, help="마지막으로 합친 뒤 이 시간(초)이 지나면 합침")
+    args = parser.parse_args()
+
+    if args.metrics:
+        enable_metrics(args.metrics)
+
+    if args.compact:
+        storage = open_storage(args.storage, args.data_dir, args.db)
+        before = storage.journal_size()
+        storage.compact()
+        print(f"변경 기록 {before}바이트를 합쳤습니다.")
+        sys.exit(0)
+
+    if args.reconcile:
+        try:
+            sales, errors = load_orders_parallel(args.reconcile, sales=True, workers=args.workers)
+        except OSError as error:
+            print(f"읽기 실패: {error}")
+            sys.exit(1)
+        print(f"주문 {sales.order_count}건, 상품 {len(sales.by_product)}종, 주문일 {len(sales.days)}일")
+        print(f"총매출(원): {sales.total_revenue}")
+        print(f"오류 {len(errors)}건")
+        print_line_errors(errors)
+        sys.exit(1 if errors else 0)
+
+    if args.convert:
+        try:
+            product_count, order_count = convert_data(args.data_dir, args.convert)
+        except (MallError, ValueError) as error:
+            print(f"변환 실패: {error}")
+            sys.exit(1)
+        print(f"상품 {product_count}건, 주문 {order_count}건을 {args.convert} 형식으로 변환했습니다.")
+        sys.exit(0)
+
+    shopping_mall = ShoppingMall(open_storage(args.storage, args.data_dir, args.db, args.lazy_orders),
+                                 durability=args.durability)
+    if args.compact_bytes > 0:
+        shopping_mall.start_compaction(max_journal_bytes=args.compact_bytes, max_age=args.compact_age)
+
+    try:
+        if args.import_products or args.import_orders:
+            if args.import_products:
+                added, errors = shopping_mall.import_products(read_records(args.import_products))
+                print(f"상품 {len(added)}건 등록, 오류 {len(errors)}건")
+            else:
+                placed, errors = shopping_mall.place_orders(read_records(args.import_orders))
+                print(f"주문 {len(placed)}건 완료, 오류 {len(errors)}건")
+            print_line_errors(errors)
+            sys.exit(1 if errors else 0)
 
-    shopping_mall.role_selection()  # 역할 선택
+        shopping_mall.role_selection()  # 역할 선택
+    finally:
+        shopping_mall.stop_compaction()
+        shopping_mall.storage.close()  # 모아둔 매출 집계 저장
@@ -0,0 +1,374 @@
+
+import argparse
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import platform
+import pstats
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench import copy_to_sqlite, customer, generate_dataset
+from kupang import (DURABILITY_LEVELS, METRICS, MallCore, ProductNameIndex, ShoppingMall, chosung_of,
+                    convert_data, enable_metrics, is_product_name_allowed, open_storage)
+
+
+# 데이터 폴더에서 복사할 파일 (text/binary 저장소, SQLite 파일은 --db 로 따로)
+DATA_FILES = ('products.txt', 'products.journal', 'orders.txt', 'orders.snapshot', 'sales.txt', 'sales_summary.json',
+              'users.txt', 'sequences.txt', 'products.bin', 'products.bin.journal', 'orders.bin')
+
+DATE_IN_PROMPT = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+SESSION_KINDS = ('customer_search', 'customer_order', 'admin_update', 'admin_reports')
+SESSION_WEIGHTS = (5, 2, 2, 1)  # 세션을 만들 때 종류별 비율
+
+
+# 입력 안내문을 한 줄로 (동작 이름으로 씀, 안내문에 들어간 날짜는 형식으로 바꿈)
+def prompt_label(prompt):
+    return DATE_IN_PROMPT.sub('YYYY-MM-DD', ' '.join(prompt.split())).rstrip(':').strip()
+
+
+# 지금까지 저장소 파일에 쓴 바이트 (측정을 켰을 때만 늘어남)
+def bytes_written():
+    return METRICS.total('kupang_bytes_written_total')
+
+
+# 스크립트로 화면을 실행하면서 동작마다 걸린 시간과 쓴 바이트를 (화면, 입력 안내문) 별로 기록
+# 동작 하나 = 입력을 받은 뒤 다음 입력을 요청할 때까지 (사용자가 Enter 를 누르고 기다리는 시간)
+# 표는 첫 페이지만 보여주고 넘어감 (스크립트가 데이터 크기와 상관없이 맞도록, 기록할 때도 같음)
+class ReplayMall(ShoppingMall):
+    def __init__(self, storage, durability=None, record=False):
+        super().__init__(storage, script=None if record else (), durability=durability)
+        self.recorded = [] if record else None  # record 이면 받은 입력 목록
+        self.action = None  # 진행 중인 동작 (화면, 안내문, 시작 시각, 시작할 때까지 쓴 바이트)
+        self.exhausted = False  # 스크립트가 화면보다 먼저 끝났는지
+
+    def input(self, prompt=''):
+        self.finish_action()
+        try:
+            answer = super().input(prompt)
+        except EOFError:
+            self.exhausted = True
+            raise
+        if self.recorded is not None:
+            self.recorded.append(answer)
+        written = bytes_written()
+        self.action = (self.screen, prompt_label(prompt), time.perf_counter(), written)
+        return answer
+
+    def finish_action(self):
+        if self.action is None:
+            return
+        screen, prompt, started, written = self.action
+        elapsed = time.perf_counter() - started
+        self.action = None
+        METRICS.observe('kupang_action_seconds', elapsed, screen=screen, prompt=prompt)
+        METRICS.count('kupang_action_bytes_written_total', bytes_written() - written, screen=screen, prompt=prompt)
+
+    # 세션 하나 실행, 스크립트가 화면과 맞았으면 True (남거나 모자라면 False)
+    def replay(self, script):
+        self.script = iter(script)
+        self.exhausted = False
+        self.run()
+        self.finish_action()
+        return not self.exhausted and next(self.script, None) is None
+
+
+# 고객: 상품명 일부나 초성으로 검색해서 찾은 상품을 주문
+def customer_search_session(rng, product_id, product_name, order_date):
+    word = rng.choice(product_name.split())
+    query = rng.choice([word, chosung_of(word), word[:-1] or word])
+    name, address = customer(rng)
+    return ['2', '1', '1', query, '1', product_id, '1', '2', name, address, order_date, '1', 'x', '2', '0']
+
+
+# 고객: 상품 목록에서 바로 주문
+def customer_order_session(rng, product_id, product_name, order_date):
+    name, address = customer(rng)
+    return ['2', '1', '2', product_id, str(rng.randint(1, 3)), '2', name, address, order_date, '1', 'x', '2', '0']
+
+
+# 관리자: 상품명으로 찾아서 가격과 수량 수정 (이름이 겹치면 상품번호도 입력)
+def admin_update_session(rng, product_id, product_name, matches):
+    script = ['1', '1234', '1', '2', product_name]
+    if len(matches) > 1:
+        script.append(product_id)
+    return script + ['2', str(rng.randrange(1000, 500000, 100)), '3', str(rng.randint(100, 1000)), '0', '0', '0', '0']
+
+
+# 관리자: 주문/매출 조회와 월별 매출 분석
+def admin_reports_session():
+    return ['1', '1234', '2', '', '3', '', '8', '', '9', '5', '', '', '0', '0']
+
+
+# 데이터에 맞는 세션 스크립트를 count 개 만듦 (주문할 상품은 재고가 넉넉한 것만)
+def generate_sessions(mall, count, kinds, rng):
+    stocked = [product_id for product_id, (name, price, quantity) in mall.products.items()
+               if quantity >= 100 and name.split() and is_product_name_allowed(name)]
+    if not stocked:
+        raise ValueError("재고가 100개 이상인 상품이 없어 세션을 만들 수 없습니다.")
+    today = datetime.date.today().isoformat()
+    order_date = max(mall.order_dates.latest or today, today)
+    weights = [SESSION_WEIGHTS[SESSION_KINDS.index(kind)] for kind in kinds]
+    index = None
+    sessions = []
+    for kind in rng.choices(kinds, weights, k=count):
+        product_id = rng.choice(stocked)
+        product_name = mall.products[product_id][0]
+        if kind == 'customer_search':
+            sessions.append(customer_search_session(rng, product_id, product_name, order_date))
+        elif kind == 'customer_order':
+            sessions.append(customer_order_session(rng, product_id, product_name, order_date))
+        elif kind == 'admin_update':
+            if index is None:
+                index = ProductNameIndex(cache_size=0)
+                index.rebuild(mall.products)
+            matches = index.search(product_name, strip_spaces=False)
+            sessions.append(admin_update_session(rng, product_id, product_name, matches))
+        else:
+            sessions.append(admin_reports_session())
+    return sessions
+
+
+# 기록한 세션 읽기 (한 줄에 입력 목록 JSON 하나)
+def read_sessions(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# source 의 데이터 파일만 target 으로 복사 (작업 프로세스마다 따로 쓰도록)
+def copy_data(source, target, db_name):
+    os.makedirs(target, exist_ok=True)
+    for name in (*DATA_FILES, db_name, db_name + '-wal'):
+        path = os.path.join(source, name)
+        if os.path.exists(path):
+            shutil.copy2(path, os.path.join(target, name))
+
+
+# 작업 프로세스 하나: 자기 데이터 폴더에서 세션들을 차례로 실행하고 측정값을 돌려줌
+def run_worker(worker, base_dir, work_dir, sessions, args, profile_path):
+    data_dir = os.path.join(work_dir, f'worker{worker}')
+    copy_data(base_dir, data_dir, args.db)
+    METRICS.reset()
+    enable_metrics()
+    profiler = cProfile.Profile() if profile_path else None
+    misaligned = 0
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        mall = ReplayMall(open_storage(args.storage, data_dir, args.db), args.durability)
+        startup = time.perf_counter() - started
+        started = time.perf_counter()
+        for script in sessions:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                aligned = mall.replay(script)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+            misaligned += not aligned
+        elapsed = time.perf_counter() - started
+        mall.storage.close()
+    if profiler is not None:
+        profiler.dump_stats(profile_path)
+    return {'worker': worker, 'sessions': len(sessions), 'misaligned_sessions': misaligned,
+            'startup_seconds': startup, 'session_seconds': elapsed, 'metrics': METRICS.to_dict()}
+
+
+# 작업 프로세스들의 측정값 합치기
+def merge_metrics(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for counter in snapshot['counters']:
+            key = (counter['name'], tuple(sorted(counter['labels'].items())))
+            counters[key] = counters.get(key, 0) + counter['value']
+        for histogram in snapshot['histograms']:
+            key = (histogram['name'], tuple(sorted(histogram['labels'].items())))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = {**histogram, 'buckets': dict(histogram['buckets'])}
+                continue
+            merged['count'] += histogram['count']
+            merged['sum'] += histogram['sum']
+            for le, count in histogram['buckets'].items():
+                merged['buckets'][le] += count
+    return counters, histograms
+
+
+# 누적 히스토그램에서 percent 번째 값이 들어 있는 버킷의 상한 (ms, 마지막 버킷이면 None)
+def bucket_percentile(buckets, count, percent):
+    for le, cumulative in buckets.items():
+        if cumulative >= count * percent / 100:
+            return None if le == '+Inf' else float(le) * 1000
+    return None
+
+
+def histogram_row(histogram):
+    count, buckets = histogram['count'], histogram['buckets']
+    return {
+        'count': count,
+        'mean_ms': histogram['sum'] / count * 1000 if count else None,
+        'p50_le_ms': bucket_percentile(buckets, count, 50),
+        'p95_le_ms': bucket_percentile(buckets, count, 95),
+        'p99_le_ms': bucket_percentile(buckets, count, 99),
+        'buckets': buckets,
+    }
+
+
+# 화면별, (화면, 입력 안내문) 별 지연 시간 히스토그램과 동작당 쓴 바이트
+def action_report(counters, histograms):
+    actions, screens = [], {}
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name != 'kupang_action_seconds':
+            continue
+        labels = dict(labels)
+        written = counters.get(('kupang_action_bytes_written_total', tuple(sorted(labels.items()))), 0)
+        row = {'screen': labels['screen'], 'prompt': labels['prompt'], **histogram_row(histogram),
+               'bytes_written': written, 'bytes_per_action': written / histogram['count']}
+        actions.append(row)
+        screen = screens.get(labels['screen'])
+        if screen is None:
+            screens[labels['screen']] = screen = {'count': 0, 'sum': 0.0, 'bytes_written': 0,
+                                                  'buckets': dict.fromkeys(histogram['buckets'], 0)}
+        screen['count'] += histogram['count']
+        screen['sum'] += histogram['sum']
+        screen['bytes_written'] += written
+        for le, count in histogram['buckets'].items():
+            screen['buckets'][le] += count
+    screen_rows = [{'screen': name, **histogram_row(screen), 'bytes_written': screen['bytes_written'],
+                    'bytes_per_action': screen['bytes_written'] / screen['count']}
+                   for name, screen in screens.items()]
+    return screen_rows, actions
+
+
+# kupang_operation_seconds (@timed 로 잰 내부 작업)
+def operation_report(histograms):
+    return [{'operation': dict(labels)['operation'], **histogram_row(histogram)}
+            for (name, labels), histogram in sorted(histograms.items()) if name == 'kupang_operation_seconds']
+
+
+# 프로필 파일들을 합쳐서 자체 실행 시간이 긴 함수 top 개
+def profile_hotspots(paths, top, output=None):
+    stats = pstats.Stats(*paths)
+    if output:
+        stats.dump_stats(output)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    return [{'function': f"{os.path.basename(filename)}:{line}({function})", 'calls': calls,
+             'tottime': tottime, 'cumtime': cumtime}
+            for (filename, line, function), (primitive, calls, tottime, cumtime, callers) in rows]
+
+
+def replay(args):
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        base_dir = os.path.join(work_dir, 'base')
+        if args.data_dir:
+            copy_data(args.data_dir, base_dir, args.db)
+        else:
+            os.makedirs(base_dir)
+            generate_dataset(base_dir, args.products, int(args.products * args.orders_per_product), args.seed)
+            if args.storage == 'sqlite':
+                copy_to_sqlite(base_dir, os.path.join(base_dir, args.db))
+            elif args.storage == 'binary':
+                convert_data(base_dir, 'binary')
+
+        if args.script:
+            sessions = read_sessions(args.script) * args.repeat
+        else:
+            with contextlib.redirect_stdout(sys.stderr):
+                mall = MallCore(open_storage(args.storage, base_dir, args.db))
+            sessions = generate_sessions(mall, args.sessions, args.kinds, random.Random(args.seed))
+            mall.storage.close()
+
+        workers = max(1, min(args.workers or os.cpu_count() or 1, len(sessions)))
+        profile_paths = [os.path.join(work_dir, f'worker{worker}.prof') if args.profile else None
+                         for worker in range(workers)]
+        print(f"세션 {len(sessions)}개를 프로세스 {workers}개로 실행 중", file=sys.stderr)
+        started = time.perf_counter()
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(run_worker, range(workers), [base_dir] * workers, [work_dir] * workers,
+                                    [sessions[worker::workers] for worker in range(workers)], [args] * workers,
+                                    profile_paths))
+        elapsed = time.perf_counter() - started
+
+        counters, histograms = merge_metrics(result.pop('metrics') for result in results)
+        screens, actions = action_report(counters, histograms)
+        report = {
+            'sessions': len(sessions),
+            'workers': workers,
+            'seconds': elapsed,
+            'sessions_per_sec': len(sessions) / elapsed,
+            'misaligned_sessions': sum(result['misaligned_sessions'] for result in results),
+            'worker_results': results,
+            'screens': screens,
+            'actions': actions,
+            'operations': operation_report(histograms),
+            'bytes_written_by_file': {dict(labels)['file']: value for (name, labels), value in sorted(counters.items())
+                                      if name == 'kupang_bytes_written_total'},
+        }
+        if args.profile:
+            report['hotspots'] = profile_hotspots(profile_paths, args.top, args.profile_output)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="콘솔 화면 재현 (입력 스크립트를 여러 프로세스에서 실행하고 화면별 지연 시간, "
+                                                 "쓴 바이트, 프로필을 측정)")
+    parser.add_argument('--data-dir', help="복사해서 쓸 데이터 폴더 (없으면 가짜 데이터 생성)")
+    parser.add_argument('--storage', choices=['text', 'binary', 'sqlite'], default='text', help="저장소 종류")
+    parser.add_argument('--db', default='kupang.db', help="SQLite 데이터베이스 파일명")
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS, help="저장 후 디스크 기록 수준")
+    parser.add_argument('--products', type=int, default=1000, help="가짜 데이터의 상품 수")
+    parser.add_argument('--orders-per-product', type=float, default=1.0, help="가짜 데이터의 상품 하나당 주문 수")
+    parser.add_argument('--script', help="기록한 세션 파일 (한 줄에 입력 목록 JSON 하나), 없으면 세션을 만들어서 실행")
+    parser.add_argument('--repeat', type=int, default=1, help="기록한 세션을 몇 번 반복할지")
+    parser.add_argument('--sessions', type=int, default=200, help="만들 세션 수")
+    parser.add_argument('--kinds', nargs='+', choices=SESSION_KINDS, default=list(SESSION_KINDS), help="만들 세션 종류")
+    parser.add_argument('--workers', type=int, help="프로세스 수 (기본: CPU 수), 프로세스마다 데이터 폴더를 따로 씀")
+    parser.add_argument('--no-profile', dest='profile', action='store_false',
+                        help="cProfile 끄기 (켜면 지연 시간에 프로필 비용이 더해짐)")
+    parser.add_argument('--top', type=int, default=20, help="보여줄 프로필 함수 수")
+    parser.add_argument('--profile-output', help="합친 프로필 저장 파일 (pstats 형식)")
+    parser.add_argument('--record', metavar='FILE',
+                        help="--data-dir 에서 쇼핑몰을 직접 사용하면서 입력을 기록하고 FILE 끝에 세션으로 추가한 뒤 종료")
+    parser.add_argument('--seed', type=int, default=1, help="데이터/세션 생성용 난수 시드")
+    parser.add_argument('--work-dir', help="작업 데이터를 만들 임시 폴더 위치")
+    parser.add_argument('--output', help="결과 JSON 파일 (없으면 화면에 출력)")
+    args = parser.parse_args()
+
+    if args.record:
+        mall = ReplayMall(open_storage(args.storage, args.data_dir or '.', args.db), args.durability, record=True)
+        with contextlib.suppress(KeyboardInterrupt):
+            mall.run()
+        with open(args.record, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(mall.recorded, ensure_ascii=False) + '\n')
+        print(f"입력 {len(mall.recorded)}개를 {args.record} 에 기록했습니다.", file=sys.stderr)
+        sys.exit(0)
+
+    try:
+        report = replay(args)
+    except (OSError, ValueError) as error:
+        print(f"실행 실패: {error}", file=sys.stderr)
+        sys.exit(1)
+    report = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'storage': args.storage,
+        'durability': args.durability,
+        'seed': args.seed,
+        **report,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
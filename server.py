@@ -0,0 +1,359 @@
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from kupang import (DURABILITY_LEVELS, METRICS, MallCore, MallError, UnitOfWork, enable_metrics, normalize_product_id,
+                    open_storage, remove_space)
+
+
+# 쇼핑몰 서비스 (MallCore 를 asyncio 에서 여러 클라이언트가 함께 쓰도록 감쌈)
+# - 상품/주문을 바꾸는 요청은 바로 처리하지 않고 모아두었다가, 저장 전용 스레드에서 한 번에 처리
+# - 저장 스레드는 저장소 잠금 안에서 다른 프로세스의 변경 사항을 먼저 반영한 뒤 재고를 확인하고 차감함
+# - 바꾸는 요청은 자기 변경이 저장된 뒤에 응답을 받음
+class MallService:
+    def __init__(self, core, flush_delay=0.005):
+        self.core = core
+        self.flush_delay = flush_delay  # 저장 전에 요청을 더 모으기 위해 기다리는 시간(초)
+        self.requests = []  # 다음 저장 때 처리할 (함수, Future) 목록
+        # 저장 스레드가 상품/주문/매출을 바꾸는 동안 조회 요청이 기다리도록 하는 잠금
+        self.core_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)  # 바꾸고 저장하는 일은 항상 이 스레드 하나에서만
+        # 조회는 이 스레드에서 core_lock 을 잡고 처리 (잠금을 기다리는 동안 이벤트 루프가 멈추지 않도록)
+        self.read_executor = ThreadPoolExecutor(max_workers=1)
+        self.wakeup = None
+        self.flusher = None
+
+    async def start(self):
+        self.wakeup = asyncio.Event()
+        self.flusher = asyncio.create_task(self.flush_loop())
+
+    async def stop(self):
+        self.flusher.cancel()
+        try:
+            await self.flusher
+        except asyncio.CancelledError:
+            pass
+        await self.flush()  # 남은 요청 처리
+        self.executor.shutdown()
+        self.read_executor.shutdown()
+
+    # 바꾸는 요청을 대기열에 넣고, 처리하고 저장한 뒤 apply 의 결과로 완료되는 Future 를 돌려줌
+    # apply 는 저장 스레드에서 저장소 잠금 안에 불리므로 MallCore 메서드를 commit=True 로 불러도 됨
+    def submit(self, apply):
+        future = asyncio.get_running_loop().create_future()
+        self.requests.append((apply, future))
+        self.wakeup.set()
+        return future
+
+    async def flush_loop(self):
+        while True:
+            await self.wakeup.wait()
+            await asyncio.sleep(self.flush_delay)
+            await self.flush()
+
+    async def flush(self):
+        self.wakeup.clear()
+        if not self.requests:
+            return
+        requests, self.requests = self.requests, []
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.apply_requests,
+                                                 [apply for apply, future in requests])
+        except Exception as error:
+            results = [(None, error)] * len(requests)
+        for (apply, future), (result, error) in zip(requests, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    # 저장 스레드: 다른 프로세스의 변경 사항을 반영하고 요청을 차례로 처리한 뒤 한 번에 저장
+    # 반환: 요청마다 (결과, 예외)
+    def apply_requests(self, requests):
+        core = self.core
+        results = []
+        with core.storage.locked():
+            with self.core_lock:
+                core.refresh()
+                work = core.work = UnitOfWork()  # 요청 안의 transaction 은 모두 여기에 모임
+                try:
+                    for apply in requests:
+                        try:
+                            results.append((apply(), None))
+                        except Exception as error:
+                            results.append((None, error))
+                finally:
+                    core.work = None
+            try:
+                ticket = core.commit_work(work)
+            except BaseException:
+                # 저장하지 못한 변경 사항을 버려서 메모리와 저장소가 어긋나지 않게 함 (요청은 모두 실패)
+                with self.core_lock:
+                    core.rollback()
+                raise
+        if ticket:
+            core.group_commit.wait(ticket)
+        return results
+
+    # 조회 스레드: 저장 스레드가 바꾸는 중이 아닐 때 조회 요청 하나를 처리
+    def read(self, method, args, kwargs):
+        with self.core_lock:
+            return method(*args, **kwargs)
+
+    # --- 요청 처리 (params 이름 = 메서드 인자 이름) ---
+    # 바꾸는 요청은 저장된 뒤에 끝나는 코루틴, 조회 요청은 조회 스레드에서 부르는 보통 함수
+
+    def list_products(self, offset=0, limit=50):
+        items = itertools.islice(self.core.products.items(), offset, offset + limit)
+        return {'total': len(self.core.products), 'products': [product_dict(*item) for item in items]}
+
+    def search_products(self, query):
+        query, signal = remove_space(query)
+        if signal == "empty":
+            raise MallError("검색어가 비어 있습니다.")
+        if signal == "special":
+            raise MallError("특수문자를 입력할 수 없습니다.")
+        return [product_dict(*item) for item in self.core.find_products(query, jamo=True).items()]
+
+    def get_product(self, product_id):
+        product_id = normalize_product_id(product_id)
+        if product_id not in self.core.products:
+            raise MallError("유효하지 않은 상품번호 입니다.")
+        return product_dict(product_id, self.core.products[product_id])
+
+    async def add_product(self, name, price, quantity):
+        price, quantity = int(price), int(quantity)
+
+        def apply():
+            product_id = self.core.create_product(name, price, quantity)
+            return product_dict(product_id, self.core.products[product_id])
+        return await self.submit(apply)
+
+    async def update_product(self, product_id, name=None, price=None, quantity=None):
+        product_id = normalize_product_id(product_id)
+        price = None if price is None else int(price)
+        quantity = None if quantity is None else int(quantity)
+
+        def apply():
+            return product_dict(product_id, self.core.modify_product(product_id, name, price, quantity))
+        return await self.submit(apply)
+
+    async def remove_product(self, product_id):
+        product_id = normalize_product_id(product_id)
+
+        def apply():
+            self.core.discontinue_product(product_id)
+            return {'product_id': product_id}
+        return await self.submit(apply)
+
+    async def place_order(self, product_id, quantity, customer_name, customer_address, order_date):
+        product_id = normalize_product_id(product_id)
+        quantity = int(quantity)
+
+        def apply():
+            # 재고 확인과 차감은 저장소 잠금 안에서 다른 프로세스의 주문까지 반영한 뒤에 함
+            return order_dict(self.core.place_order(product_id, quantity, customer_name, customer_address,
+                                                    order_date))
+        return await self.submit(apply)  # 저장된 뒤에 응답
+
+    # items: [{'product_id': ..., 'quantity': ...}], 주문번호 하나로 모두 주문하거나 하나도 주문하지 않음
+    async def checkout(self, items, customer_name, customer_address, order_date):
+        items = [(normalize_product_id(item['product_id']), int(item['quantity'])) for item in items]
+
+        def apply():
+            orders = self.core.checkout(items, customer_name, customer_address, order_date)
+            return {'order_id': orders[0].order_id, 'items': [order_dict(order) for order in orders]}
+        return await self.submit(apply)
+
+    def sales_report(self):
+        sales = self.core.sales
+        return {
+            'order_count': sales.order_count,
+            'total_revenue': sales.total_revenue,
+            'products': [{'product_id': product_id, 'name': name, 'units': units, 'revenue': revenue}
+                         for product_id, (name, units, revenue) in sales.by_product.items()],
+        }
+
+    def sales_between(self, start, end):
+        return [{'order_date': day, 'units': units, 'revenue': revenue}
+                for day, units, revenue in self.core.sales.sales_between(start, end)]
+
+    def orders_between(self, start, end, offset=0, limit=100):
+        positions = self.core.order_dates.positions_between(start, end)
+        return {'total': len(positions),
+                'orders': [order_dict(self.core.orders[position]) for position in positions[offset:offset + limit]]}
+
+    def customer_orders(self, customer_name, customer_address=None):
+        return [{'customer_name': name, 'customer_address': address, 'order_count': self.core.count_orders(orders),
+                 'spend': spend, 'orders': [order_dict(order) for order in orders]}
+                for name, address, orders, spend in self.core.customer_orders(customer_name, customer_address)]
+
+    def top_customers(self, limit=10):
+        return [{'customer_name': name, 'customer_address': address, 'order_count': count, 'spend': spend}
+                for name, address, count, spend in self.core.top_customers(int(limit))]
+
+    # --- 매출 분석 (start/end 가 없으면 전체 기간) ---
+
+    def top_products(self, limit=10, by='revenue', start=None, end=None):
+        return [{'product_id': product_id, 'name': name, 'units': units, 'revenue': revenue}
+                for product_id, name, units, revenue in self.core.analytics(start, end).top_products(int(limit), by)]
+
+    def revenue_by_period(self, period='day', start=None, end=None):
+        return [{'period': label, 'lines': lines, 'units': units, 'revenue': revenue}
+                for label, lines, units, revenue in self.core.analytics(start, end).revenue_by_period(period)]
+
+    def basket_stats(self, start=None, end=None):
+        return self.core.analytics(start, end).basket_stats()
+
+    def product_sales(self, product_id):
+        product_id = normalize_product_id(product_id)
+        units, revenue = self.core.sales.product_sales(product_id)
+        return {'product_id': product_id, 'units': units, 'revenue': revenue}
+
+    # 성능 측정값 (측정이 꺼져 있으면 빈 목록)
+    def metrics(self):
+        return METRICS.to_dict()
+
+    # 상품/주문을 바꾸는 요청 (나머지는 조회 요청)
+    UPDATE_METHODS = ('add_product', 'update_product', 'remove_product', 'place_order', 'checkout')
+
+    METHODS = ('list_products', 'search_products', 'get_product', 'add_product', 'update_product',
+               'remove_product', 'place_order', 'checkout', 'sales_report', 'sales_between', 'orders_between',
+               'customer_orders', 'top_customers', 'top_products', 'revenue_by_period', 'basket_stats',
+               'product_sales', 'metrics')
+
+    # JSON-RPC 요청 하나 처리
+    async def handle(self, request):
+        request_id = request.get('id') if isinstance(request, dict) else None
+        if not isinstance(request, dict) or request.get('method') not in self.METHODS:
+            return rpc_error(request_id, -32601, "없는 메서드입니다.")
+        params = request.get('params') or {}
+        method = getattr(self, request['method'])
+        args, kwargs = (params, {}) if isinstance(params, list) else ((), params)
+        try:
+            if request['method'] in self.UPDATE_METHODS:
+                result = await method(*args, **kwargs)
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(self.read_executor, self.read, method,
+                                                                          args, kwargs)
+        except MallError as error:
+            return rpc_error(request_id, -32000, str(error))
+        except (KeyError, TypeError, ValueError) as error:
+            return rpc_error(request_id, -32602, f"잘못된 인자입니다: {error}")
+        except Exception as error:
+            # 저장 실패 등 예상하지 못한 오류도 연결을 끊지 않고 응답함
+            print(f"요청 처리 실패 ({request['method']}): {error!r}", file=sys.stderr)
+            return rpc_error(request_id, -32603, "서버 내부 오류입니다.")
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+    # 연결 하나: 한 줄에 JSON-RPC 요청 하나, 응답도 한 줄
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = rpc_error(None, -32700, "JSON 형식이 아닙니다.")
+                else:
+                    response = await self.handle(request)
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def product_dict(product_id, product):
+    name, price, quantity = product
+    return {'product_id': product_id, 'name': name, 'price': price, 'quantity': quantity}
+
+
+def order_dict(order):
+    return {name: getattr(order, name) for name in order.__slots__}
+
+
+def rpc_error(request_id, code, message):
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+
+# 간단한 클라이언트 (한 연결로 요청을 차례로 보냄)
+class MallClient:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=8765):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def call(self, method, **params):
+        self.next_id += 1
+        request = {'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': params}
+        self.writer.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        await self.writer.drain()
+        response = json.loads(await self.reader.readline())
+        if 'error' in response:
+            raise MallError(response['error']['message'])
+        return response['result']
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def serve(core, host, port):
+    service = MallService(core)
+    await service.start()
+    server = await asyncio.start_server(service.serve_client, host, port)
+    print(f"쇼핑몰 서버 시작: {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="쇼핑몰 JSON-RPC 서버")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--storage', choices=['text', 'binary', 'sqlite'], default='text', help="저장소 종류")
+    parser.add_argument('--data-dir', default='.', help="데이터 파일 위치")
+    parser.add_argument('--db', default='kupang.db', help="SQLite 데이터베이스 파일명")
+    parser.add_argument('--metrics', metavar='FILE', default=os.environ.get('KUPANG_METRICS'),
+                        help="성능 측정을 켜고 종료 시(또는 SIGUSR1) 이 파일에 저장")
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS,
+                        help="저장 후 디스크 기록 수준 (저장은 모아서 하므로 batch 와 commit 은 저장마다 fsync)")
+    parser.add_argument('--compact-bytes', type=int, default=4 * 1024 * 1024,
+                        help="합치지 않은 변경 기록이 이 크기(바이트)를 넘으면 뒤에서 합침 (0 이면 끔)")
+    parser.add_argument('--compact-age', type=float, default=3600, help="마지막으로 합친 뒤 이 시간(초)이 지나면 합침")
+    args = parser.parse_args()
+
+    if args.metrics:
+        enable_metrics(args.metrics)
+
+    core = MallCore(open_storage(args.storage, args.data_dir, args.db), durability=args.durability)
+    if args.compact_bytes > 0:
+        core.start_compaction(max_journal_bytes=args.compact_bytes, max_age=args.compact_age)
+    try:
+        asyncio.run(serve(core, args.host, args.port))
+    except KeyboardInterrupt:
+        print("서버를 종료합니다.")
+    finally:
+        core.stop_compaction()
+        core.storage.close()  # 모아둔 매출 집계 저장
@@ -0,0 +1,1003 @@
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import unittest
+from array import array
+from unittest import mock
+
+from kupang import (METRICS, BinaryStorage, Compactor, LazyOrderFile, MallCore, MallError, MetricsDumper, Order,
+                    OrderDateIndex, OrderStore, SalesAnalytics, SalesRollup, ShoppingMall, TextFileStorage,
+                    chosung_of, convert_data, load_orders_parallel, normalize_product_id, open_storage, read_records,
+                    split_jamo, split_line_ranges)
+from server import MallService
+
+
+class TornTailTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.product_id = core.create_product('사과', 1000, 50)
+        core.place_order(self.product_id, 1, '김민준', '서울시 강남구 1', '2024-01-01')
+        core.storage.close()
+
+    def path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def append_raw(self, name, data):
+        with open(self.path(name), 'ab') as f:
+            f.write(data)
+
+    # 쓰다가 잘린 주문 줄 뒤에 새 주문을 추가해도 다시 읽을 때 두 주문이 모두 남음
+    def test_torn_order_line_is_truncated_before_append(self):
+        self.append_raw('orders.txt', '주문9,PROD1000,사'.encode('utf-8'))
+        core = MallCore(TextFileStorage(self.data_dir))
+        core.place_order(self.product_id, 2, '이서연', '부산시 해운대구 2', '2024-01-02')
+        core.storage.close()
+
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.assertEqual([order.quantity for order in core.orders], [1, 2])
+        self.assertEqual(core.sales.order_count, 2)
+        self.assertEqual(core.products[self.product_id][2], 47)
+        with open(self.path('orders.txt'), 'rb') as f:
+            self.assertNotIn('주문9'.encode('utf-8'), f.read())
+
+    # 쓰다가 잘린 상품 변경 기록은 다음 기록을 추가할 때 버려지고 다시 적용되지 않음
+    def test_torn_journal_line_is_not_replayed(self):
+        self.append_raw('products.journal', f"SET,{self.product_id},사과,1000,4".encode('utf-8'))
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.assertEqual(core.products[self.product_id][2], 49)
+        other = core.create_product('배', 2000, 10)
+        core.storage.close()
+
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.assertEqual(core.products[self.product_id], ('사과', 1000, 49))
+        self.assertEqual(core.products[other], ('배', 2000, 10))
+
+    # 주문 파일을 필요할 때만 읽어도 잘린 마지막 줄은 건너뜀
+    def test_lazy_orders_skip_torn_line(self):
+        for fragment in ('ORD9,PROD1000,사과,1000,1x', 'ORD9,PROD1000'):
+            with self.subTest(fragment=fragment):
+                self.append_raw('orders.txt', fragment.encode('utf-8'))
+                core = MallCore(TextFileStorage(self.data_dir, lazy_orders=True))
+                self.assertTrue(core.orders)
+                self.assertEqual(len(core.orders), 1)
+                self.assertEqual(core.order_dates.latest, '2024-01-01')
+                self.assertEqual(len(core.customer_orders('김민준')), 1)
+                core.storage.close()
+                with open(self.path('orders.txt'), 'rb+') as f:
+                    f.truncate(f.read().rfind(b'\n') + 1)
+
+
+class AtomicCommitTest(unittest.TestCase):
+    # 저장 한 번 안에서 차례로 부르는 저장소 메서드 (write_journal 은 텍스트/이진 저장소의 확정 단계)
+    STEPS = {
+        'text': ('append_orders', 'save_product_changes', 'save_sales_records', 'save_sales_rollup', 'save_user',
+                 'write_journal'),
+        'binary': ('append_orders', 'save_product_changes', 'save_sales_records', 'write_journal'),
+        'sqlite': ('append_orders', 'save_product_changes', 'save_sales_records', 'save_sales_rollup'),
+    }
+
+    def open_core(self, kind, data_dir):
+        core = MallCore(open_storage(kind, data_dir))
+        self.addCleanup(core.storage.close)
+        return core
+
+    # 재고 + 주문 수량 = 처음 재고, 매출 집계 = 주문 목록으로 다시 집계한 것
+    def assert_consistent(self, core, products, order_count):
+        self.assertEqual(len(core.orders), order_count)
+        for product_id in products:
+            sold = sum(order.quantity for order in core.orders if order.product_id == product_id)
+            self.assertEqual(core.products[product_id][2] + sold, 10)
+        expected = SalesRollup.from_orders(core.orders)
+        self.assertEqual((core.sales.order_count, core.sales.total_revenue, core.sales.by_product),
+                         (expected.order_count, expected.total_revenue, expected.by_product))
+
+    # 저장 도중 어느 단계에서 실패해도 장바구니 전체가 저장되지 않고, 다시 열어도 재고와 주문이 맞음
+    def test_failed_step_commits_nothing(self):
+        for kind, steps in self.STEPS.items():
+            for step in steps:
+                with self.subTest(kind=kind, step=step):
+                    data_dir = tempfile.mkdtemp()
+                    self.addCleanup(shutil.rmtree, data_dir)
+                    core = self.open_core(kind, data_dir)
+                    products = [core.create_product('사과', 1000, 10), core.create_product('배', 2000, 10)]
+                    core.place_order(products[0], 1, '김민준', '서울시 강남구 1', '2024-01-01')
+                    with mock.patch.object(core.storage, step, side_effect=OSError("쓰기 실패")), \
+                            self.assertRaises(OSError):
+                        core.checkout([(products[0], 2), (products[1], 3)], '이서연', '부산시 해운대구 2',
+                                      '2024-01-02')
+                    self.assert_consistent(core, products, 1)
+
+                    reopened = self.open_core(kind, data_dir)
+                    self.assert_consistent(reopened, products, 1)
+                    reopened.checkout([(products[0], 2), (products[1], 3)], '이서연', '부산시 해운대구 2', '2024-01-02')
+                    self.assert_consistent(reopened, products, 3)
+                    self.assert_consistent(self.open_core(kind, data_dir), products, 3)
+
+
+class SQLiteStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def open_core(self):
+        core = MallCore(open_storage('sqlite', self.data_dir))
+        self.addCleanup(core.storage.close)
+        return core
+
+    # 등록/수정/단종/주문이 다른 연결과 다시 연 저장소에 그대로 보임
+    def test_round_trip_and_other_connection(self):
+        core = self.open_core()
+        other = self.open_core()
+        apple = core.create_product('사과', 1000, 10)
+        pear = core.create_product('배', 2000, 5)
+        core.modify_product(apple, product_price=1100)
+        orders = core.checkout([(apple, 2), (pear, 1)], '김민준', '서울시 강남구 1', '2024-01-01')
+        core.discontinue_product(pear)
+
+        with other.storage.locked():
+            other.refresh()
+        self.assertEqual(other.products, {apple: ('사과', 1100, 8)})
+        self.assertEqual(len(other.orders), 2)
+
+        reopened = self.open_core()
+        self.assertEqual(reopened.products, {apple: ('사과', 1100, 8)})
+        self.assertEqual([(order.order_id, order.product_id, order.quantity) for order in reopened.orders],
+                         [(orders[0].order_id, apple, 2), (orders[0].order_id, pear, 1)])
+        self.assertEqual((reopened.sales.order_count, reopened.sales.total_revenue), (2, 4200))
+        self.assertEqual(reopened.storage.get_product(apple), ('사과', 1100, 8))
+        self.assertIsNone(reopened.storage.get_product(pear))
+        self.assertEqual(reopened.storage.get_order(orders[0].order_id).product_id, apple)
+
+    # 다른 연결이 주문 전체를 다시 쓰면 새 주문만 읽지 않고 전체를 다시 읽음
+    def test_rewritten_orders_are_reloaded(self):
+        core = self.open_core()
+        other = self.open_core()
+        product_id = core.create_product('사과', 1000, 10)
+        core.place_order(product_id, 1, '김민준', '서울시 강남구 1', '2024-01-01')
+        with other.storage.locked():
+            other.refresh()
+        core.save_orders()
+        self.assertIsNone(other.storage.read_new_orders())
+
+
+class IdAllocatorTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def open_core(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(core.storage.close)
+        return core
+
+    # 예약 기록이 없는 이전 데이터는 가장 큰 번호 다음부터, 9999 를 넘어도 자릿수를 늘려 겹치지 않게 발급
+    def test_allocation_past_9999_is_unique(self):
+        with open(os.path.join(self.data_dir, 'products.txt'), 'w', encoding='utf-8') as f:
+            f.write("PROD9998,사과,1000,10\nPROD9999,배,2000,10\n")
+        core = self.open_core()
+        other = self.open_core()
+        first = [core.create_product(f'상품{number}', 1000, 1) for number in range(3)]
+        second = [other.create_product(f'다른상품{number}', 1000, 1) for number in range(3)]
+        self.assertEqual(first, ['PROD10000', 'PROD10001', 'PROD10002'])
+        self.assertEqual(len(set(first) | set(second) | {'PROD9998', 'PROD9999'}), 8)
+
+        reopened = self.open_core()
+        third = reopened.create_product('새상품', 1000, 1)
+        self.assertNotIn(third, first + second)
+        self.assertEqual(len(reopened.products), 9)
+
+    # 숫자만 입력한 상품번호는 네 자리 이상일 때만 PROD 를 붙임
+    def test_normalize_product_id(self):
+        self.assertEqual(normalize_product_id('1234'), 'PROD1234')
+        self.assertEqual(normalize_product_id('10000'), 'PROD10000')
+        self.assertEqual(normalize_product_id('PROD1000'), 'PROD1000')
+        self.assertEqual(normalize_product_id('123'), '123')
+        self.assertEqual(normalize_product_id('0'), '0')
+
+
+class OrderStoreTest(unittest.TestCase):
+    ORDERS = [
+        Order('ORD1000', 'PROD1000', '사과', 1000, 1, '김민준', '서울시 강남구 1', '2024-01-01'),
+        Order('ORD1000', 'PROD1001', '배', 2000, 2, '김민준', '서울시 강남구 1', '2024-01-01'),
+        Order('ORD007', 'PROD1000', '사과', 1000, 3, '이서연', '부산시 해운대구 2', '2024-01-02'),
+        Order('주문-1', 'PROD1001', '배', 2000, 4, '이서연', '부산시 해운대구 2', '2024-01-03'),
+    ]
+
+    def lines(self, orders):
+        return [order.to_file_string() for order in orders]
+
+    # 열로 나눠 담아도 위치, 음수 위치, 조각, 반복으로 읽은 주문이 넣은 것과 같음 (ORD+숫자가 아닌 주문번호 포함)
+    def test_accessors_match_appended_orders(self):
+        store = OrderStore(self.ORDERS)
+        expected = self.lines(self.ORDERS)
+        self.assertEqual(len(store), 4)
+        self.assertEqual(self.lines(store), expected)
+        self.assertEqual([store[index].to_file_string() for index in range(4)], expected)
+        self.assertEqual(store[-1].to_file_string(), expected[-1])
+        self.assertEqual(store[-2].order_id, 'ORD007')
+        self.assertEqual(self.lines(store[1:3]), expected[1:3])
+        self.assertEqual([store.order_id_at(index) for index in range(4)], [order.order_id for order in self.ORDERS])
+
+    # to_columns 로 내보낸 열을 extend_columns 로 다른 목록 뒤에 붙여도 같은 주문
+    def test_columns_round_trip(self):
+        store = OrderStore(self.ORDERS[:1])
+        store.extend_columns(*OrderStore(self.ORDERS[1:]).to_columns())
+        self.assertEqual(self.lines(store), self.lines(self.ORDERS))
+        store.clear()
+        self.assertEqual(len(store), 0)
+
+
+class LazyOrderFileTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.orders_path = os.path.join(self.data_dir, 'orders.txt')
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.product_id = core.create_product('사과', 1000, 50)
+        for day in range(1, 6):
+            core.place_order(self.product_id, day, '김민준', '서울시 강남구 1', f'2024-01-0{day}')
+        core.storage.close()
+        with open(self.orders_path, encoding='utf-8') as f:
+            self.lines = f.readlines()
+        self.first_two_bytes = len((self.lines[0] + self.lines[1]).encode('utf-8'))
+
+    def open_lazy(self, limit=None):
+        lazy = LazyOrderFile(self.orders_path, limit)
+        self.addCleanup(lazy.close)
+        return lazy
+
+    # 파일에서 필요할 때만 읽어도 위치, 음수 위치, 조각, 반복이 파일 내용과 같고, 추가한 주문은 뒤에 붙음
+    def test_accessors_match_file(self):
+        lazy = self.open_lazy()
+        self.assertTrue(lazy)
+        self.assertEqual(lazy[-1].to_file_string(), self.lines[-1])  # 색인 없이 마지막 줄만 읽음
+        self.assertIsNone(lazy.offsets)
+        self.assertEqual(len(lazy), 5)
+        self.assertEqual([order.to_file_string() for order in lazy], self.lines)
+        self.assertEqual(lazy[2].to_file_string(), self.lines[2])
+        self.assertEqual([order.to_file_string() for order in lazy[3:]], self.lines[3:])
+
+        extra = Order('ORD9999', self.product_id, '사과', 1000, 9, '이서연', '부산시 해운대구 2', '2024-02-01')
+        lazy.append(extra)
+        self.assertEqual(len(lazy), 6)
+        self.assertEqual(lazy[-1].order_id, 'ORD9999')
+        self.assertEqual(lazy[5].quantity, 9)
+
+    # 저장한 줄 색인은 다음에 다시 쓰고 그 뒤에 추가된 줄만 훑음, 커밋된 길이 뒤와 빈 줄은 주문이 아님
+    def test_index_reuse_and_limit(self):
+        self.assertEqual(len(self.open_lazy()), 5)
+        self.assertTrue(os.path.exists(self.orders_path + '.idx'))
+        with open(self.orders_path, 'a', encoding='utf-8') as f:
+            f.write('\n' + self.lines[0])
+        lazy = self.open_lazy()
+        self.assertEqual(len(lazy), 6)
+        self.assertEqual(lazy[5].to_file_string(), self.lines[0])
+        self.assertEqual(len(self.open_lazy(limit=self.first_two_bytes)), 2)
+
+    # lazy_orders 저장소로 연 쇼핑몰도 주문 목록과 매출이 같음
+    def test_lazy_storage_matches_full_load(self):
+        lazy_core = MallCore(TextFileStorage(self.data_dir, lazy_orders=True))
+        self.addCleanup(lazy_core.storage.close)
+        self.assertIsInstance(lazy_core.orders, LazyOrderFile)
+        lazy_core.place_order(self.product_id, 1, '이서연', '부산시 해운대구 2', '2024-01-06')
+
+        full_core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(full_core.storage.close)
+        self.assertEqual([order.to_file_string() for order in lazy_core.orders],
+                         [order.to_file_string() for order in full_core.orders])
+        self.assertEqual(lazy_core.sales.total_revenue, full_core.sales.total_revenue)
+
+
+class OrderDateIndexTest(unittest.TestCase):
+    ORDERS = [
+        Order('ORD1000', 'PROD1000', '사과', 1000, 1, '김민준', '서울시 강남구 1', '2024-01-03'),
+        Order('ORD1001', 'PROD1000', '사과', 1000, 2, '이서연', '부산시 해운대구 2', '2024-01-01'),
+        Order('ORD1002', 'PROD1000', '사과', 1000, 3, '김민준', '서울시 강남구 1', '2024-01-02'),
+        Order('ORD1003', 'PROD1000', '사과', 1000, 4, '박지호', '대구시 중구 3', '2024-01-05'),
+    ]
+
+    def ids(self, orders, positions):
+        return [orders[position].order_id for position in positions]
+
+    # 주문일 순서가 뒤섞인 옛 주문도 기간(양끝 포함)으로 찾고, 나중에 색인하는 목록도 결과가 같음
+    def test_positions_between(self):
+        for orders in (OrderStore(self.ORDERS), list(self.ORDERS)):
+            with self.subTest(kind=type(orders).__name__):
+                index = OrderDateIndex()
+                index.rebuild(orders)
+                self.assertEqual(index.latest, '2024-01-05')
+                self.assertEqual(self.ids(orders, index.positions_between('2024-01-01', '2024-01-03')),
+                                 ['ORD1001', 'ORD1002', 'ORD1000'])
+                self.assertEqual(self.ids(orders, index.positions_between('2024-01-04', '2024-01-04')), [])
+                orders.append(Order('ORD1004', 'PROD1000', '사과', 1000, 5, '김민준', '서울시 강남구 1', '2024-01-02'))
+                index.add('2024-01-02', 4)
+                self.assertEqual(self.ids(orders, index.positions_between('2024-01-02', '2024-01-02')),
+                                 ['ORD1002', 'ORD1004'])
+                self.assertEqual(index.latest, '2024-01-05')
+
+    # 쇼핑몰의 기간별 주문 조회는 새로 넣은 주문과 다시 연 뒤(전부 읽기, lazy_orders) 모두 같음
+    def test_orders_between(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        core = MallCore(TextFileStorage(data_dir))
+        self.addCleanup(core.storage.close)
+        product_id = core.create_product('사과', 1000, 50)
+        for day in range(1, 6):
+            core.place_order(product_id, day, '김민준', '서울시 강남구 1', f'2024-01-0{day}')
+        expected = [order.quantity for order in core.orders_between('2024-01-02', '2024-01-04')]
+        self.assertEqual(expected, [2, 3, 4])
+        for lazy_orders in (False, True):
+            with self.subTest(lazy_orders=lazy_orders):
+                reopened = MallCore(TextFileStorage(data_dir, lazy_orders=lazy_orders))
+                self.addCleanup(reopened.storage.close)
+                self.assertEqual(reopened.order_dates.latest, '2024-01-05')
+                self.assertEqual([order.quantity for order in reopened.orders_between('2024-01-02', '2024-01-04')],
+                                 expected)
+
+
+class CustomerIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        core = self.open_core()
+        apple = core.create_product('사과', 1000, 50)
+        pear = core.create_product('배', 2000, 50)
+        core.checkout([(apple, 2), (pear, 1)], '김민준', '서울시 강남구 1', '2024-01-01')
+        core.place_order(pear, 5, '김민준', '부산시 해운대구 2', '2024-01-02')
+        core.place_order(apple, 1, '이서연', '대구시 중구 3', '2024-01-03')
+        core.place_order(apple, 3, '김민준', '서울시 강남구 1', '2024-01-04')
+        self.core = core
+
+    def open_core(self, lazy_orders=False):
+        core = MallCore(TextFileStorage(self.data_dir, lazy_orders=lazy_orders))
+        self.addCleanup(core.storage.close)
+        return core
+
+    def summary(self, core, name, address=None):
+        return sorted((address, [order.quantity for order in orders], spend)
+                      for name, address, orders, spend in core.customer_orders(name, address))
+
+    # 이름이 같아도 주소가 다르면 다른 고객, 장바구니 주문은 한 건으로 셈 (다시 열어도 같음)
+    def test_customer_orders_and_top_customers(self):
+        for core in (self.core, self.open_core(), self.open_core(lazy_orders=True)):
+            with self.subTest(orders=type(core.orders).__name__):
+                self.assertEqual(self.summary(core, '김민준'),
+                                 [('부산시 해운대구 2', [5], 10000), ('서울시 강남구 1', [2, 1, 3], 7000)])
+                self.assertEqual(self.summary(core, '김민준', '서울시 강남구 1'), [('서울시 강남구 1', [2, 1, 3], 7000)])
+                self.assertEqual(self.summary(core, '박지호'), [])
+                self.assertEqual(core.top_customers(2), [('김민준', '부산시 해운대구 2', 1, 10000),
+                                                         ('김민준', '서울시 강남구 1', 2, 7000)])
+
+
+class SalesAnalyticsTest(unittest.TestCase):
+    ORDERS = [
+        Order('ORD1000', 'PROD1000', '사과', 1000, 2, '김민준', '서울시 강남구 1', '2024-01-01'),
+        Order('ORD1000', 'PROD1001', '배', 2000, 1, '김민준', '서울시 강남구 1', '2024-01-01'),
+        Order('ORD1001', 'PROD1001', '배', 2500, 3, '이서연', '부산시 해운대구 2', '2024-01-09'),
+        Order('주문-1', 'PROD1000', '사과', 1000, 1, '박지호', '대구시 중구 3', '2024-02-01'),
+        Order('ORD1002', 'PROD1002', '귤', 500, 4, '김민준', '서울시 강남구 1', '2024-02-03'),
+    ]
+
+    def results(self, analytics):
+        return (len(analytics), analytics.top_products(2), analytics.top_products(3, by='units'),
+                [analytics.revenue_by_period(period) for period in SalesAnalytics.PERIODS],
+                analytics.basket_stats())
+
+    # NumPy 로 계산한 결과와 array 로 계산한 결과가 같음 (전체, 일부 위치, 빈 목록)
+    def test_numpy_matches_fallback(self):
+        store = OrderStore(self.ORDERS)
+        if SalesAnalytics(store).numpy is None:
+            self.skipTest('NumPy 가 없음')
+        for positions in (None, array('L', [4, 0, 3]), array('L')):
+            with self.subTest(positions=positions):
+                self.assertEqual(self.results(SalesAnalytics(store, positions)),
+                                 self.results(SalesAnalytics(store, positions, use_numpy=False)))
+
+    # 상품 순위와 기간별 매출 (array 로 계산)
+    def test_fallback_results(self):
+        analytics = SalesAnalytics(OrderStore(self.ORDERS), use_numpy=False)
+        self.assertEqual(analytics.top_products(2), [('PROD1001', '배', 4, 9500), ('PROD1000', '사과', 3, 3000)])
+        months = analytics.revenue_by_period('month')
+        self.assertEqual(months, [('2024-01', 3, 6, 11500), ('2024-02', 2, 5, 3000)])
+
+
+class ProductCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def open_core(self, kind):
+        core = MallCore(open_storage(kind, self.data_dir))
+        self.addCleanup(core.storage.close)
+        return core
+
+    # 같은 검색은 저장한 결과를 돌려주고, 상품명이 바뀌면 새로 찾음
+    def test_search_cache(self):
+        core = self.open_core('text')
+        apple = core.create_product('사과', 1000, 10)
+        core.create_product('배', 2000, 10)
+        with mock.patch.object(core.name_index, 'scan', wraps=core.name_index.scan) as scan:
+            self.assertEqual(list(core.find_products('사과')), [apple])
+            self.assertEqual(list(core.find_products('사과')), [apple])
+            self.assertEqual(scan.call_count, 1)
+            juice = core.create_product('사과즙', 3000, 10)
+            self.assertEqual(list(core.find_products('사과')), [apple, juice])
+            core.modify_product(apple, product_name='청송 사과')
+            self.assertEqual(list(core.find_products('청송')), [apple])
+            core.discontinue_product(juice)
+            self.assertEqual(list(core.find_products('사과')), [apple])
+            self.assertEqual(scan.call_count, 4)
+
+    # 다른 프로세스가 바꾼 상품만 반영하고, 바뀐 것이 없으면 상품 파일을 다시 읽지 않음
+    def test_refresh_reads_only_other_changes(self):
+        for kind in ('text', 'binary', 'sqlite'):
+            with self.subTest(kind=kind):
+                core = self.open_core(kind)
+                apple = core.create_product('사과', 1000, 10)
+                pear = core.create_product('배', 2000, 10)
+                other = self.open_core(kind)
+                with mock.patch.object(core, 'load_items', wraps=core.load_items) as load_items:
+                    core.refresh_items()
+                    self.assertEqual(core.find_products('사과'), {apple: ('사과', 1000, 10)})
+                    other.modify_product(apple, product_name='풋사과', product_quantity=7)
+                    other.discontinue_product(pear)
+                    grape = other.create_product('포도', 3000, 5)
+                    core.refresh_items()
+                    if kind != 'sqlite':  # SQLite 는 바뀌었으면 전부 다시 읽음
+                        self.assertEqual(load_items.call_count, 0)
+                self.assertEqual(core.products, other.products)
+                self.assertEqual(core.find_products('사과'), {apple: ('풋사과', 1000, 7)})
+                self.assertEqual(core.find_products('배'), {})
+                self.assertEqual(list(core.find_products('포도')), [grape])
+
+
+class JamoSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(self.core.storage.close)
+        self.galaxy = self.core.create_product('삼성 갤럭시', 900000, 10)
+        self.chicken = self.core.create_product('닭갈비', 12000, 10)
+        self.apple = self.core.create_product('사과', 1000, 10)
+        self.tv = self.core.create_product('Samsung TV', 500000, 10)
+
+    def search(self, query, jamo=True):
+        return list(self.core.find_products(query, jamo=jamo))
+
+    # 겹받침은 자모로 나누고, 한글이 아닌 글자는 그대로
+    def test_split_jamo_and_chosung(self):
+        self.assertEqual(split_jamo('닭갈비'), 'ㄷㅏㄹㄱㄱㅏㄹㅂㅣ')
+        self.assertEqual(chosung_of('삼성 TV'), 'ㅅㅅ TV')
+
+    # 초성만 입력한 검색어와 입력 중인 글자로도 찾고 (공백 무시), jamo 가 아니면 그대로 비교
+    def test_chosung_and_partial_syllables(self):
+        self.assertEqual(self.search('ㅅㅅ'), [self.galaxy])
+        self.assertEqual(self.search('ㅅㅅ ㄱ'), [self.galaxy])
+        self.assertEqual(self.search('ㄷㄱㅂ'), [self.chicken])
+        self.assertEqual(self.search('삼서'), [self.galaxy])
+        self.assertEqual(self.search('달'), [self.chicken])
+        self.assertEqual(self.search('닭가'), [self.chicken])
+        self.assertEqual(self.search('ㅅㄱ'), [self.galaxy, self.apple])
+        self.assertEqual(self.search('SAM'), [self.tv])
+        self.assertEqual(self.search('ㅅㅅ', jamo=False), [])
+        self.assertEqual(self.search('삼서', jamo=False), [])
+
+    # 상품명을 바꾸면 초성 검색도 새 이름으로
+    def test_renamed_product(self):
+        self.core.modify_product(self.apple, product_name='배')
+        self.assertEqual(self.search('ㅅㄱ'), [self.galaxy])
+        self.assertEqual(self.search('ㅂ'), [self.chicken, self.apple])
+
+
+class ParallelLoadTest(unittest.TestCase):
+    def setUp(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        self.path = os.path.join(data_dir, 'orders.txt')
+        self.orders = [Order(f'ORD{1000 + i}', f'PROD{1000 + i % 7}', f'상품{i % 7}', 1000 + i % 7, i % 5 + 1,
+                             '김민준', '서울시 강남구 1', f'2024-01-{i % 28 + 1:02d}') for i in range(60)]
+        lines = [order.to_file_string() for order in self.orders]
+        lines.insert(10, '\n')  # 11번째 줄: 빈 줄
+        lines.insert(25, 'ORD9999,PROD1000,사과,비싸요,1,김민준,서울시 강남구 1,2024-01-01\n')  # 26번째 줄
+        lines.insert(50, '잘못된 줄\n')  # 51번째 줄
+        lines.append('ORD9998,PROD1000,사과')  # 쓰다가 잘린 줄
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+
+    # 구간은 줄 처음에서 시작해서 파일 전체를 빈틈없이 덮음
+    def test_split_line_ranges(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        ranges = split_line_ranges(self.path, 8, min_bytes=64)
+        self.assertEqual(len(ranges), 8)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[start - 1:start], b'\n' if start else b'')
+        self.assertEqual(split_line_ranges(self.path, 8), [(0, len(data))])  # 작은 파일은 나누지 않음
+
+    # 여러 프로세스로 나눠 읽어도 한 번에 읽은 것과 주문, 매출, 오류 줄 번호가 같음
+    def test_matches_serial_load(self):
+        expected = SalesRollup()
+        for order in self.orders:
+            expected.add(order)
+        for workers in (1, 3):
+            with self.subTest(workers=workers):
+                orders = OrderStore()
+                rollup, errors = load_orders_parallel(self.path, orders, sales=True, workers=workers,
+                                                      min_chunk_bytes=64)
+                self.assertEqual([order.to_file_string() for order in orders],
+                                 [order.to_file_string() for order in self.orders])
+                self.assertEqual(vars(rollup), vars(expected))
+                self.assertEqual([line_no for line_no, message in errors], [26, 51])
+                self.assertIn('잘못된 줄', errors[1][1])
+
+
+class BatchImportTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def open_core(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(core.storage.close)
+        return core
+
+    def write(self, name, text):
+        path = os.path.join(self.data_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    # 잘못된 줄은 파일의 줄 번호와 함께 알리고 나머지 줄만 한 번에 등록함
+    def test_import_reports_line_numbers(self):
+        path = self.write('products.jsonl', '\n'.join([
+            '{"name": "사과", "price": 1000, "quantity": 10}',
+            '',
+            '{"name": "배", "price": ',
+            '{"name": "포도", "quantity": 3}',
+            '{"name": "귤", "price": 500, "quantity": -1}',
+            '{"name": "1234", "price": 500, "quantity": 1}',
+            '["목록"]',
+            '{"name": "감", "price": "700", "quantity": "5"}',
+        ]) + '\n')
+        core = self.open_core()
+        added, errors = core.import_products(read_records(path))
+        self.assertEqual([core.products[product_id] for product_id in added], [('사과', 1000, 10), ('감', 700, 5)])
+        self.assertEqual([line_no for line_no, message in errors], [3, 4, 5, 6, 7])
+        self.assertEqual(errors[2][1], "수량은 음수일 수 없습니다.")
+        self.assertEqual(errors[3][1], "잘못된 상품명입니다.")
+        self.assertEqual(sorted(self.open_core().products), sorted(added))
+
+    # CSV 는 첫 줄이 열 이름이므로 첫 상품이 2번째 줄
+    def test_csv_line_numbers(self):
+        path = self.write('products.csv', "name,price,quantity\n사과,1000,10\n배,비쌈,5\n")
+        added, errors = self.open_core().import_products(read_records(path))
+        self.assertEqual(len(added), 1)
+        self.assertEqual([line_no for line_no, message in errors], [3])
+
+    # 주문 일괄 처리는 앞 줄에서 줄어든 재고로 다음 줄을 검사하고, 실패한 줄만 빼고 저장함
+    def test_place_orders_reports_failed_lines(self):
+        core = self.open_core()
+        product_id = core.create_product('사과', 1000, 5)
+        customer = {'customer_name': '김민준', 'customer_address': '서울시 강남구 1'}
+        placed, errors = core.place_orders([
+            {'product_id': product_id, 'quantity': 3, 'order_date': '2024-01-01', **customer},
+            {'product_id': product_id, 'quantity': 3, 'order_date': '2024-01-02', **customer},
+            {'product_id': 'PROD9999', 'quantity': 1, 'order_date': '2024-01-02', **customer},
+            {'product_id': product_id, 'quantity': 1, 'order_date': '2024/01/03', **customer},
+            {'product_id': product_id, 'quantity': 2, 'order_date': '2024-01-03', **customer},
+            {'product_id': product_id},
+        ])
+        self.assertEqual([order.quantity for order in placed], [3, 2])
+        self.assertEqual([line_no for line_no, message in errors], [2, 3, 4, 6])
+        self.assertEqual(errors[0][1], "재고가 부족합니다 (남은 수량 2).")
+
+        reopened = self.open_core()
+        self.assertEqual(reopened.products[product_id][2], 0)
+        self.assertEqual([order.quantity for order in reopened.orders], [3, 2])
+
+
+class SalesSummaryTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.summary_path = os.path.join(self.data_dir, 'sales_summary.json')
+
+    # 매출 집계는 주문마다 쓰지 않고, 닫지 못하고 끝나도 다음에 읽을 때 뒤의 주문을 더해서 맞춤
+    def test_summary_written_on_close_and_caught_up(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        product_id = core.create_product('사과', 1000, 10)
+        core.place_order(product_id, 1, '김민준', '서울시 강남구 1', '2024-01-01')
+        core.storage.close()
+        mtime = os.stat(self.summary_path).st_mtime_ns
+
+        core = MallCore(TextFileStorage(self.data_dir))
+        core.place_order(product_id, 2, '이서연', '부산시 해운대구 2', '2024-01-02')
+        core.place_order(product_id, 3, '이서연', '부산시 해운대구 2', '2024-01-03')
+        self.assertEqual(os.stat(self.summary_path).st_mtime_ns, mtime)
+
+        core = MallCore(TextFileStorage(self.data_dir))  # 앞의 것을 닫지 않음
+        self.assertEqual(core.sales.order_count, 3)
+        self.assertEqual(core.sales.total_revenue, 6000)
+        self.assertEqual(core.sales.product_sales(product_id), (6, 6000))
+        core.storage.close()
+
+
+    def read_summary(self):
+        with open(self.summary_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    # 압축할 때 파일의 커밋된 주문으로 집계를 쓰므로 저장하다 실패한 주문은 들어가지 않음
+    def test_compaction_writes_committed_orders_only(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(core.storage.close)
+        product_id = core.create_product('사과', 1000, 10)
+        core.place_order(product_id, 1, '김민준', '서울시 강남구 1', '2024-01-01')
+        with mock.patch.object(core.storage, 'write_journal', side_effect=OSError("쓰기 실패")), \
+                self.assertRaises(OSError):
+            core.place_order(product_id, 2, '이서연', '부산시 해운대구 2', '2024-01-02')
+        core.storage.compact()
+
+        summary = self.read_summary()
+        self.assertEqual((summary['order_count'], summary['total_revenue']), (1, 1000))
+        orders_path = os.path.join(self.data_dir, 'orders.txt')
+        with open(orders_path, 'rb') as f:
+            first_line = len(f.readline())
+        self.assertEqual((summary['orders_inode'], summary['orders_offset']), (os.stat(orders_path).st_ino, first_line))
+
+    # 주문 파일이 통째로 다시 쓰였으면 주문 수가 같아도 저장된 집계를 쓰지 않고 다시 집계함
+    def test_summary_of_rewritten_orders_is_ignored(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        product_id = core.create_product('사과', 1000, 10)
+        core.place_order(product_id, 1, '김민준', '서울시 강남구 1', '2024-01-01')
+        core.storage.close()
+        self.assertEqual(self.read_summary()['total_revenue'], 1000)
+
+        orders_path = os.path.join(self.data_dir, 'orders.txt')
+        with open(orders_path, encoding='utf-8') as f:
+            line = f.read()
+        with open(orders_path + '.new', 'w', encoding='utf-8') as f:
+            f.write(line.replace(',1,김민준', ',3,김민준'))
+        os.replace(orders_path + '.new', orders_path)
+
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(core.storage.close)
+        self.assertEqual([order.quantity for order in core.orders], [3])
+        self.assertEqual((core.sales.order_count, core.sales.total_revenue), (1, 3000))
+
+
+class DurabilityTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def count_fsyncs(self, durability):
+        core = MallCore(TextFileStorage(self.data_dir), durability=durability)
+        self.addCleanup(core.storage.close)
+        with mock.patch('os.fsync', wraps=os.fsync) as fsync:
+            # 번호 예약(sequences.txt)도 통째로 다시 쓰도록 처음 등록하는 상품부터 셈
+            product_id = core.create_product('사과', 1000, 10)
+            core.place_order(product_id, 1, '김민준', '서울시 강남구 1', '2024-01-01')
+        return fsync.call_count
+
+    # none 이나 기본 설정이면 주문할 때 fsync 하지 않음
+    def test_no_fsync_without_durability(self):
+        for durability in (None, 'none'):
+            with self.subTest(durability=durability):
+                self.assertEqual(self.count_fsyncs(durability), 0)
+
+    def test_commit_fsyncs(self):
+        self.assertGreater(self.count_fsyncs('commit'), 0)
+
+
+class CompactorTest(unittest.TestCase):
+    # 압축 한 번이 예상하지 못한 오류로 실패해도 스레드는 살아 있고 다음 주기에 압축함
+    def test_survives_failing_pass(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        core = MallCore(TextFileStorage(data_dir))
+        self.addCleanup(core.storage.close)
+        product_id = core.create_product('사과', 1000, 10)
+        core.modify_product(product_id, product_price=1200)
+        self.assertGreater(core.storage.journal_size(), 0)
+
+        compact = core.storage.compact
+        calls = []
+
+        def failing_once():
+            calls.append(None)
+            if len(calls) == 1:
+                raise RuntimeError("압축 중 오류")
+            compact()
+        compactor = Compactor(core.storage, max_journal_bytes=1, interval=0.01)
+        with mock.patch.object(core.storage, 'compact', side_effect=failing_once), mock.patch('sys.stderr'):
+            compactor.start()
+            deadline = time.monotonic() + 5
+            while core.storage.journal_size() > 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(compactor.thread.is_alive())
+            compactor.stop()
+        self.assertGreater(len(calls), 1)
+        self.assertEqual(core.storage.journal_size(), 0)
+        reopened = MallCore(TextFileStorage(data_dir))
+        self.addCleanup(reopened.storage.close)
+        self.assertEqual(reopened.products[product_id], ('사과', 1200, 10))
+
+
+class ConvertDataTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    # 형식마다 변경 기록이 따로 있어서, 바꾼 뒤에도 원래 형식의 합치지 않은 변경이 남음
+    def test_convert_keeps_source_journal(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        product_id = core.create_product('사과', 1000, 10)
+        core.modify_product(product_id, product_quantity=7)
+        core.storage.close()
+
+        convert_data(self.data_dir, 'binary')
+        binary = MallCore(BinaryStorage(self.data_dir))
+        binary.modify_product(product_id, product_quantity=3)
+        binary.storage.close()
+
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.assertEqual(core.products[product_id], ('사과', 1000, 7))
+        core.storage.close()
+        binary = MallCore(BinaryStorage(self.data_dir))
+        self.assertEqual(binary.products[product_id], ('사과', 1000, 3))
+        binary.storage.close()
+
+    # 텍스트 -> 이진 -> 텍스트로 바꿔도 상품, 주문, 매출이 같음
+    def test_round_trip(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        apple = core.create_product('사과', 1000, 10)
+        pear = core.create_product('배', 2000, 10)
+        core.checkout([(apple, 2), (pear, 1)], '김민준', '서울시 강남구 1', '2024-01-01')
+        core.place_order(pear, 3, '이서연', '부산시 해운대구 2', '2024-01-02')
+        core.storage.close()
+        with open(os.path.join(self.data_dir, 'orders.txt'), encoding='utf-8') as f:
+            orders_text = f.read()
+
+        self.assertEqual(convert_data(self.data_dir, 'binary'), (2, 3))
+        with open(os.path.join(self.data_dir, 'orders.bin'), 'rb') as f:
+            self.assertEqual(f.read(8), b'KPORD001')
+        binary = MallCore(BinaryStorage(self.data_dir))
+        self.addCleanup(binary.storage.close)
+        self.assertEqual(binary.products, core.products)
+        self.assertEqual([order.to_file_string() for order in binary.orders], orders_text.splitlines(keepends=True))
+        self.assertEqual(binary.sales.by_product, core.sales.by_product)
+
+        os.remove(os.path.join(self.data_dir, 'orders.txt'))
+        self.assertEqual(convert_data(self.data_dir, 'text'), (2, 3))
+        with open(os.path.join(self.data_dir, 'orders.txt'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), orders_text)
+
+    # 쉼표가 들어간 값은 텍스트 형식으로 바꾸지 않고 원래 파일을 그대로 둠
+    def test_comma_blocks_conversion_to_text(self):
+        binary = MallCore(BinaryStorage(self.data_dir))
+        self.addCleanup(binary.storage.close)
+        binary.create_product('사과, 큰 것', 1000, 10)
+        with self.assertRaises(MallError):
+            convert_data(self.data_dir, 'text')
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, 'products.txt')))
+
+
+class ShoppingMallTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def run_mall(self, script):
+        mall = ShoppingMall(TextFileStorage(self.data_dir), script=script)
+        self.addCleanup(mall.storage.close)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            mall.run()
+        self.assertIsNone(next(mall.script, None))
+        return mall, out.getvalue()
+
+    # 상품이 한 페이지(20개)를 넘어도 상품 관리 메뉴 입력은 메뉴로 처리되고, 나머지 페이지는 (p) 로 넘겨 봄
+    def test_manage_products_with_more_than_one_page(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        product_ids = [core.create_product(f'상품{number:02d}', 1000, 10) for number in range(25)]
+        core.storage.close()
+
+        mall, out = self.run_mall(['1', '1234', '1', '3', '상품07', product_ids[7], 'p', 'n', '', '0', '0', '0'])
+        self.assertNotIn(product_ids[7], mall.products)
+        self.assertIn("단종 등록 완료하였습니다.", out)
+        self.assertIn("(p) 목록 페이지 넘기기", out)
+        self.assertIn("(2/2 페이지, 전체 24건)", out)
+        self.assertNotIn("잘못된 입력입니다", out)
+        self.assertTrue(out.rstrip().endswith("프로그램이 종료 됩니다 ."))
+
+
+    # 수정/단종하려던 상품을 다른 프로세스가 먼저 단종하면 오류를 알리고 메뉴를 계속 씀
+    def test_product_discontinued_by_other_process(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(core.storage.close)
+        apple = core.create_product('사과', 1000, 10)
+        pear = core.create_product('배', 2000, 10)
+
+        def script():
+            yield from ['1', '1234', '1', '2', '사과', '2']
+            core.discontinue_product(apple)
+            yield from ['2000', '0', '3', '배']
+            core.discontinue_product(pear)
+            yield from [pear, '0', '0', '0']
+        mall, out = self.run_mall(script())
+        self.assertEqual(out.count("오류: 유효하지 않은 상품번호 입니다."), 1)
+        self.assertEqual(out.count("오류: 해당 상품이 존재하지 않습니다."), 1)
+        self.assertEqual(mall.products, {})
+        self.assertTrue(out.rstrip().endswith("프로그램이 종료 됩니다 ."))
+
+
+class MetricsDumpTest(unittest.TestCase):
+    # 측정값을 기록하는 도중(METRICS.lock 을 잡은 채) SIGUSR1 을 받아도 멈추지 않고 저장함
+    @unittest.skipUnless(hasattr(signal, 'SIGUSR1'), "SIGUSR1 이 없는 운영체제")
+    def test_signal_while_lock_is_held(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        path = os.path.join(data_dir, 'metrics.json')
+        previous = signal.signal(signal.SIGUSR1, MetricsDumper(path).start().request)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous)
+
+        with METRICS.lock:
+            os.kill(os.getpid(), signal.SIGUSR1)
+            self.assertFalse(os.path.exists(path))
+        deadline = time.monotonic() + 5
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(os.path.exists(path))
+
+
+class MallServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    # 서버가 떠 있는 동안 다른 프로세스가 판 재고를 보고 주문을 확인함
+    def test_server_sees_other_writers_orders(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        product_id = core.create_product('사과', 1000, 10)
+        other = MallCore(TextFileStorage(self.data_dir))
+        other.place_order(product_id, 8, '김민준', '서울시 강남구 1', '2024-01-01')
+        other.storage.close()
+
+        async def main():
+            service = MallService(core)
+            await service.start()
+            try:
+                with self.assertRaises(MallError):
+                    await service.place_order(product_id, 9, '이서연', '부산시 해운대구 2', '2024-01-02')
+                return await service.place_order(product_id, 2, '이서연', '부산시 해운대구 2', '2024-01-02')
+            finally:
+                await service.stop()
+        order = asyncio.run(main())
+        core.storage.close()
+
+        self.assertEqual(order['quantity'], 2)
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.assertEqual(core.products[product_id][2], 0)
+        self.assertEqual([order.quantity for order in core.orders], [8, 2])
+        core.storage.close()
+
+    # 장바구니 주문은 여러 줄이어도 주문 한 건으로 셈
+    def test_customer_orders_counts_checkout_once(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(core.storage.close)
+        apple = core.create_product('사과', 1000, 10)
+        pear = core.create_product('배', 2000, 10)
+        core.checkout([(apple, 1), (pear, 2)], '김민준', '서울시 강남구 1', '2024-01-01')
+
+        async def main():
+            service = MallService(core)
+            await service.start()
+            try:
+                return service.customer_orders('김민준')
+            finally:
+                await service.stop()
+        customer, = asyncio.run(main())
+        self.assertEqual(customer['order_count'], 1)
+        self.assertEqual(len(customer['orders']), 2)
+
+    # 장바구니 주문은 재고를 저장하다 실패해도 먼저 추가한 주문 줄까지 함께 취소됨
+    def test_failed_checkout_leaves_no_lines(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(core.storage.close)
+        apple = core.create_product('사과', 1000, 10)
+        pear = core.create_product('배', 2000, 10)
+        request = {'jsonrpc': '2.0', 'id': 1, 'method': 'checkout',
+                   'params': {'items': [{'product_id': apple, 'quantity': 1}, {'product_id': pear, 'quantity': 2}],
+                              'customer_name': '김민준', 'customer_address': '서울시 강남구 1',
+                              'order_date': '2024-01-01'}}
+
+        async def main():
+            service = MallService(core)
+            await service.start()
+            try:
+                with mock.patch.object(core.storage, 'save_product_changes', side_effect=OSError("디스크 가득 참")), \
+                        mock.patch('sys.stderr'):
+                    failed = await service.handle(request)
+                return failed, service.customer_orders('김민준')
+            finally:
+                await service.stop()
+        failed, customers = asyncio.run(main())
+        self.assertEqual(failed['error']['code'], -32603)
+        self.assertEqual(customers, [])
+
+        reopened = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(reopened.storage.close)
+        self.assertEqual(len(reopened.orders), 0)
+        self.assertEqual((reopened.products[apple][2], reopened.products[pear][2]), (10, 10))
+        self.assertEqual(reopened.sales.order_count, 0)
+
+    # 저장 스레드가 core_lock 을 잡고 있는 동안 조회 요청은 조회 스레드에서 기다리고 이벤트 루프는 계속 돎
+    def test_read_waits_off_the_event_loop(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(core.storage.close)
+        product_id = core.create_product('사과', 1000, 10)
+        request = {'jsonrpc': '2.0', 'id': 1, 'method': 'get_product', 'params': {'product_id': product_id}}
+
+        async def main():
+            service = MallService(core)
+            await service.start()
+            try:
+                service.core_lock.acquire()
+                threading.Timer(0.5, service.core_lock.release).start()
+                read = asyncio.create_task(service.handle(request))
+                started = time.monotonic()
+                await asyncio.sleep(0.01)
+                return time.monotonic() - started, await read
+            finally:
+                await service.stop()
+        waited, response = asyncio.run(main())
+        self.assertLess(waited, 0.4)
+        self.assertEqual(response['result']['quantity'], 10)
+
+    # 저장에 실패하면 내부 오류로 응답하고 메모리의 재고/주문을 되돌림
+    def test_failed_write_is_rolled_back(self):
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.addCleanup(core.storage.close)
+        product_id = core.create_product('사과', 1000, 10)
+        request = {'jsonrpc': '2.0', 'id': 1, 'method': 'place_order',
+                   'params': {'product_id': product_id, 'quantity': 3, 'customer_name': '김민준',
+                              'customer_address': '서울시 강남구 1', 'order_date': '2024-01-01'}}
+
+        async def main():
+            service = MallService(core)
+            await service.start()
+            try:
+                with mock.patch.object(core.storage, 'append_orders', side_effect=OSError("디스크 가득 참")), \
+                        mock.patch('sys.stderr'):
+                    failed = await service.handle(request)
+                return failed, await service.handle(request)
+            finally:
+                await service.stop()
+        failed, placed = asyncio.run(main())
+        self.assertEqual(failed['error']['code'], -32603)
+        self.assertEqual(placed['result']['quantity'], 3)
+        self.assertEqual(core.products[product_id][2], 7)
+        self.assertEqual(len(core.orders), 1)
+
+        core = MallCore(TextFileStorage(self.data_dir))
+        self.assertEqual(core.products[product_id][2], 7)
+        self.assertEqual(len(core.orders), 1)
+        core.storage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()